@@ -7,654 +7,985 @@
 #              rules allowing jumping and diagonal moves when pawns are touching. The game
 #              board and characteristics of players are stored in private data members. One class
 #              is used and multiple methods are used in each move made.
+#              The board is stored as integer bitmasks: every cell (x, y) is bit y*9 + x,
+#              a pawn is stored as the number of its cell and each kind of fence has one
+#              mask with a bit set for every fence slot that is used.
+#              Pawn moves of both players are checked against STEPS, PAWN_MOVES and
+#              JUMPS, tables built once at import that list each cell's neighbours,
+#              jumps and diagonals with the fence slots that must be free or taken.
+#              Each player also keeps a grid with the number of steps from every cell
+#              to their goal row. A new fence only repairs the cells whose distance
+#              changed, which is also how the fair play rule is checked.
+#              Every position has a 64 bit Zobrist hash that is updated with each move,
+#              a TranspositionTable keyed by the hash can hold search results and
+#              move legality so positions reached again are not checked twice.
+#              to_bytes packs a position into SNAPSHOT_BYTES bytes and canonical_key gives
+#              a position and its left-right mirror image the same key.
+#              set_profiler attaches a GameProfiler (QuoridorProfile.py) that counts
+#              rejected moves and fair play work and times the public methods.
+#              set_listener registers a function that is called after every committed
+#              move, which SpectatorHub (QuoridorSpectate.py) uses to stream games.
+
+import heapq
+import random
+
+SIZE = 9                                                   # cells along each side
+CELLS = SIZE * SIZE
+BOARD = (1 << CELLS) - 1                                   # every cell on the board
+TOP_ROW = (1 << SIZE) - 1                                  # player 2 goal row, y = 0
+BOTTOM_ROW = TOP_ROW << (CELLS - SIZE)                     # player 1 goal row, y = 8
+LEFT_COLUMN = sum(1 << (row * SIZE) for row in range(SIZE))
+RIGHT_COLUMN = LEFT_COLUMN << (SIZE - 1)
+FAIR_PLAY_MESSAGE = "breaks the fair play rule"
+UNREACHABLE = CELLS                                        # distance of a cut off cell
+MAX_FENCES = 32                                            # fence counts that have a hash key
+
+_keys = random.Random(162)                                 # fixed seed so hashes are repeatable
+PAWN_KEYS = [[_keys.getrandbits(64) for cell in range(CELLS)] for player in range(2)]
+H_FENCE_KEYS = [_keys.getrandbits(64) for slot in range(CELLS)]
+V_FENCE_KEYS = [_keys.getrandbits(64) for slot in range(CELLS)]
+FENCES_LEFT_KEYS = [[_keys.getrandbits(64) for count in range(MAX_FENCES)] for player in range(2)]
+TURN_KEY = _keys.getrandbits(64)                           # in the hash when player 2 is up
+# pawn move legality entries are the position hash xor the key of the target cell
+MOVE_TARGET_KEYS = [[_keys.getrandbits(64) for cell in range(CELLS)] for player in range(2)]
+BLOCK_KEY = _keys.getrandbits(64)                          # marks a fence fair play entry
+ENTRY_BYTES = 128                                          # rough size of one stored entry
+EXACT, LOWER, UPPER = 0, 1, 2                              # kinds of stored search value
+ROW_BYTES = (SIZE * (SIZE - 1) + 7) // 8                   # bytes for the fence slots of one kind
+SNAPSHOT_BYTES = 2 + 2 * ROW_BYTES + 3                     # pawns, fences, counts, turn and state
+GAME_STATES = ["unfinished", "player1 wins", "player2 wins"]
+TIMED_METHODS = ("move_pawn", "place_fence", "is_winner", "legal_moves", "legal_fences",
+                 "apply", "undo")                          # timed while a profiler is attached
+
+
+def neighbour(cell, step, size=SIZE):
+    """returns the cell one step (-size, size, -1 or 1) from cell or None
+    when that is off a board size cells wide"""
+    column = cell % size
+    if step == -1 and column == 0 or step == 1 and column == size - 1:
+        return None
+    if not 0 <= cell + step < size * size:
+        return None
+    return cell + step
+
+
+def wall_bits(cell, step, size=SIZE):
+    """returns (horizontal bit, vertical bit) of the fence slot between
+    cell and its neighbour one step away"""
+    if step == -size:
+        return 1 << cell, 0                                # top edge of cell
+    if step == size:
+        return 1 << (cell + size), 0                       # top edge of the cell below
+    if step == -1:
+        return 0, 1 << cell                                # left edge of cell
+    return 0, 1 << (cell + 1)                              # left edge of the cell to the right
+
+
+def build_move_tables(size=SIZE):
+    """returns (STEPS, PAWN_MOVES, JUMPS), STEPS[cell] holds (neighbour,
+    h bit, v bit) for every neighbour on the board and PAWN_MOVES[cell]
+    maps each cell a pawn there could ever reach in one move to its rules
+    (middle, open h, open v, closed h, closed v): middle is the cell the
+    other pawn must be on (-1 for a plain step), the open masks are the
+    fence slots that must be empty and the closed bits the slot behind the
+    other pawn that must hold a fence for a diagonal (0 when the board
+    edge is behind it or no fence is needed). JUMPS[cell] maps a
+    neighbour holding the other pawn to the (target, open h, open v,
+    closed h, closed v) of every jump and diagonal over it. The tables
+    are for a board size cells wide, the classic board by default"""
+    steps = []
+    pawn_moves = []
+    jumps = []
+    for cell in range(size * size):
+        steps.append(tuple((neighbour(cell, step, size),) + wall_bits(cell, step, size)
+                           for step in (-size, size, -1, 1) if neighbour(cell, step, size) is not None))
+        rules, over = cell_moves(cell, size)
+        pawn_moves.append({target: tuple(rule) for target, rule in rules.items()})
+        jumps.append({middle: tuple(moves) for middle, moves in over.items()})
+    return tuple(steps), tuple(pawn_moves), tuple(jumps)
+
+
+def cell_moves(cell, size):
+    """returns the PAWN_MOVES rules of one cell as lists by target cell
+    and its JUMPS entries as lists by the neighbour they go over"""
+    rules = {}
+    over = {}
+    for step in (-size, size, -1, 1):                      # up, down, left, right
+        middle = neighbour(cell, step, size)
+        if middle is None:
+            continue
+        h_1, v_1 = wall_bits(cell, step, size)
+        rules.setdefault(middle, []).append((-1, h_1, v_1, 0, 0))
+        behind = neighbour(middle, step, size)
+        closed_h = closed_v = 0                            # board edge behind the other pawn
+        if behind is not None:
+            closed_h, closed_v = wall_bits(middle, step, size)
+            rules.setdefault(behind, []).append((middle, h_1 | closed_h, v_1 | closed_v, 0, 0))
+            over.setdefault(middle, []).append((behind, h_1 | closed_h, v_1 | closed_v, 0, 0))
+        for side in ((-1, 1) if step in (-size, size) else (-size, size)):
+            diagonal = neighbour(middle, side, size)
+            if diagonal is not None:
+                h_2, v_2 = wall_bits(middle, side, size)
+                rules.setdefault(diagonal, []).append((middle, h_1 | h_2, v_1 | v_2, closed_h, closed_v))
+                over.setdefault(middle, []).append((diagonal, h_1 | h_2, v_1 | v_2, closed_h, closed_v))
+    return rules, over
+
+
+def mirror_cell(cell):
+    """returns the cell reflected left to right"""
+    column = cell % SIZE
+    return cell - column + SIZE - 1 - column
+
+
+def mirror_fences(h_fences, v_fences):
+    """returns the fence masks reflected left to right, a horizontal fence
+    keeps its row and a vertical fence on the left edge of column x moves
+    to the left edge of column 9 - x"""
+    mirrored_h = mirrored_v = 0
+    for slot in range(CELLS):
+        if h_fences >> slot & 1:
+            mirrored_h |= 1 << mirror_cell(slot)
+        if v_fences >> slot & 1:
+            mirrored_v |= 1 << (mirror_cell(slot) + 1)
+    return mirrored_h, mirrored_v
+
+
+def mirror_move(move):
+    """returns a move in apply format reflected left to right"""
+    if isinstance(move[0], str):
+        direction, (x, y) = move
+        return direction, (SIZE - 1 - x if direction == "h" else SIZE - x, y)
+    return SIZE - 1 - move[0], move[1]
+
+
+STEPS, PAWN_MOVES, JUMPS = build_move_tables()             # built once at import
+
+
+def pawn_allowed(h_fences, v_fences, current, other, cell):
+    """returns True if the pawn on current may move to the free cell
+    with the other pawn on other, looked up in PAWN_MOVES"""
+    for middle, open_h, open_v, closed_h, closed_v in PAWN_MOVES[current].get(cell, ()):
+        if middle != -1 and middle != other:               # jump or diagonal needs the other pawn there
+            continue
+        if h_fences & open_h or v_fences & open_v:         # fence in the way
+            continue
+        if (closed_h | closed_v) and not (h_fences & closed_h or v_fences & closed_v):
+            continue                                       # diagonal only when the jump is blocked
+        return True
+    return False
+
+
+def pawn_targets(h_fences, v_fences, current, other):
+    """returns every cell the pawn on current may move to with the other
+    pawn on other, jumping it when facing it or going diagonal when a
+    fence or the board edge is behind it"""
+    targets = []
+    for step, h_bit, v_bit in STEPS[current]:
+        if h_fences & h_bit or v_fences & v_bit:
+            continue
+        if step != other:                                  # normal move
+            targets.append(step)
+            continue
+        for target, open_h, open_v, closed_h, closed_v in JUMPS[current][other]:
+            if h_fences & open_h or v_fences & open_v:
+                continue
+            if not (closed_h | closed_v) or h_fences & closed_h or v_fences & closed_v:
+                targets.append(target)                     # jump, or diagonal when the jump is blocked
+    return targets
+
+
+def pack_snapshot(state, game_state):
+    """packs a get_state tuple and the game state into SNAPSHOT_BYTES bytes,
+    horizontal fences skip the top edge row and vertical fences keep one
+    byte per row for columns 1-8"""
+    player_1, player_2, h_fences, v_fences, fences_1, fences_2, turn = state
+    v_rows = bytes(v_fences >> (row * SIZE + 1) & 0xFF for row in range(SIZE))
+    flags = turn - 1 | GAME_STATES.index(game_state) << 1
+    return bytes((player_1, player_2)) + (h_fences >> SIZE).to_bytes(ROW_BYTES, "little") \
+        + v_rows + bytes((fences_1, fences_2, flags))
+
+
+def unpack_snapshot(data):
+    """returns (state tuple, game state) from pack_snapshot bytes"""
+    if len(data) != SNAPSHOT_BYTES:
+        raise ValueError("snapshot must be " + str(SNAPSHOT_BYTES) + " bytes")
+    h_fences = int.from_bytes(data[2:2 + ROW_BYTES], "little") << SIZE
+    v_fences = 0
+    for row in range(SIZE):
+        v_fences |= data[2 + ROW_BYTES + row] << (row * SIZE + 1)
+    flags = data[-1]
+    state = (data[0], data[1], h_fences, v_fences, data[-3], data[-2], (flags & 1) + 1)
+    return state, GAME_STATES[flags >> 1]
+
+
+class TranspositionTable:
+    """fixed size table of search results and legality verdicts keyed by a
+    position hash, each hash has one slot and a slot is replaced when it is
+    empty, from an older search or holds a shallower result"""
+    def __init__(self, max_bytes=1 << 24):
+        """number of slots is the largest power of two that fits in max_bytes"""
+        size = 1
+        while size * 2 * ENTRY_BYTES <= max_bytes:
+            size *= 2
+        self._mask = size - 1
+        self._slots = [None] * size
+        self._generation = 0
+        self._hits = 0
+        self._misses = 0
+
+
+    def new_search(self):
+        """marks every stored search result as old so it can be replaced"""
+        self._generation += 1
+
+
+    def store(self, key, depth, value, flag=EXACT, move=None):
+        """stores a search result if the replacement policy allows it"""
+        index = key & self._mask
+        entry = self._slots[index]
+        if entry is None or entry[0] == key or entry[2] != self._generation or depth >= entry[1]:
+            self._slots[index] = (key, depth, self._generation, value, flag, move)
+
+
+    def probe(self, key):
+        """returns (depth, value, flag, move) stored for key or None"""
+        entry = self._slots[key & self._mask]
+        if entry is None or entry[0] != key:
+            self._misses += 1
+            return None
+        self._hits += 1
+        return entry[1], entry[3], entry[4], entry[5]
+
+
+    def store_verdict(self, key, verdict):
+        """stores a True or False legality verdict, these have depth -1 so
+        they never push out a search result of the current search"""
+        self.store(key, -1, verdict)
+
+
+    def get_verdict(self, key):
+        """returns the stored verdict for key or None"""
+        entry = self.probe(key)
+        return None if entry is None else entry[1]
+
+
+    def get_stats(self):
+        """returns a dict of slot count, used slots, hits and misses"""
+        used = len(self._slots) - self._slots.count(None)
+        return {"slots": len(self._slots), "used": used, "hits": self._hits, "misses": self._misses}
+
+
+class GoalDistances:
+    """stores the number of steps from every cell to one player's goal row,
+    fences only make paths longer so a new fence repairs the cells that
+    relied on the blocked step and leaves the rest of the grid alone"""
+    def __init__(self, game, goal_row):
+        """breadth first search out from every cell of the goal row"""
+        self._distance = [UNREACHABLE] * CELLS
+        queue = [cell for cell in range(CELLS) if goal_row >> cell & 1]
+        for cell in queue:
+            self._distance[cell] = 0
+        for cell in queue:                                 # queue grows while looping
+            for step in game.open_cells(cell):
+                if self._distance[step] == UNREACHABLE:
+                    self._distance[step] = self._distance[cell] + 1
+                    queue.append(step)
+
+
+    def get_distance(self, cell):
+        """returns the number of steps from cell to the goal row"""
+        return self._distance[cell]
+
+
+    def path_from(self, game, cell):
+        """returns the cells of one shortest path from cell to the goal row,
+        cell itself not included, or None if cell is cut off, every step
+        goes to a neighbour one closer so no search is needed"""
+        if self._distance[cell] == UNREACHABLE:
+            return None
+        path = []
+        while self._distance[cell]:
+            closer = self._distance[cell] - 1
+            for step in game.open_cells(cell):
+                if self._distance[step] == closer:
+                    cell = step
+                    break
+            path.append(cell)
+        return path
+
+
+    def supported(self, game, cell, affected):
+        """returns True if cell still has an open neighbour one step closer
+        to the goal that is not in the affected set"""
+        closer = self._distance[cell] - 1
+        for step in game.open_cells(cell):
+            if self._distance[step] == closer and step not in affected:
+                return True
+        return False
+
+
+    def wall_changes(self, game, first, second):
+        """called with the new fence already on the game between first and
+        second, returns a dict of the cells whose distance grew and their new
+        distance without changing the grid"""
+        distance = self._distance
+        if distance[first] == distance[second]:            # step is on no shortest path
+            return {}
+        if distance[first] < distance[second]:
+            first, second = second, first                  # first may have used the step
+        if self.supported(game, first, ()):
+            return {}
+        affected = self.find_affected(game, first)
+        return self.recompute(game, affected)
+
+
+    def cuts_off(self, game, first, second, cell):
+        """called with the new fence already on the game, returns True if
+        cell has no path to the goal row, stops as soon as the answer is
+        known instead of working out the new distances"""
+        distance = self._distance
+        if distance[cell] == UNREACHABLE:
+            return True
+        if distance[first] == distance[second]:            # step is on no shortest path
+            return False
+        if distance[first] < distance[second]:
+            first, second = second, first
+        if self.supported(game, first, ()):
+            return False
+        affected = self.find_affected(game, first)
+        if cell not in affected:
+            return False
+        for lost in affected:                              # affected cells are connected so
+            for step in game.open_cells(lost):             # one way out frees all of them
+                if step not in affected and distance[step] != UNREACHABLE:
+                    return False
+        return True
+
+
+    def find_affected(self, game, start):
+        """breadth first from start collecting every cell that lost all of
+        its shortest paths, handled in order of distance so support from an
+        affected cell is never counted"""
+        affected = {start}
+        queue = [start]
+        for cell in queue:                                 # queue grows while looping
+            further = self._distance[cell] + 1
+            for step in game.open_cells(cell):
+                if self._distance[step] == further and step not in affected:
+                    if not self.supported(game, step, affected):
+                        affected.add(step)
+                        queue.append(step)
+        return affected
+
+
+    def recompute(self, game, affected):
+        """finds new distances for the affected cells starting from their
+        neighbours outside the affected set, cells that cannot be reached
+        again are set to UNREACHABLE"""
+        changes = dict.fromkeys(affected, UNREACHABLE)
+        heap = []
+        for cell in affected:
+            for step in game.open_cells(cell):
+                if step not in affected:
+                    heap.append((self._distance[step] + 1, cell))
+        heapq.heapify(heap)
+        while heap:
+            distance, cell = heapq.heappop(heap)
+            if distance >= changes[cell]:
+                continue
+            changes[cell] = distance
+            for step in game.open_cells(cell):
+                if step in changes and distance + 1 < changes[step]:
+                    heapq.heappush(heap, (distance + 1, step))
+        return changes
+
+
+    def apply(self, changes):
+        """writes changed distances into the grid and returns the old
+        distances so the change can be undone"""
+        old = {}
+        for cell, distance in changes.items():
+            old[cell] = self._distance[cell]
+            self._distance[cell] = distance
+        return old
 
-import copy
 
 class QuoridorGame:
     """a class containing the board, validation of moves and fences
     stores which players turn it is and updates a winner"""
     def __init__(self):
-        """board represented as list of lists with extra spaces added between
-        each usable space to add fences, pawns can occupy 0's and fences can
-        occupy 1's, other private data members store player info"""
-        self._board = [[0, 1, 0, 1, 0, 1, 0, 1, "player_1", 1, 0, 1, 0, 1, 0, 1, 0],
-                      [1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1],
-                      [0, 1, 0, 1, 0, 1, 0, 1, 0, 1, 0, 1, 0, 1, 0, 1, 0],
-                      [1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1],
-                      [0, 1, 0, 1, 0, 1, 0, 1, 0, 1, 0, 1, 0, 1, 0, 1, 0],
-                      [1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1],
-                      [0, 1, 0, 1, 0, 1, 0, 1, 0, 1, 0, 1, 0, 1, 0, 1, 0],
-                      [1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1],
-                      [0, 1, 0, 1, 0, 1, 0, 1, 0, 1, 0, 1, 0, 1, 0, 1, 0],
-                      [1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1],
-                      [0, 1, 0, 1, 0, 1, 0, 1, 0, 1, 0, 1, 0, 1, 0, 1, 0],
-                      [1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1],
-                      [0, 1, 0, 1, 0, 1, 0, 1, 0, 1, 0, 1, 0, 1, 0, 1, 0],
-                      [1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1],
-                      [0, 1, 0, 1, 0, 1, 0, 1, 0, 1, 0, 1, 0, 1, 0, 1, 0],
-                      [1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1],
-                      [0, 1, 0, 1, 0, 1, 0, 1, "player_2", 1, 0, 1, 0, 1, 0, 1, 0]]
-
+        """board represented as bitmasks, a horizontal fence at (x, y) sets bit
+        y*9 + x of the horizontal mask (top edge of the cell) and a vertical fence
+        sets the same bit of the vertical mask (left edge of the cell), other
+        private data members store player info"""
+        self._h_fences = 0                                    # horizontal fence slots used
+        self._v_fences = 0                                    # vertical fence slots used
         self._game_state = "unfinished"
         self._player_1_fences = 11
         self._player_2_fences = 11
         self._turn = "player_1"
-        self._player_1_position = [0, 8]                      # player 1 current position
-        self._player_2_position = [16, 8]                     # player 2 current position
+        self._player_1_position = 4                           # player 1 current cell (4, 0)
+        self._player_2_position = CELLS - SIZE + 4            # player 2 current cell (4, 8)
+        self._player_1_distances = GoalDistances(self, BOTTOM_ROW)
+        self._player_2_distances = GoalDistances(self, TOP_ROW)
+        self._history = []                                    # undo records, last move at the end
+        self._table = None                                    # optional TranspositionTable
+        self._profiler = None                                 # optional GameProfiler
+        self._listener = None                                 # called after each committed move
+        self._hash = self.compute_hash()
+
+
+    def compute_hash(self):
+        """builds the Zobrist hash of the position from scratch"""
+        key = PAWN_KEYS[0][self._player_1_position] ^ PAWN_KEYS[1][self._player_2_position]
+        key ^= FENCES_LEFT_KEYS[0][self._player_1_fences] ^ FENCES_LEFT_KEYS[1][self._player_2_fences]
+        for slot in range(CELLS):
+            if self._h_fences >> slot & 1:
+                key ^= H_FENCE_KEYS[slot]
+            if self._v_fences >> slot & 1:
+                key ^= V_FENCE_KEYS[slot]
+        if self._turn == "player_2":
+            key ^= TURN_KEY
+        return key
+
+
+    def get_state(self):
+        """returns the position as a tuple of small ints that is much
+        cheaper to send to another process than the game object, (player 1
+        cell, player 2 cell, horizontal fences, vertical fences, player 1
+        fences, player 2 fences, player to move)"""
+        return (self._player_1_position, self._player_2_position, self._h_fences,
+                self._v_fences, self._player_1_fences, self._player_2_fences, self.get_turn())
+
+
+    def set_state(self, state):
+        """replaces the position with one from get_state, the distance grids
+        and hash are rebuilt and the undo history is cleared"""
+        self._player_1_position, self._player_2_position, self._h_fences, \
+            self._v_fences, self._player_1_fences, self._player_2_fences, turn = state
+        self._turn = "player_" + str(turn)
+        self._game_state = "unfinished"
+        if BOTTOM_ROW >> self._player_1_position & 1:
+            self._game_state = "player1 wins"
+        elif TOP_ROW >> self._player_2_position & 1:
+            self._game_state = "player2 wins"
+        self._player_1_distances = GoalDistances(self, BOTTOM_ROW)
+        self._player_2_distances = GoalDistances(self, TOP_ROW)
+        self._history = []
+        self._hash = self.compute_hash()
+        if self._listener is not None:
+            self._listener(self, None)
 
 
-    def move_pawn(self, player, new_space):
-        """performs initial validation of pawn move
-        and sends to a method based on the player"""
-        if new_space[1] < 0 or new_space[0] < 0:          # move is in range
-            return False
-        if new_space[1] > 8 or new_space[0] > 8:          # move is in range
-            return False
-        if self._game_state != "unfinished":              # correct turn
-            return False
-        if player == 1 and self._turn == "player_2":      # correct turn
-            return False
-        if player == 2 and self._turn == "player_1":
-            return False
-        row = new_space[1] + new_space[1]                # converted row to be used
-        column = new_space[0] + new_space[0]             # converted column to be used
-        if self._board[row][column] != 0:
-            return False
-        if player == 1:
-            return self.player_1_move(row, column)      # send to method for player 1
-        if player == 2:
-            return self.player_2_move(row,column)       # send to method for player 2
-
-
-    def player_1_move(self, row, column):
-        """gets current position of player 1 and checks
-        if pawns are touching, sends to method, try/except
-        used to deal with index errors"""
-        current_row = self._player_1_position[0]
-        current_column = self._player_1_position[1]
-        try:                                    # try and except used to handle index range error
-            if self._board[current_row][current_column - 2] == "player_2":
-                if column < current_column:
-                    return self.player_1_move_left(row, column, current_row, current_column)
-        except:
-            pass
-        try:              # is player 2 on space right of player 1
-            if self._board[current_row][current_column + 2] == "player_2":
-                if column > current_column:
-                    return self.player_1_move_right(row, column, current_row_current_column)
-        except:
-            pass
-        try:             # is player 2 above player 1
-            if self._board[current_row - 2][current_column] == "player_2":
-                if row < current_row:
-                    return self.player_1_move_up(row, column, current_row, current_column)
-        except:
-            pass
-        try:            # is player 2 below player 1
-            if self._board[current_row + 2][current_column] == "player_2":
-                if row > current_row:
-                    return self.player_1_move_down(row, column, current_row, current_column)
-        except:
-            pass
-        return self.player_1_normal_move(row, column, current_row, current_column)
-
-
-    def player_1_move_left(self, row, column, current_row, current_column):
-        """called when player 2 pawn is idediatly left of player1, allows for
-        jumping and diagonal moves when permitted"""
-        if row == current_row and column == current_column - 4:    # can a jump be made
-            if self._board[current_row][current_column - 1] == 1 and \
-                    self._board[current_row][current_column - 3] == 1:
-                return self.update_player1_move(row, column, current_row, current_column)
-            else:
-                return False
-        if row == current_row - 2 and column == current_column - 2:  # cand diagonal move be made
-            if self._board[current_row][current_column - 1] == 1 and \
-                    self._board[current_row][current_column - 3] == "fence":
-                if self._board[current_row - 1][current_column - 2] == 1:
-                    return self.update_player1_move(row, column, current_row, current_column)
-                else:
-                    return False
-        if row == current_row + 2 and column == current_column - 2:   # diagonal move
-            if self._board[current_row][current_column - 1] == 1 and \
-                    self._board[current_row][current_column - 3] == "fence":
-                if self._board[current_row + 1][current_column - 2] == 1:
-                    return self.update_player1_move(row, column, current_row, current_column)
-                else:
-                    return False
+    def to_bytes(self):
+        """returns the position packed into SNAPSHOT_BYTES bytes"""
+        return pack_snapshot(self.get_state(), self._game_state)
 
 
-    def player_1_move_right(self, row, column, current_row, current_column):
-        """called when player 2 is directly right of player 1, allows
-        jumping and diagonal moves when applicable"""
-        if row == current_row and column == current_column + 4:  # jump if applicable
-            if self._board[current_row][current_column + 1] == 1 and \
-                    self._board[current_row][current_column + 3] == 1:
-                return self.update_player1_move(row, column, current_row, current_column)
-            else:
-                return False
-        if row == current_row + 2 and column == current_column + 2:  # diagonal if allowed
-            if self._board[current_row][current_column + 1] == 1 and \
-                    self._board[current_row][current_column + 3] == "fence":
-                if self._board[current_row + 1][current_column + 2] == 1:
-                    return self.update_player1_move(row, column, current_row, current_column)
-            else:
-                return False
-        if row == current_row - 2 and column == current_column + 2:    # diagonal if allowed
-            if self._board[current_row][current_column + 1] == 1 and \
-                    self._board[current_row][current_column + 3] == "fence":
-                if self._board[current_row - 1][current_column + 2] == 1:
-                    return self.update_player1_move(row, column, current_row, current_column)
-            else:
-                return False
+    @classmethod
+    def from_bytes(cls, data):
+        """returns a new game holding the position from to_bytes"""
+        state, game_state = unpack_snapshot(data)
+        game = cls()
+        game.set_state(state)
+        game._game_state = game_state
+        return game
 
 
-    def player_1_move_up(self, row, column, current_row, current_column):
-        """called when player 2 space above player 1, allows jumping and
-        diagonal moves when applicable"""
-        if row == current_row - 4 and column == current_column:    # can jump be made
-            if self._board[current_row - 1][current_column] == 1 and \
-                    self._board[current_row - 3][current_column] == 1:
+    def canonical_key(self):
+        """returns (key, mirrored), key is the smaller of the snapshots of
+        the position and its left-right mirror image so both share one key,
+        mirrored is True when the key is the mirror image and moves looked
+        up with it have to be passed through mirror_move"""
+        state = self.get_state()
+        mirrored_h, mirrored_v = mirror_fences(state[2], state[3])
+        mirror = (mirror_cell(state[0]), mirror_cell(state[1]), mirrored_h, mirrored_v) + state[4:]
+        own = pack_snapshot(state, self._game_state)
+        other = pack_snapshot(mirror, self._game_state)
+        if other < own:
+            return other, True
+        return own, False
 
-                return self.update_player1_move(row, column, current_row, current_column)
-            else:
-                return False
-        if row == current_row - 2 and column == current_column + 2:    # diagonal move when allowed
-            if self._board[current_row - 1][current_column] == 1 and \
-                    self._board[current_row - 3][current_column] == "fence":
-                if self._board[current_row - 2][current_column + 1] == 1:
-                    return self.update_player1_move(row, column, current_row, current_column)
-            else:
-                return False
-                # upper right diagonal
-        if row == current_row - 2 and column == current_column - 2:   # diagonal move when allowed
-            if self._board[current_row][current_column + 1] == 1 and \
-                    self._board[current_row][current_column + 3] == "fence":
-                if self._board[current_row - 2][current_column - 1] == 1:
-                    return self.update_player1_move(row, column, current_row, current_column)
-            else:
-                return False
 
+    def get_hash(self):
+        """returns the 64 bit hash of the current position"""
+        return self._hash
 
-    def player_1_move_down(self, row, column, current_row, current_column):
-        """called when player 2 space below player 1, allows jumping and
-        diagonal moves when applicable"""
-        if row == current_row + 4 and column == current_column:    # jump when allowed
-            if self._board[current_row + 1][current_column] == 1 and \
-                    self._board[current_row + 3][current_column] == 1:
-                return self.update_player1_move(row, column, current_row, current_column)
-            else:
-                return False
-        if row == current_row + 2 and column == current_column + 2:  # diagonal when allowed
-            if self._board[current_row + 1][current_column] == 1 and \
-                    self._board[current_row + 3][current_column] == "fence":
-                if self._board[current_row + 2][current_column + 1] == 1:
-                    return self.update_player1_move(row, column, current_row, current_column)
-            else:
-                return False
 
-        if row == current_row + 2 and column == current_column - 2:   # diagonal when allowed
-            if self._board[current_row + 1][current_column] == 1 and \
-                    self._board[current_row + 3][current_column] == "fence":
-                if self._board[current_row + 2][current_column - 1] == 1:
-                    return self.update_player1_move(row, column, current_row, current_column)
-            else:
-                return False
+    def set_table(self, table):
+        """uses table to remember legality verdicts, None turns it off"""
+        self._table = table
 
 
-    def player_1_normal_move(self, row, column, current_row, current_column):
-        """called for all valid moves where pawns are not touching, validates
-        move and sends to update result"""
-        try:                          # player may only move one space
-            if self._board[row + 2][column] != "player_1" and \
-                self._board[row - 2][column] != "player_1" and \
-                self._board[row][column - 2] != "player_1" and \
-                self._board[row][column + 2] != "player_1":
-                return False
-        except:
-            pass
-        if column < current_column:       # move left
-            if self._board[row][column + 1] == 1:
-                return self.update_player1_move(row, column, current_row, current_column)
-            else:
-                return False
-        if column > current_column:     # move right
-            if self._board[row][column - 1] == 1:
-                return self.update_player1_move(row, column, current_row, current_column)
-            else:
-                return False
-        if row > current_row:           # move down
-            if self._board[row - 1][column] == 1:
-                return self.update_player1_move(row, column, current_row, current_column)
-            else:
-                return False
-        if row < current_row:          # move up
-            if self._board[row + 1][column] == 1:
-                return self.update_player1_move(row, column, current_row, current_column)
-            else:
-                return False
+    def get_table(self):
+        """returns the transposition table or None"""
+        return self._table
 
 
-    def update_player1_move(self,row, column, current_row, current_column):
-        """updates game board, current move, checks for winner"""
-        self._board[row][column] = "player_1"           # player 1 moved to new space
-        self._board[current_row][current_column] = 0    # old space set to 0
-        self._player_1_position = [row, column]         # current position reset
-        self._turn = "player_2"
-        if "player_1" in self._board[16]:               # check if player 1 won
-            self._game_state = "player1 wins"
-        return True
+    def set_profiler(self, profiler):
+        """attaches a GameProfiler, the methods in TIMED_METHODS are wrapped on
+        this game only so a game without a profiler runs the plain methods,
+        None takes the profiler and the wrappers off again"""
+        for name in TIMED_METHODS:
+            self.__dict__.pop(name, None)
+        self._profiler = profiler
+        if profiler is not None:
+            for name in TIMED_METHODS:
+                setattr(self, name, profiler.timed(name, getattr(self, name)))
 
 
-    def player_2_move(self, row, column):
-        """called for player 2 moves and calls different
-        method depending on whether or not the pawns are touching
-        try/except used to handle index out of range"""
-        current_row = self._player_2_position[0]
-        current_column = self._player_2_position[1]
-        try:               # is player 1 left of player 2
-            if self._board[current_row][current_column - 2] == "player_1":
-                if column < current_column:
-                    return self.player_2_move_left(self, row, column, current_row, current_column)
-        except:
-            pass
-        try:              # is player 1 right of player 2
-            if self._board[current_row][current_column + 2] == "player_1":
-                if column > current_column:
-                    return self.player_2_move_right(row, column, current_row, current_column)
-        except:
-            pass
-        try:            # is player 1 above player 2
-            if self._board[current_row - 2][current_column] == "player_1":
-                if row < current_row:
-                    self.player_2_move_up(row, column, current_row, current_column)
-        except:
-            pass
-        try:          # is player 1 below player 2
-            if self._board[current_row + 2][current_column] == "player_1":
-                if row > current_row:
-                    return self.player_2_move_down(row, column, current_row, current_column)
-        except:
-            pass
-        return self.player_2_normal_move(row, column, current_row, current_column)
-
-
-    def player_2_move_left(self, row, column, current_row, current_column):
-        """when player 1 pawn is left of player 2 this method allows jujping
-        and diagonal moves when applicable"""
-        if row == current_row and column == current_column - 4:   # jump when allowed
-            if self._board[current_row][current_column - 1] == 1 and \
-                    self._board[current_row][current_column - 3] == 1:
-                return self.update_player2_move(row, column, current_row, current_column)
-            else:
-                return False
-        if row == current_row - 2 and column == current_column - 2:   # diagonal when allowed
-            if self._board[current_row][current_column - 1] == 1 and \
-                    self._board[current_row][current_column - 3] == "fence":
-                if self._board[current_row - 1][current_column - 2] == 1:
-                    return self.update_player2_move(row, column, current_row, current_column)
-                else:
-                    return False
-        if row == current_row + 2 and column == current_column - 2:   # diagonal when allowed
-            if self._board[current_row][current_column - 1] == 1 and \
-                    self._board[current_row][current_column - 3] == "fence":
-                if self._board[current_row + 1][current_column - 2] == 1:
-                    return self.update_player2_move(row, column, current_row, current_column)
-                else:
-                    return False
+    def get_profiler(self):
+        """returns the attached GameProfiler or None"""
+        return self._profiler
 
 
-    def player_2_move_right(self, row, column, current_row, current_column):
-        """called when player 1 is right of player 2, allows jumping and diagonal
-        moves when applicable"""
-        if row == current_row and column == current_column + 4:   # jump when allowed
-            if self._board[current_row][current_column + 1] == 1 and \
-                self._board[current_row][current_column + 3] == 1:
-                return self.update_player2_move(row, column, current_row, current_column)
-            else:
-                return False
-        if row == current_row + 2 and column == current_column + 2:   # diagonal when allowed
-            if self._board[current_row][current_column + 1] == 1 and \
-                self._board[current_row][current_column + 3] == "fence":
-                if self._board[current_row + 1][current_column + 2] == 1:
-                    return self.update_player2_move(row, column, current_row, current_column)
-            else:
-                return False
-        if row == current_row - 2 and column == current_column + 2:   # diagonal when allowed
-            if self._board[current_row][current_column + 1] == 1 and \
-                    self._board[current_row][current_column + 3] == "fence":
-                if self._board[current_row - 1][current_column + 2] == 1:
-                    return self.update_player2_move(row, column, current_row, current_column)
-            else:
-                return False
+    def set_listener(self, listener):
+        """listener(game, move) is called after every committed pawn move or
+        fence with the move in apply format, and with None as the move after
+        undo or set_state, None removes the listener"""
+        self._listener = listener
 
 
-    def player_2_move_up(self, row, column, current_row, current_column):
-        """called when player 1 is above player 2, allows jumping and diagonal
-        moves when applicable"""
-        if row == current_row - 4 and column == current_column:   # jump when allowed
-            if self._board[current_row - 1][current_column] == 1 and \
-                self._board[current_row - 3][current_column] == 1:
-                return self.update_player2_move(row, column, current_row, current_column)
-            else:
-                return False
-        if row == current_row - 2 and column == current_column + 2:   # diagonal when allowed
-            if self._board[current_row - 1][current_column] == 1 and \
-                self._board[current_row - 3][current_column] == "fence":
-                if self._board[current_row - 2][current_column + 1] == 1:
-                    return self.update_player2_move(row, column, current_row, current_column)
-            else:
-                return False
-        if row == current_row - 2 and column == current_column - 2:  # diagonal when allowed
-            if self._board[current_row][current_column + 1] == 1 and \
-                    self._board[current_row][current_column + 3] == "fence":
-                if self._board[current_row - 2][current_column - 1] == 1:
-                    return self.update_player2_move(row, column, current_row, current_column)
-            else:
-                return False
+    def get_listener(self):
+        """returns the listener or None"""
+        return self._listener
 
 
-    def player_2_move_down(self, row, column, current_row, current_column):
-        """called when player 1 is below player 2, allows jumping and diagonal
-        moves when applicable"""
-        if row == current_row + 4 and column == current_column:       # jump when allowed
-            if self._board[current_row + 1][current_column] == 1 and \
-                self._board[current_row + 3][current_column] == 1:
-                return self.update_player2_move(row, column, current_row, current_column)
-            else:
-                return False
-        if row == current_row + 2 and column == current_column + 2:  # diagonal when allowed
-            if self._board[current_row + 1][current_column] == 1 and \
-                self._board[current_row + 3][current_column] == "fence":
-                if self._board[current_row + 2][current_column + 1] == 1:
-                    return self.update_player2_move(row, column, current_row, current_column)
-            else:
-                return False
+    def reject(self, reason):
+        """counts a rejected move when profiling, always returns False"""
+        if self._profiler is not None:
+            self._profiler.reject(reason)
+        return False
 
-        if row == current_row + 2 and column == current_column - 2:  # diagonal when allowed
-            if self._board[current_row + 1][current_column] == 1 and \
-                    self._board[current_row + 3][current_column] == "fence":
-                if self._board[current_row + 2][current_column - 1] == 1:
-                    return self.update_player2_move(row, column, current_row, current_column)
-            else:
-                return False
 
+    def fence_key(self, direction, slot):
+        """returns the hash key of a fence in slot"""
+        if direction == "h":
+            return H_FENCE_KEYS[slot]
+        return V_FENCE_KEYS[slot]
 
-    def player_2_normal_move(self, row, column, current_row, current_column):
-        """used for all player 2 moves where pawns are not touching
-        validates and sents to update results"""
-        try:           # may only move one space at a time
-            if self._board[row + 2][column] != "player_2" and \
-                self._board[row - 2][column] != "player_2" and \
-                self._board[row][column - 2] != "player_2" and \
-                self._board[row][column + 2] != "player_2":
-                return False
-        except:
-            pass
-        if column < current_column:              # move left
-            if self._board[row][column + 1] == 1:
-                return self.update_player2_move(row, column, current_row, current_column)
-            else:
-                return False
-        if column > current_column:             # move right
-            if self._board[row][column - 1] == 1:
-                return self.update_player2_move(row, column, current_row, current_column)
-            else:
-                return False
-        if row > current_row:                # move down
-            if self._board[row - 1][column] == 1:
-                return self.update_player2_move(row, column, current_row, current_column)
-            else:
-                return False
-        if row < current_row:              # move up
-            if self._board[row + 1][column] == 1:
-                return self.update_player2_move(row, column, current_row, current_column)
-            else:
+
+    def open_cells(self, cell):
+        """returns the cells a pawn on cell could step to if no
+        pawn was in the way"""
+        h_fences, v_fences = self._h_fences, self._v_fences
+        return [step for step, h_bit, v_bit in STEPS[cell] if not (h_fences & h_bit or v_fences & v_bit)]
+
+
+    def fence_cells(self, direction, slot):
+        """returns the two cells a fence in slot separates"""
+        if direction == "h":
+            return slot - SIZE, slot                     # cell above and cell below
+        return slot - 1, slot                            # cell left and cell right
+
+
+    def is_turn(self, player):
+        """returns True if the game is unfinished and it is player's turn"""
+        if self._game_state != "unfinished":
+            return False
+        return self._turn == "player_" + str(player)
+
+
+    def legal_moves(self, player):
+        """returns a list of every (x, y) the player's pawn may move to,
+        empty if it is not their turn"""
+        if not self.is_turn(player):
+            return []
+        if player == 1:
+            targets = pawn_targets(self._h_fences, self._v_fences, self._player_1_position, self._player_2_position)
+        else:
+            targets = pawn_targets(self._h_fences, self._v_fences, self._player_2_position, self._player_1_position)
+        return [(cell % SIZE, cell // SIZE) for cell in targets]
+
+
+    def legal_fences(self, player):
+        """returns a list of (direction, (x, y)) for every fence the player
+        may place, fences that cannot touch a shortest path of the opposite
+        player are accepted without a search"""
+        if not self.is_turn(player):
+            return []
+        if player == 1 and self._player_1_fences == 0 or player == 2 and self._player_2_fences == 0:
+            return []
+        free_h = BOARD & ~(self._h_fences | TOP_ROW)       # no fence there and not on the edge
+        free_v = BOARD & ~(self._v_fences | LEFT_COLUMN)
+        fences = []
+        for slot in range(CELLS):
+            if free_h >> slot & 1 and not self.fence_blocks(player, "h", slot):
+                fences.append(("h", (slot % SIZE, slot // SIZE)))
+            if free_v >> slot & 1 and not self.fence_blocks(player, "v", slot):
+                fences.append(("v", (slot % SIZE, slot // SIZE)))
+        return fences
+
+
+    def fence_blocks(self, player, direction, slot):
+        """returns True if a fence in the free slot would cut the opposite
+        player off from their goal row"""
+        key = self._hash ^ self.fence_key(direction, slot) ^ BLOCK_KEY
+        verdict = None if self._table is None else self._table.get_verdict(key)
+        if verdict is None:
+            verdict = self.search_fence_block(player, direction, slot)
+            if self._table is not None:
+                self._table.store_verdict(key, verdict)
+        return verdict
+
+
+    def search_fence_block(self, player, direction, slot):
+        """asks the opposite player's distance grid whether a fence in the
+        free slot leaves their pawn without a path"""
+        if player == 1:
+            distances, pawn = self._player_2_distances, self._player_2_position
+        else:
+            distances, pawn = self._player_1_distances, self._player_1_position
+        first, second = self.fence_cells(direction, slot)
+        self.set_fence(direction, slot)
+        blocked = distances.cuts_off(self, first, second, pawn)
+        self.remove_fence(direction, slot)
+        if self._profiler is not None:
+            self._profiler.count("fence_block_searches")
+        return blocked
+
+
+    def move_pawn(self, player, new_space):
+        """performs initial validation of pawn move
+        and sends it to pawn_move"""
+        if new_space[1] < 0 or new_space[0] < 0:          # move is in range
+            return self.reject("out_of_range")
+        if new_space[1] > 8 or new_space[0] > 8:          # move is in range
+            return self.reject("out_of_range")
+        if self._game_state != "unfinished":              # game not won yet
+            return self.reject("game_over")
+        if player == 1 and self._turn == "player_2":      # correct turn
+            return self.reject("wrong_turn")
+        if player == 2 and self._turn == "player_1":
+            return self.reject("wrong_turn")
+        if player != 1 and player != 2:
+            return self.reject("bad_player")
+        cell = new_space[1] * SIZE + new_space[0]         # converted to a cell number
+        if cell == self._player_1_position or cell == self._player_2_position:
+            return self.reject("occupied")                # space is taken by a pawn
+        if self._table is not None:
+            return self.cached_pawn_move(player, cell) or self.reject("illegal_move")
+        return self.pawn_move(player, cell) or self.reject("illegal_move")
+
+
+    def cached_pawn_move(self, player, cell):
+        """looks the move up in the transposition table and only runs the
+        move validation for a position and move not seen before, the target
+        has its own key so a move and its reverse get different entries"""
+        key = self._hash ^ MOVE_TARGET_KEYS[player - 1][cell]
+        verdict = self._table.get_verdict(key)
+        if verdict is None:
+            verdict = self.pawn_move(player, cell)
+            self._table.store_verdict(key, verdict)
+            return verdict
+        if verdict and player == 1:
+            return self.update_player1_move(cell)
+        if verdict:
+            return self.update_player2_move(cell)
+        return False
+
+
+    def pawn_move(self, player, cell):
+        """moves the player's pawn to the free cell if the move tables allow
+        it, the same check for both players"""
+        if player == 1:
+            if not pawn_allowed(self._h_fences, self._v_fences, self._player_1_position, self._player_2_position, cell):
                 return False
+            return self.update_player1_move(cell)
+        if not pawn_allowed(self._h_fences, self._v_fences, self._player_2_position, self._player_1_position, cell):
+            return False
+        return self.update_player2_move(cell)
+
+
+    def update_player1_move(self, cell):
+        """updates pawn position, current move, checks for winner"""
+        self._history.append((1, self._player_1_position))
+        self._hash ^= PAWN_KEYS[0][self._player_1_position] ^ PAWN_KEYS[0][cell] ^ TURN_KEY
+        self._player_1_position = cell                     # current position reset
+        self._turn = "player_2"
+        if BOTTOM_ROW >> cell & 1:                         # check if player 1 won
+            self._game_state = "player1 wins"
+        if self._listener is not None:
+            self._listener(self, (cell % SIZE, cell // SIZE))
+        return True
 
 
-    def update_player2_move(self, row, column, current_row,current_column):
-        """updates game board current turn and checks if player 2 won"""
-        self._board[current_row][current_column] = 0   # sets ond player 2 position to 0
-        self._board[row][column] = "player_2"          # sets new player 2 space
-        self._player_2_position = [row, column]        # sets new player 2 position
+    def update_player2_move(self, cell):
+        """updates pawn position, current turn and checks if player 2 won"""
+        self._history.append((2, self._player_2_position))
+        self._hash ^= PAWN_KEYS[1][self._player_2_position] ^ PAWN_KEYS[1][cell] ^ TURN_KEY
+        self._player_2_position = cell                     # sets new player 2 position
         self._turn = "player_1"
-        if "player_2" in self._board[0]:               # check if player 2 won
+        if TOP_ROW >> cell & 1:                            # check if player 2 won
             self._game_state = "player2 wins"
+        if self._listener is not None:
+            self._listener(self, (cell % SIZE, cell // SIZE))
         return True
 
 
     def place_fence(self, player, direction, position):
-        """does initial validation and sends to method to create
-        temporary board"""
+        """does initial validation and sends to method to check
+        the fair play rule"""
         if position[1] < 0 or position[0] < 0:     # validate range
-            return False
+            return self.reject("out_of_range")
         if position[1] > 8 or position[0] > 8:     # validate range
-            return False
+            return self.reject("out_of_range")
         if direction == "v" and position[0] == 0:  # fence may not be along edge
-            return False
+            return self.reject("on_edge")
         if direction == "h" and position[1] == 0:  # fence may not be along edge
-            return False
+            return self.reject("on_edge")
+        if direction != "v" and direction != "h":
+            return self.reject("bad_direction")
         if player == 1 and self._turn == "player_2":  # correct turn
-            return False
+            return self.reject("wrong_turn")
         if player == 2 and self._turn == "player_1":  # correct turn
-            return False
+            return self.reject("wrong_turn")
+        if player != 1 and player != 2:
+            return self.reject("bad_player")
         if self._game_state != "unfinished":     # game not won yet
-            return False
-        row = position[1] + position[1] -1      # converts row to be used in method
-        column = position[0] + position[0] -1   # converts column to be used in method
+            return self.reject("game_over")
+        if player == 1 and self._player_1_fences == 0:   # player 1 has fences left
+            return self.reject("no_fences")
+        if player == 2 and self._player_2_fences == 0:   # player 2 has fences left
+            return self.reject("no_fences")
+        return self.check_fence(player, direction, position[1] * SIZE + position[0])
+
+
+    def check_fence(self, player, direction, slot):
+        """makes sure the fence slot is free and that the fence leaves the
+        opposite player a way to their goal row, then adds the fence"""
+        if direction == "h" and self._h_fences >> slot & 1:   # fence already there
+            return self.reject("slot_taken")
+        if direction == "v" and self._v_fences >> slot & 1:   # fence already there
+            return self.reject("slot_taken")
+        key = self._hash ^ self.fence_key(direction, slot) ^ BLOCK_KEY
+        if self._table is not None and self._table.get_verdict(key):
+            self.reject("fair_play")
+            return FAIR_PLAY_MESSAGE                  # known to block, no search needed
+        changes = self.calculate_fairplay(player, direction, slot)
+        if self._table is not None:
+            self._table.store_verdict(key, changes is None)
+        if changes is None:
+            self.reject("fair_play")
+            return FAIR_PLAY_MESSAGE
         if player == 1:
-            if self._player_1_fences == 0:        # player 1 has fences left
-                return False
-            return self.add_p1_temp_fence(player, direction, position)
-        if player == 2:
-            if self._player_2_fences == 0:       # player 2 has fences left
-                return False
-            return self.add_p1_temp_fence(player, direction, position)
+            return self.add_p1_fence(direction, slot, changes)
+        return self.add_p2_fence(direction, slot, changes)
 
 
-    def add_p1_temp_fence(self, player, direction, position):
-        """creates temporary board to be used in fairplay validation by
-        player 1, sends to fairplay rules method"""
-        temp_board = copy.deepcopy(self._board)     # deep copy of game board
-        row = position[1]*2
-        column = position[0]*2
+    def calculate_fairplay(self, player, direction, slot):
+        """puts the fence on the board for a moment and asks the opposite
+        player's distance grid which cells lose their path, returns those
+        changes or None if the opposite pawn is cut off from its goal"""
+        if player == 1:
+            distances, pawn = self._player_2_distances, self._player_2_position
+        else:
+            distances, pawn = self._player_1_distances, self._player_1_position
+        first, second = self.fence_cells(direction, slot)
+        self.set_fence(direction, slot)
+        changes = distances.wall_changes(self, first, second)
+        self.remove_fence(direction, slot)
+        if self._profiler is not None:
+            self._profiler.count("fairplay_checks")
+            self._profiler.count("fairplay_cells_repaired", len(changes))
+            self._profiler.record_max("fairplay_cells_repaired", len(changes))
+        if changes.get(pawn, distances.get_distance(pawn)) == UNREACHABLE:
+            return None
+        return changes
+
+
+    def set_fence(self, direction, slot):
+        """sets the bit for the fence slot"""
         if direction == "v":
-            if column != 0:
-                if temp_board[row][column-1] == 1:     # adds fence to temporary board
-                    temp_board[row][column-1] = "fence"
-                else:
-                    return False
-        if direction == "h":
-            if row != 0:
-                if temp_board[row-1][column] == 1:     # adds fence to temp board
-                    temp_board[row-1][column] = "fence"
-                else:
-                    return False
-        return self.check_fair_play_1(player, direction, position, temp_board)
+            self._v_fences |= 1 << slot
+        else:
+            self._h_fences |= 1 << slot
 
 
-    def add_p2_temp_fence(self, player, direction, position):
-        """creates a temporary board for player 2 to be used in fairplay
-        validation"""
-        temp_board = copy.deepcopy(self._board)     # deep copy of game board
-        row = position[1]*2
-        column = position[0]*2
+    def remove_fence(self, direction, slot):
+        """clears the bit for the fence slot"""
         if direction == "v":
-            if column != 0:
-                if temp_board[row][column-1] == 1:   # adds fence to temp board
-                    temp_board[row][column-1] = "fence"
-                else:
-                    return False
-        if direction == "h":
-            if row != 0:
-                if temp_board[row][column-1] == 1:   # adds fence to temp board
-                    temp_board[row][column-1] = "fence"
-                else:
-                    return False
-        return self.check_fair_play_2(player, direction, position, temp_board)
-
-
-    def check_fair_play_1(self, player, direction, position, temp_board):
-        """initializes the temporary board to be used in fairplay validation
-        and sends to fairplay calculation"""
-        p2_row = self._player_2_position[0]
-        p2_column = self._player_2_position[1]
-        try:                       # try and except used for index range errors
-            if temp_board[p2_row + 1][p2_column] == 1:
-                temp_board[p2_row + 2][p2_column] = "red"
-        except:
-            pass
-        try:              # all spaces adjacent to posing player are 'red'
-            if temp_board[p2_row - 1][p2_column] == 1:
-                temp_board[p2_row - 2][p2_column] = "red"
-        except:
-            pass
-        try:
-            if temp_board[p2_row][p2_column + 1] == 1:
-                temp_board[p2_row][p2_column + 2] = "red"
-        except:
-            pass
-        try:
-            if temp_board[p2_row][p2_column - 1] == 1:
-                temp_board[p2_row][p2_column - 2] = "red"
-        except:
-            pass
-        return self.calculate_fairplay(temp_board, player, direction, position)
-
-
-    def check_fair_play_2(self, player, direction, position, temp_board):
-        """initializes board for player 2 and sends to method for fairplay
-        validation"""
-        p1_row = self._player_1_position[0]
-        p1_column = self._player_1_position[1]
-        try:              # try and except used for index range errors
-            if temp_board[p1_row + 1][p1_column] == 1:  # down
-                temp_board[p1_row + 2][p1_column] = "red"
-        except:
-            pass
-        try:              # all space adjacent to player 1 are 'red'
-            if temp_board[p1_row - 1][p1_column] == 1:
-                temp_board[p1_row - 2][p1_column] = "red"
-        except:
-            pass
-        try:
-            if temp_board[p1_row][p1_column + 1] == 1:
-                temp_board[p1_row][p1_column + 2] = "red"
-        except:
-            pass
-        try:
-            if temp_board[p1_row][p1_column - 1] == 1:
-                temp_board[p1_row][p1_column - 2] = "red"
-        except:
-            pass
-        return self.calculate_fairplay(temp_board, player, direction, position)
-
-
-    def calculate_fairplay(self, temp_board, player, direction, position, counter=0, limit=17):
-        """recursive method to validate fairplay, changes every board space the opposite player
-        has acces to to 'red' and continues if the opposite baseline has a 'red' space"""
+            self._v_fences &= ~(1 << slot)
+        else:
+            self._h_fences &= ~(1 << slot)
+
+
+    def add_p1_fence(self, direction, slot, changes):
+        """updates the board adding fence and both distance grids, updates
+        turn, subtracts an available fence from player 1"""
+        self.set_fence(direction, slot)               # fence added
+        old_2 = self._player_2_distances.apply(changes)
+        first, second = self.fence_cells(direction, slot)
+        old_1 = self._player_1_distances.apply(self._player_1_distances.wall_changes(self, first, second))
+        self._history.append((1, direction, slot, old_1, old_2))
+        self._hash ^= self.fence_key(direction, slot) ^ TURN_KEY ^ FENCES_LEFT_KEYS[0][self._player_1_fences] \
+            ^ FENCES_LEFT_KEYS[0][self._player_1_fences - 1]
+        self._player_1_fences -= 1                    # fence subtracted from player 1
+        self._turn = "player_2"                       # player 2 turn
+        if self._listener is not None:
+            self._listener(self, (direction, (slot % SIZE, slot // SIZE)))
+        return True
+
+
+    def add_p2_fence(self, direction, slot, changes):
+        """updates game board and both distance grids with fence, updates
+        turn and fences available to player 2"""
+        self.set_fence(direction, slot)               # fence added
+        old_1 = self._player_1_distances.apply(changes)
+        first, second = self.fence_cells(direction, slot)
+        old_2 = self._player_2_distances.apply(self._player_2_distances.wall_changes(self, first, second))
+        self._history.append((2, direction, slot, old_1, old_2))
+        self._hash ^= self.fence_key(direction, slot) ^ TURN_KEY ^ FENCES_LEFT_KEYS[1][self._player_2_fences] \
+            ^ FENCES_LEFT_KEYS[1][self._player_2_fences - 1]
+        self._player_2_fences -= 1                    # fence used by player 2
+        self._turn = "player_1"                       # player 1 turn
+        if self._listener is not None:
+            self._listener(self, (direction, (slot % SIZE, slot // SIZE)))
+        return True
+
+
+    def apply(self, move):
+        """makes a move for the player whose turn it is, a pawn move is an
+        (x, y) tuple and a fence is a (direction, (x, y)) tuple, returns the
+        same result as move_pawn or place_fence"""
+        player = 1 if self._turn == "player_1" else 2
+        if isinstance(move[0], str):
+            return self.place_fence(player, move[0], move[1])
+        return self.move_pawn(player, move)
+
+
+    def undo(self):
+        """takes back the last pawn move or fence, returns False if
+        no move has been made"""
+        if not self._history:
+            return False
+        record = self._history.pop()
+        self._turn = "player_" + str(record[0])       # the undone move's player is up again
+        self._game_state = "unfinished"               # no move is made after a win
+        if len(record) == 2:
+            self.undo_pawn(*record)
+        else:
+            self.undo_fence(*record)
+        if self._listener is not None:
+            self._listener(self, None)
+        return True
+
+
+    def undo_pawn(self, player, cell):
+        """puts the player's pawn back on cell"""
         if player == 1:
-            if "red" in temp_board[0]:   # continue if fairplay rule is followed
-                return self.add_p1_fence(direction, position)
-        if player == 2:
-            if "red" in temp_board[16]:   # continue if fairplay rule is followed
-                return self.add_p2_fence(direction, position)
-        while 0 < limit:                # if opposite baseline not reached in 17 moves fence not allowed
-            for num in range(0,8):
-                num = num*2
-                count = 0
-                for space in temp_board[num]:
-                    if space == "red":
-                        try:    # adjacent squared to 'red' spaces become 'red
-                            if temp_board[num+ 1][count] == 1:
-                                temp_board[num + 2][count] = "red"
-                        except:
-                            pass
-                        try:
-                            if temp_board[num- 1][count] == 1:
-                                temp_board[num - 2][count] = "red"
-                        except:
-                            pass
-                        try:
-                            if temp_board[num][count + 1] == 1:
-                                temp_board[num][count + 2] = "red"
-                        except:
-                            pass
-                        try:
-                            if temp_board[num][count - 1] == 1:
-                                temp_board[num][count - 2] = "red"
-                        except:
-                            pass
-                        count +=2
-            return self.calculate_fairplay(temp_board, player, direction, position, counter+1, limit-1)
-        return "breaks the fairplay rule."
-
-
-    def add_p1_fence(self, direction, position):
-        """updates the board dding fence, updates turn,subtracts an
-        available fence from player 1"""
-        row = position[1]*2
-        column = position[0]*2
-        if direction == "v":                          # vertical fence
-            if self._board[row - 1][column] == 1:
-                self._board[row][column-1] = "fence"  # fence added
-                self._player_1_fences -= 1            # fence subtracted from player 1
-                self._turn = "player_2"               # player 2 turn
-                return True
-            else:
-                return False
-        if direction == "h":                          # horizontal fence
-            if self._board[row-1][column] == 1:
-                self._board[row-1][column] = "fence"  # fence added
-                self._player_1_fences -= 1            # fence taken away after use
-                self._turn = "player_2"               # player 2 turn
-                return True
-            else:
-                return False
+            self._hash ^= PAWN_KEYS[0][self._player_1_position] ^ PAWN_KEYS[0][cell] ^ TURN_KEY
+            self._player_1_position = cell
+        else:
+            self._hash ^= PAWN_KEYS[1][self._player_2_position] ^ PAWN_KEYS[1][cell] ^ TURN_KEY
+            self._player_2_position = cell
+        return True
 
 
-    def add_p2_fence(self, direction, position):
-        """updates game board with fence updates turn and
-        fences available to player 2"""
-        row = position[1]*2
-        column = position[0]*2
-        if direction == "v":                          # vertical fence
-            if self._board[row - 1][column] == 1:
-                self._board[row][column-1] = "fence"  # fence added
-                self._player_2_fences -= 1            # fence used by player 2
-                self._turn = "player_1"               # player 1 turn
-                return True
-            else:
-                return False
-        if direction == "h":                           # horizontal fences
-            if self._board[row-1][column] == 1:
-                self._board[row-1][column] = "fence"   # fence added
-                self._player_2_fences -= 1             # fence used by player 2
-                self._turn = "player_1"                # player 1 turn
-                return True
-            else:
-                return False
+    def undo_fence(self, player, direction, slot, old_1, old_2):
+        """removes the fence, gives it back to the player and restores
+        the distances the fence changed"""
+        self.remove_fence(direction, slot)
+        self._player_1_distances.apply(old_1)
+        self._player_2_distances.apply(old_2)
+        if player == 1:
+            self._hash ^= FENCES_LEFT_KEYS[0][self._player_1_fences] ^ FENCES_LEFT_KEYS[0][self._player_1_fences + 1]
+            self._player_1_fences += 1
+        else:
+            self._hash ^= FENCES_LEFT_KEYS[1][self._player_2_fences] ^ FENCES_LEFT_KEYS[1][self._player_2_fences + 1]
+            self._player_2_fences += 1
+        self._hash ^= self.fence_key(direction, slot) ^ TURN_KEY
+        return True
 
 
     def is_winner(self, player):
         """takes player and returns true if they won and
         false otherwise"""
         if player == 1:
-            if self._game_state == "player1 wins":
-                return True                   # player 1 win
-            else:
-                return False
+            return self._game_state == "player1 wins"     # player 1 win
         if player == 2:
-            if self._game_state == "player2 wins":
-                return True                  # player 2 win
-            else:
-                return False
+            return self._game_state == "player2 wins"     # player 2 win
+        return False
+
+
+    def get_turn(self):
+        """returns the number of the player whose turn it is"""
+        return 1 if self._turn == "player_1" else 2
+
+
+    def get_game_state(self):
+        """returns 'unfinished', 'player1 wins' or 'player2 wins'"""
+        return self._game_state
+
+
+    def get_history_length(self):
+        """returns the number of moves that can be undone"""
+        return len(self._history)
+
+
+    def get_position(self, player):
+        """returns the (x, y) of the player's pawn"""
+        cell = self._player_1_position if player == 1 else self._player_2_position
+        return cell % SIZE, cell // SIZE
+
+
+    def get_fences_left(self, player):
+        """returns how many fences the player has left"""
+        return self._player_1_fences if player == 1 else self._player_2_fences
+
+
+    def distance(self, player, position=None):
+        """returns the number of steps from position to the player's goal
+        row, the player's own pawn is used when no position is given and
+        a cut off cell returns UNREACHABLE"""
+        if player == 1:
+            distances, cell = self._player_1_distances, self._player_1_position
+        else:
+            distances, cell = self._player_2_distances, self._player_2_position
+        if position is not None:
+            cell = position[1] * SIZE + position[0]
+        return distances.get_distance(cell)
+
+
+    def shortest_path(self, player, position=None):
+        """returns a list of (x, y) along one shortest path from position
+        (the player's pawn when not given) to the player's goal row, the
+        start is not included and None is returned if it is cut off, the
+        length of the list is distance(player, position)"""
+        if player == 1:
+            distances, cell = self._player_1_distances, self._player_1_position
+        else:
+            distances, cell = self._player_2_distances, self._player_2_position
+        if position is not None:
+            cell = position[1] * SIZE + position[0]
+        path = distances.path_from(self, cell)
+        if path is None:
+            return None
+        return [(step % SIZE, step // SIZE) for step in path]
+
+
+    def get_board(self):
+        """builds the old 17x17 list of lists view of the board for debugging,
+        pawns can occupy 0's and fences can occupy 1's"""
+        board = []
+        for row in range(SIZE * 2 - 1):
+            if row % 2:                                # row of horizontal fence slots
+                board.append([1] * (SIZE * 2 - 1))
+            else:
+                board.append([0 if column % 2 == 0 else 1 for column in range(SIZE * 2 - 1)])
+        for slot in range(CELLS):
+            row, column = slot // SIZE * 2, slot % SIZE * 2
+            if self._h_fences >> slot & 1:
+                board[row - 1][column] = "fence"
+            if self._v_fences >> slot & 1:
+                board[row][column - 1] = "fence"
+        p1, p2 = self._player_1_position, self._player_2_position
+        board[p1 // SIZE * 2][p1 % SIZE * 2] = "player_1"
+        board[p2 // SIZE * 2][p2 % SIZE * 2] = "player_2"
+        return board
 
 
     def print_board(self):
         """prints game board line by line"""
-        for item in self._board:
+        for item in self.get_board():
             print(item)
-
-
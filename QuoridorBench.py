@@ -0,0 +1,335 @@
+# Author: Devon Miller
+# Date: 8/5/2021
+# Description: Benchmarks for the hot paths of QuoridorGame. Every scenario times single
+#              calls of move_pawn or place_fence (normal, jump and diagonal pawn moves and
+#              fences on an empty, mid game and heavily fenced board) and whole random games.
+#              Each call is timed on its own so the results hold percentiles as well as
+#              operations per second, and a tracemalloc pass counts the memory blocks a call
+#              leaves allocated (blocks it frees again before returning are not seen). Results can be saved as JSON and compared to a saved baseline, any
+#              scenario slower than the baseline by more than the tolerance fails the run.
+#              --memory also measures the live bytes of one QuoridorGame and one
+#              CompactGame after a few opening moves. --variants times move_pawn and
+#              place_fence in random VariantGames on bigger boards and with 4 players.
+#              --planes times QuoridorPlanes.encode_batch on positions from random games.
+#
+#              python QuoridorBench.py --save results.json --baseline baseline.json
+#              python QuoridorBench.py --memory
+#              python QuoridorBench.py --variants
+#              python QuoridorBench.py --planes
+
+import argparse
+import json
+import random
+import sys
+import time
+import tracemalloc
+
+from Quoridor import QuoridorGame, SIZE
+from QuoridorBatch import BatchQuoridor
+from QuoridorCompact import CompactGame
+from QuoridorPlanes import encode_batch
+from QuoridorVariant import VariantGame
+
+
+def cell(x, y):
+    """returns the cell number of (x, y)"""
+    return y * SIZE + x
+
+
+def fence_mask(slots):
+    """returns a fence mask with a bit for every (x, y) in slots"""
+    mask = 0
+    for x, y in slots:
+        mask |= 1 << cell(x, y)
+    return mask
+
+
+def position(player_1, player_2, h_slots=(), v_slots=(), fences=(11, 11), turn=1):
+    """returns a game set up with pawns at player_1 and player_2 and fences"""
+    game = QuoridorGame()
+    game.set_state((cell(*player_1), cell(*player_2), fence_mask(h_slots), fence_mask(v_slots),
+                    fences[0], fences[1], turn))
+    return game
+
+
+def heavy_position():
+    """a board with 25 fences that still leaves both players a path"""
+    h_slots = [(x, y) for y in (2, 4, 6) for x in range(SIZE) if x not in (y, y + 1)]
+    v_slots = [(3, 0), (5, 0), (3, 8), (5, 8)]
+    return position((4, 0), (4, 8), h_slots, v_slots, fences=(1, 1))
+
+
+def mid_game_position():
+    """a board after a few pawn moves and eight fences"""
+    h_slots = [(2, 3), (3, 3), (6, 5), (7, 5)]
+    v_slots = [(4, 2), (5, 6), (2, 7), (7, 1)]
+    return position((4, 2), (4, 6), h_slots, v_slots, fences=(7, 7))
+
+
+SCENARIOS = {
+    "move_pawn_normal": (lambda: QuoridorGame(), lambda game: game.move_pawn(1, (4, 1))),
+    "move_pawn_jump": (lambda: position((4, 3), (4, 4)), lambda game: game.move_pawn(1, (4, 5))),
+    "move_pawn_diagonal": (lambda: position((4, 3), (4, 4), h_slots=[(4, 5)]),
+                           lambda game: game.move_pawn(1, (5, 4))),
+    "place_fence_empty": (lambda: QuoridorGame(), lambda game: game.place_fence(1, "h", (4, 4))),
+    "place_fence_mid_game": (mid_game_position, lambda game: game.place_fence(1, "h", (4, 6))),
+    "place_fence_heavy": (heavy_position, lambda game: game.place_fence(1, "v", (4, 7))),
+}
+
+
+def time_calls(setup, call, count):
+    """times count calls on one game, the move is undone after each call
+    outside the timed part, returns the times in seconds"""
+    game = setup()
+    if call(game) is not True:
+        raise ValueError("benchmark move was rejected")
+    game.undo()
+    times = []
+    clock = time.perf_counter
+    for repeat in range(count):
+        start = clock()
+        call(game)
+        times.append(clock() - start)
+        game.undo()
+    return times
+
+
+def count_retained(setup, call, count):
+    """returns the memory blocks and bytes one call leaves allocated,
+    averaged over count calls, tracemalloc snapshots only see what is
+    still allocated so blocks freed within the call are not counted"""
+    game = setup()
+    tracemalloc.start()
+    blocks = size = 0
+    for repeat in range(count):
+        before = tracemalloc.take_snapshot()
+        call(game)
+        after = tracemalloc.take_snapshot()
+        for difference in after.compare_to(before, "lineno"):
+            blocks += max(difference.count_diff, 0)
+            size += max(difference.size_diff, 0)
+        game.undo()
+    tracemalloc.stop()
+    return blocks / count, size / count
+
+
+def random_game(rng):
+    """plays one random game of legal moves and returns its length"""
+    game = QuoridorGame()
+    plies = 0
+    while game.get_game_state() == "unfinished" and plies < 400:
+        player = game.get_turn()
+        moves = game.legal_moves(player)
+        if rng.random() < 0.2 and game.get_fences_left(player):
+            fence = (rng.choice("hv"), (rng.randint(1, 8), rng.randint(1, 8)))
+            if game.place_fence(player, *fence) is True:
+                plies += 1
+                continue
+        game.move_pawn(player, rng.choice(moves))
+        plies += 1
+    return plies
+
+
+def time_games(count, seed=162):
+    """times count whole random games, returns the times in seconds"""
+    rng = random.Random(seed)
+    times = []
+    for repeat in range(count):
+        start = time.perf_counter()
+        random_game(rng)
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def memory_per_game(factory, count=10000, seed=162):
+    """returns the live bytes per game of count games made by factory, each
+    game has had two pawn moves and one fence per player"""
+    rng = random.Random(seed)
+    tracemalloc.start()
+    games = []
+    for number in range(count):
+        game = factory()
+        for player in (1, 2):
+            game.move_pawn(player, rng.choice(game.legal_moves(player)))
+        for player in (1, 2):
+            while game.place_fence(player, rng.choice("hv"), (rng.randint(1, 8), rng.randint(1, 8))) is not True:
+                pass
+        games.append(game)
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return (size - sys.getsizeof(games)) / count
+
+
+def time_variant_game(game, rng, pawn_times, fence_times):
+    """plays one random VariantGame, adding the seconds of every move_pawn
+    and place_fence call to pawn_times and fence_times"""
+    clock = time.perf_counter
+    size = game.get_size()
+    for ply in range(20 * size):
+        player = game.get_turn()
+        moves = game.legal_moves(player)
+        if not moves or game.get_game_state() != "unfinished":
+            break
+        if rng.random() < 0.2 and game.get_fences_left(player):
+            fence = (rng.choice("hv"), (rng.randint(1, size - 1), rng.randint(1, size - 1)))
+            start = clock()
+            placed = game.place_fence(player, *fence)
+            fence_times.append(clock() - start)
+            if placed is True:
+                continue
+        move = rng.choice(moves)
+        start = clock()
+        game.move_pawn(player, move)
+        pawn_times.append(clock() - start)
+
+
+def mean_us(times):
+    """returns the mean of times in microseconds, 0.0 when there are none"""
+    return sum(times) / len(times) * 1e6 if times else 0.0
+
+
+def time_variants(sizes=(9, 11, 13, 17), player_counts=(2, 4), games=20, seed=162):
+    """plays random games on every board size and player count and returns
+    a dict of mean microseconds per move_pawn and place_fence call by
+    variant name, e.g. '11x11 4p', 0.0 for a call that was never made"""
+    rng = random.Random(seed)
+    results = {}
+    for size in sizes:
+        for players in player_counts:
+            pawn_times, fence_times = [], []
+            for number in range(games):
+                time_variant_game(VariantGame(size, players=players), rng, pawn_times, fence_times)
+            results[str(size) + "x" + str(size) + " " + str(players) + "p"] = {
+                "move_pawn_us": mean_us(pawn_times), "place_fence_us": mean_us(fence_times)}
+    return results
+
+
+def time_planes(count=20000, seed=162):
+    """encodes count positions taken from random BatchQuoridor games and
+    returns a dict of positions per second by encode_batch setting"""
+    batch = BatchQuoridor(count // 40, seed)
+    states = []
+    while len(states) < count:
+        batch.step()
+        states.extend(batch.get_state(index) for index in range(batch.get_count()))
+    states = states[:count]
+    planes = masks = None
+    results = {}
+    for name, augment, legal in (("planes", False, False), ("planes + legal", False, True),
+                                 ("planes + legal, augmented", True, True)):
+        start = time.perf_counter()
+        planes, masks, written = encode_batch(states, planes, masks, augment, legal)
+        results[name] = written / (time.perf_counter() - start)
+    return results
+
+
+def summarize(times):
+    """returns ops/second and p50/p90/p99 latency in microseconds"""
+    ordered = sorted(times)
+    result = {"ops": len(ordered), "ops_per_second": len(ordered) / sum(ordered)}
+    for name, fraction in (("p50_us", 0.50), ("p90_us", 0.90), ("p99_us", 0.99)):
+        result[name] = ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] * 1e6
+    return result
+
+
+def run(count=20000, games=50, retained_count=200):
+    """runs every scenario and returns a dict of results by scenario name"""
+    results = {}
+    for name, (setup, call) in SCENARIOS.items():
+        results[name] = summarize(time_calls(setup, call, count))
+        blocks, size = count_retained(setup, call, retained_count)
+        results[name]["retained_blocks"] = blocks
+        results[name]["retained_bytes"] = size
+    results["random_game"] = summarize(time_games(games))
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """returns a list of messages for scenarios whose ops/second fell more
+    than tolerance (0.2 = 20%) below the baseline"""
+    failures = []
+    for name, old in baseline.items():
+        if name not in results:
+            continue
+        new_speed = results[name]["ops_per_second"]
+        if new_speed < old["ops_per_second"] * (1 - tolerance):
+            failures.append(name + ": " + str(round(new_speed)) + " ops/s, baseline "
+                            + str(round(old["ops_per_second"])) + " ops/s")
+    return failures
+
+
+def print_results(results):
+    """prints one line per scenario"""
+    for name, result in results.items():
+        line = name.ljust(22) + str(round(result["ops_per_second"])).rjust(10) + " ops/s"
+        line += "  p50 %.1fus  p90 %.1fus  p99 %.1fus" % (result["p50_us"], result["p90_us"], result["p99_us"])
+        if "retained_blocks" in result:
+            line += "  %.1f blocks %.0f bytes retained/op" % (result["retained_blocks"], result["retained_bytes"])
+        print(line)
+
+
+def parse_options():
+    """returns the parsed command line options"""
+    parser = argparse.ArgumentParser(description="QuoridorGame benchmarks")
+    parser.add_argument("--count", type=int, default=20000, help="timed calls per scenario")
+    parser.add_argument("--games", type=int, default=50, help="random games to time")
+    parser.add_argument("--save", help="write results to this JSON file")
+    parser.add_argument("--baseline", help="compare with results saved earlier")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed slowdown, 0.2 = 20%%")
+    parser.add_argument("--memory", action="store_true", help="only measure live bytes per game")
+    parser.add_argument("--variants", action="store_true", help="only time other board sizes and 4 players")
+    parser.add_argument("--planes", action="store_true", help="only time the feature plane encoder")
+    return parser.parse_args()
+
+
+def print_planes():
+    """prints positions per second of the feature plane encoder"""
+    for name, rate in time_planes().items():
+        print(name.ljust(28) + "%.0f positions/s" % rate)
+
+
+def print_variants():
+    """prints move_pawn and place_fence times of every board variant"""
+    for name, result in time_variants().items():
+        print(name.ljust(22) + "move_pawn %.1fus  place_fence %.1fus" % (result["move_pawn_us"], result["place_fence_us"]))
+
+
+def print_memory():
+    """prints live bytes per game of QuoridorGame and CompactGame"""
+    for factory in (QuoridorGame, CompactGame):
+        print(factory.__name__.ljust(22) + "%.0f bytes/game" % memory_per_game(factory))
+
+
+def check_baseline(results, path, tolerance):
+    """prints the scenarios slower than the baseline saved in path and
+    returns True if there were any"""
+    with open(path) as file:
+        failures = compare(results, json.load(file), tolerance)
+    for failure in failures:
+        print("REGRESSION " + failure)
+    return bool(failures)
+
+
+def main():
+    """command line entry point, exits with 1 when a scenario regressed"""
+    options = parse_options()
+    if options.planes:
+        print_planes()
+        return
+    if options.variants:
+        print_variants()
+        return
+    if options.memory:
+        print_memory()
+        return
+    results = run(options.count, options.games)
+    print_results(results)
+    if options.save:
+        with open(options.save, "w") as file:
+            json.dump(results, file, indent=2, sort_keys=True)
+    if options.baseline and check_baseline(results, options.baseline, options.tolerance):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,382 @@
+# Author: Devon Miller
+# Date: 8/5/2021
+# Description: An opening book and a pawn race tablebase for QuoridorEngine, both built offline
+#              and stored as files of fixed size records sorted by key. The files are memory
+#              mapped and searched with a binary search, so opening one costs nothing and a
+#              lookup reads only the few records the search touches.
+#
+#              The opening book counts how often each move was played from the positions of
+#              the first plies of many games and how often the player who made it went on to
+#              win. Positions are stored by their canonical_key so a position and its mirror
+#              image share their statistics. Games come from self play or from a record file.
+#
+#              A tablebase holds the exact result of every pawn race, a position where
+#              neither player has fences left, for one layout of fences on the board. It is
+#              solved backwards from the won positions so every entry is the number of plies
+#              to the end with best play by both players. The layout is only known once the
+#              last fence is placed, so PawnRaceTablebase solves a layout the first time a
+#              race on it is probed (a few hundredths of a second) and keeps the results, in
+#              a directory of tablebase files named after the layout when given one.
+#
+#              Book file: b"QRBK", version byte, record count (4 bytes), then records of a
+#                    23 byte canonical key, move byte (QuoridorRecords), played and won
+#                    counts (4 bytes each), sorted by key and move.
+#              Tablebase file: b"QRTB", version byte, horizontal and vertical fence masks
+#                    (11 bytes each), record count (4 bytes), then records of a 2 byte
+#                    position key and the signed number of plies to the end (2 bytes),
+#                    positive when the player to move wins, sorted by key.
+#
+#              python QuoridorBook.py book --games 200 --out opening.qbk
+#              python QuoridorBook.py book --records games.qrdr --out opening.qbk
+#              python QuoridorBook.py tablebase --out pawn_races
+
+import argparse
+import mmap
+import os
+import random
+import struct
+
+from Quoridor import QuoridorGame, CELLS, TOP_ROW, BOTTOM_ROW, SNAPSHOT_BYTES, mirror_move, \
+    pawn_targets
+from QuoridorEngine import QuoridorEngine
+from QuoridorRecords import RecordReader, MASK_BYTES, encode_move, decode_move
+
+BOOK_MAGIC = b"QRBK"
+TABLEBASE_MAGIC = b"QRTB"
+VERSION = 1
+BOOK_RECORD = struct.Struct(">" + str(SNAPSHOT_BYTES) + "sBII")
+BOOK_HEADER = len(BOOK_MAGIC) + 1 + 4
+TABLEBASE_RECORD = struct.Struct(">Hh")
+TABLEBASE_HEADER = len(TABLEBASE_MAGIC) + 1 + 2 * MASK_BYTES + 4
+BOOK_PLIES = 12                                # plies of each game that go into the book
+
+
+def first_record(data, start, count, size, key):
+    """binary search over count records of size bytes from start in data,
+    returns the number of the first record whose key (its first len(key)
+    bytes) is not smaller than key"""
+    low, high = 0, count
+    width = len(key)
+    while low < high:
+        middle = (low + high) // 2
+        offset = start + middle * size
+        if data[offset:offset + width] < key:
+            low = middle + 1
+        else:
+            high = middle
+    return low
+
+
+def open_map(path, magic):
+    """opens and memory maps a file, checking its magic and version"""
+    file = open(path, "rb")
+    data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    if data[:len(magic)] != magic or data[len(magic)] != VERSION:
+        data.close()
+        file.close()
+        raise ValueError(path + " is not a " + magic.decode("ascii") + " file")
+    return file, data
+
+
+def self_play(count, max_nodes=200, random_plies=4, seed=162):
+    """yields (moves, game state) of count engine games, the first
+    random_plies moves of each game are random so the games differ"""
+    rng = random.Random(seed)
+    engine = QuoridorEngine(1 << 20)
+    for number in range(count):
+        game = QuoridorGame()
+        moves = []
+        while game.get_game_state() == "unfinished" and len(moves) < 200:
+            if len(moves) < random_plies:
+                move = rng.choice(game.legal_moves(game.get_turn()))
+            else:
+                move = engine.best_move(game, max_time=None, max_nodes=max_nodes)
+            game.apply(move)
+            moves.append(move)
+        yield moves, game.get_game_state()
+
+
+def recorded_games(path):
+    """yields (moves, game state) of every finished game in a record file"""
+    with RecordReader(path) as reader:
+        for record in reader:
+            if record.get_start() is None and record.get_result() != "unfinished":
+                yield record.get_moves(), record.get_result()
+
+
+def write_book(path, games, max_plies=BOOK_PLIES):
+    """counts the moves of the first max_plies plies of games, an iterable
+    of (moves, game state), and writes them as a book file, returns the
+    number of records"""
+    counts = {}
+    for moves, result in games:
+        game = QuoridorGame()
+        for move in moves[:max_plies]:
+            key, mirrored = game.canonical_key()
+            stored = encode_move(mirror_move(move) if mirrored else move)
+            mover = game.get_turn()
+            played, won = counts.get((key, stored), (0, 0))
+            counts[(key, stored)] = played + 1, won + (result == "player" + str(mover) + " wins")
+            if game.apply(move) is not True:
+                raise ValueError("illegal move " + str(move) + " in book game")
+    with open(path, "wb") as file:
+        file.write(BOOK_MAGIC + bytes((VERSION,)) + len(counts).to_bytes(4, "big"))
+        for (key, stored), (played, won) in sorted(counts.items()):
+            file.write(BOOK_RECORD.pack(key, stored, played, won))
+    return len(counts)
+
+
+class OpeningBook:
+    """a memory mapped book file"""
+    def __init__(self, path):
+        self._file, self._map = open_map(path, BOOK_MAGIC)
+        self._count = int.from_bytes(self._map[len(BOOK_MAGIC) + 1:BOOK_HEADER], "big")
+
+
+    def __len__(self):
+        return self._count
+
+
+    def lookup(self, game):
+        """returns a list of (move, played, won) for the position of game,
+        moves in apply format and won counted for the player to move"""
+        key, mirrored = game.canonical_key()
+        number = first_record(self._map, BOOK_HEADER, self._count, BOOK_RECORD.size, key)
+        found = []
+        while number < self._count:
+            stored_key, stored, played, won = BOOK_RECORD.unpack_from(self._map, BOOK_HEADER + number * BOOK_RECORD.size)
+            if stored_key != key:
+                break
+            move = decode_move(stored)
+            found.append((mirror_move(move) if mirrored else move, played, won))
+            number += 1
+        return found
+
+
+    def best_move(self, game, min_played=2):
+        """returns the book move with the best win rate among moves played
+        at least min_played times, or None when the position is not in the
+        book, ties go to the move played more often"""
+        best, best_score = None, None
+        for move, played, won in self.lookup(game):
+            score = (won / played, played)
+            if played >= min_played and (best_score is None or score > best_score):
+                best, best_score = move, score
+        return best
+
+
+    def close(self):
+        """unmaps and closes the file"""
+        self._map.close()
+        self._file.close()
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, kind, value, traceback):
+        self.close()
+
+
+def race_key(player_1, player_2, turn):
+    """returns the tablebase key of a pawn race position"""
+    return ((turn - 1) * CELLS + player_1) * CELLS + player_2
+
+
+def race_successors(player_1, player_2, turn, h_fences, v_fences):
+    """returns the race keys of the positions the player to move can reach"""
+    if turn == 1:
+        return [race_key(cell, player_2, 2) for cell in pawn_targets(h_fences, v_fences, player_1, player_2)]
+    return [race_key(player_1, cell, 1) for cell in pawn_targets(h_fences, v_fences, player_2, player_1)]
+
+
+def race_graph(h_fences, v_fences):
+    """returns the move counts and the predecessor lists of every pawn race
+    position still being played and the keys of the lost positions, where
+    the other player has just won"""
+    successors = {}
+    predecessors = {}
+    lost = []
+    for turn in (1, 2):
+        for player_1 in range(CELLS):
+            for player_2 in range(CELLS):
+                if player_1 == player_2:
+                    continue
+                key = race_key(player_1, player_2, turn)
+                won_1, won_2 = BOTTOM_ROW >> player_1 & 1, TOP_ROW >> player_2 & 1
+                if won_1 or won_2:
+                    if (won_1 and not won_2 and turn == 2) or (won_2 and not won_1 and turn == 1):
+                        lost.append(key)
+                    continue
+                nexts = race_successors(player_1, player_2, turn, h_fences, v_fences)
+                successors[key] = len(nexts)
+                for after in nexts:
+                    predecessors.setdefault(after, []).append(key)
+    return successors, predecessors, lost
+
+
+def solve_pawn_race(h_fences=0, v_fences=0):
+    """solves every pawn race on the fence layout backwards from the won
+    positions, returns a dict of key to plies to the end, positive when
+    the player to move wins, positions that are never decided are left out"""
+    successors, predecessors, lost = race_graph(h_fences, v_fences)
+    plies = dict.fromkeys(lost, 0)
+    queue = list(lost)
+    for key in queue:                              # queue grows while looping, shortest results first
+        for before in predecessors.get(key, ()):
+            if before in plies:
+                continue
+            if plies[key] <= 0:                    # a move into a lost position wins
+                plies[before] = 1 - plies[key]
+                queue.append(before)
+            else:
+                successors[before] -= 1
+                if successors[before] == 0:        # every move leads to a won position
+                    plies[before] = -(plies[key] + 1)
+                    queue.append(before)
+    for key in lost:
+        del plies[key]
+    return plies
+
+
+def write_tablebase(path, h_fences=0, v_fences=0):
+    """solves the pawn races of the fence layout and writes them as a
+    tablebase file, returns the number of records"""
+    plies = solve_pawn_race(h_fences, v_fences)
+    with open(path + ".tmp", "wb") as file:
+        file.write(TABLEBASE_MAGIC + bytes((VERSION,)) + h_fences.to_bytes(MASK_BYTES, "big")
+                   + v_fences.to_bytes(MASK_BYTES, "big") + len(plies).to_bytes(4, "big"))
+        for key in sorted(plies):
+            file.write(TABLEBASE_RECORD.pack(key, plies[key]))
+    os.replace(path + ".tmp", path)
+    return len(plies)
+
+
+class TablebaseFile:
+    """a memory mapped tablebase file for one fence layout"""
+    def __init__(self, path):
+        self._file, self._map = open_map(path, TABLEBASE_MAGIC)
+        start = len(TABLEBASE_MAGIC) + 1
+        self._h_fences = int.from_bytes(self._map[start:start + MASK_BYTES], "big")
+        self._v_fences = int.from_bytes(self._map[start + MASK_BYTES:start + 2 * MASK_BYTES], "big")
+        self._count = int.from_bytes(self._map[start + 2 * MASK_BYTES:TABLEBASE_HEADER], "big")
+
+
+    def __len__(self):
+        return self._count
+
+
+    def get_fences(self):
+        """returns the (horizontal, vertical) fence masks of the layout"""
+        return self._h_fences, self._v_fences
+
+
+    def get(self, key):
+        """returns the plies stored for a race_key, or None"""
+        number = first_record(self._map, TABLEBASE_HEADER, self._count, TABLEBASE_RECORD.size,
+                              key.to_bytes(2, "big"))
+        if number == self._count:
+            return None
+        stored, plies = TABLEBASE_RECORD.unpack_from(self._map, TABLEBASE_HEADER + number * TABLEBASE_RECORD.size)
+        return plies if stored == key else None
+
+
+    def close(self):
+        """unmaps and closes the file"""
+        self._map.close()
+        self._file.close()
+
+
+class PawnRaceTablebase:
+    """pawn race results for whatever fence layout a game ends up with,
+    a layout is solved the first time a race on it is probed and kept for
+    later probes, in directory as a tablebase file when one is given"""
+    def __init__(self, directory=None, max_layouts=64):
+        """directory holds a tablebase file per solved layout and is read
+        before solving, max_layouts is how many layouts stay open"""
+        self._directory = directory
+        self._max_layouts = max_layouts
+        self._layouts = {}                         # (h_fences, v_fences) to a dict or TablebaseFile
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+
+    def __len__(self):
+        """returns the number of layouts open"""
+        return len(self._layouts)
+
+
+    def layout_path(self, h_fences, v_fences):
+        """returns the tablebase file of a layout in the directory"""
+        return os.path.join(self._directory, "race-%021x-%021x.qtb" % (h_fences, v_fences))
+
+
+    def layout(self, h_fences, v_fences):
+        """returns the results of a layout, read from its file or solved"""
+        fences = (h_fences, v_fences)
+        if fences in self._layouts:
+            return self._layouts[fences]
+        if len(self._layouts) >= self._max_layouts:
+            oldest = self._layouts.pop(next(iter(self._layouts)))
+            if isinstance(oldest, TablebaseFile):
+                oldest.close()
+        if self._directory is None:
+            self._layouts[fences] = solve_pawn_race(h_fences, v_fences)
+        else:
+            path = self.layout_path(h_fences, v_fences)
+            if not os.path.exists(path):
+                write_tablebase(path, h_fences, v_fences)
+            self._layouts[fences] = TablebaseFile(path)
+        return self._layouts[fences]
+
+
+    def probe(self, game, solve=True):
+        """returns the plies to the end of the game with best play, positive
+        when the player to move wins, or None when the game is not a pawn
+        race or the race is never decided, with solve False a layout that
+        is not open yet is not solved and gives None too"""
+        player_1, player_2, h_fences, v_fences, fences_1, fences_2, turn = game.get_state()
+        if fences_1 or fences_2 or game.get_game_state() != "unfinished":
+            return None
+        if not solve and (h_fences, v_fences) not in self._layouts:
+            return None
+        return self.layout(h_fences, v_fences).get(race_key(player_1, player_2, turn))
+
+
+    def close(self):
+        """closes every open tablebase file"""
+        for results in self._layouts.values():
+            if isinstance(results, TablebaseFile):
+                results.close()
+        self._layouts = {}
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, kind, value, traceback):
+        self.close()
+
+
+def main():
+    """command line entry point"""
+    parser = argparse.ArgumentParser(description="build a Quoridor opening book or pawn race tablebase")
+    parser.add_argument("command", choices=["book", "tablebase"])
+    parser.add_argument("--out", required=True)
+    parser.add_argument("--games", type=int, default=200, help="self play games for the book")
+    parser.add_argument("--records", help="build the book from this record file instead")
+    parser.add_argument("--plies", type=int, default=BOOK_PLIES, help="plies of each game in the book")
+    parser.add_argument("--nodes", type=int, default=200, help="engine nodes per self play move")
+    options = parser.parse_args()
+    if options.command == "book":
+        games = recorded_games(options.records) if options.records else self_play(options.games, options.nodes)
+        print(write_book(options.out, games, options.plies), "book records")
+    else:
+        with PawnRaceTablebase(options.out) as tablebase:   # the empty layout, others are solved when probed
+            print(len(tablebase.layout(0, 0)), "tablebase records")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+# Author: Devon Miller
+# Date: 8/5/2021
+# Description: A memory lean version of QuoridorGame for hosting a very large number of games
+#              at once. CompactGame keeps a position in eight fixed slots of small integers and
+#              the two fence bitmasks, with no instance dict, distance grids or move history.
+#              Every game starts out sharing the same empty board integers and only gets fence
+#              masks of its own once a fence is placed, so a game costs well under 200 bytes.
+#              move_pawn, place_fence and is_winner take the same arguments and return the
+#              same values as QuoridorGame. Pawn moves use the same move tables and the fair
+#              play rule is checked with a bitmask flood fill in place of the distance grids.
+#              to_game turns a compact game into a full QuoridorGame when undo, hashing or
+#              searching are needed.
+
+from Quoridor import QuoridorGame, SIZE, TOP_ROW, BOTTOM_ROW, FAIR_PLAY_MESSAGE, GAME_STATES, \
+    pawn_allowed, pawn_targets
+from QuoridorBatch import START_1, START_2, START_FENCES, reaches_goal
+
+
+class CompactGame:
+    """a Quoridor position in slots, turn is 1 or 2 and winner is 0 while
+    the game is unfinished"""
+    __slots__ = ("_player_1", "_player_2", "_h_fences", "_v_fences", "_fences_1", "_fences_2",
+                 "_turn", "_winner")
+
+    def __init__(self):
+        """starts from the opening position"""
+        self._player_1 = START_1
+        self._player_2 = START_2
+        self._h_fences = 0
+        self._v_fences = 0
+        self._fences_1 = START_FENCES
+        self._fences_2 = START_FENCES
+        self._turn = 1
+        self._winner = 0
+
+
+    def move_pawn(self, player, new_space):
+        """moves the player's pawn to new_space (x, y) if it is a legal
+        move, returns True if it moved and False otherwise"""
+        if new_space[1] < 0 or new_space[0] < 0 or new_space[1] > 8 or new_space[0] > 8:
+            return False
+        if self._winner or player != self._turn:
+            return False
+        cell = new_space[1] * SIZE + new_space[0]
+        if cell == self._player_1 or cell == self._player_2:
+            return False
+        if player == 1:
+            if not pawn_allowed(self._h_fences, self._v_fences, self._player_1, self._player_2, cell):
+                return False
+            self._player_1 = cell
+            if BOTTOM_ROW >> cell & 1:
+                self._winner = 1
+        else:
+            if not pawn_allowed(self._h_fences, self._v_fences, self._player_2, self._player_1, cell):
+                return False
+            self._player_2 = cell
+            if TOP_ROW >> cell & 1:
+                self._winner = 2
+        self._turn = 3 - player
+        return True
+
+
+    def place_fence(self, player, direction, position):
+        """places a fence for the player, returns True when placed,
+        FAIR_PLAY_MESSAGE when it would shut the other pawn in and False
+        for any other illegal fence"""
+        if not self.fence_allowed(player, direction, position):
+            return False
+        fences = self.with_fence(direction, position)
+        if fences is None:
+            return False
+        if player == 1 and not reaches_goal(self._player_2, TOP_ROW, *fences):
+            return FAIR_PLAY_MESSAGE
+        if player == 2 and not reaches_goal(self._player_1, BOTTOM_ROW, *fences):
+            return FAIR_PLAY_MESSAGE
+        self._h_fences, self._v_fences = fences
+        if player == 1:
+            self._fences_1 -= 1
+        else:
+            self._fences_2 -= 1
+        self._turn = 3 - player
+        return True
+
+
+    def fence_allowed(self, player, direction, position):
+        """returns True if position is a fence slot on the board for
+        direction and the player may place a fence now"""
+        if position[1] < 0 or position[0] < 0 or position[1] > 8 or position[0] > 8:
+            return False
+        if direction == "v" and position[0] == 0 or direction == "h" and position[1] == 0:
+            return False
+        if direction != "v" and direction != "h":
+            return False
+        if player != self._turn or self._winner:
+            return False
+        return not (player == 1 and self._fences_1 == 0 or player == 2 and self._fences_2 == 0)
+
+
+    def with_fence(self, direction, position):
+        """returns the (horizontal, vertical) fence masks with the fence
+        added, None when its slot is taken"""
+        bit = 1 << (position[1] * SIZE + position[0])
+        if direction == "h":
+            return None if self._h_fences & bit else (self._h_fences | bit, self._v_fences)
+        return None if self._v_fences & bit else (self._h_fences, self._v_fences | bit)
+
+
+    def is_winner(self, player):
+        """returns True if player has won"""
+        return self._winner != 0 and self._winner == player
+
+
+    def legal_moves(self, player):
+        """returns every (x, y) the player's pawn may move to, empty if it
+        is not their turn"""
+        if self._winner or player != self._turn:
+            return []
+        if player == 1:
+            targets = pawn_targets(self._h_fences, self._v_fences, self._player_1, self._player_2)
+        else:
+            targets = pawn_targets(self._h_fences, self._v_fences, self._player_2, self._player_1)
+        return [(cell % SIZE, cell // SIZE) for cell in targets]
+
+
+    def get_turn(self):
+        """returns the number of the player whose turn it is"""
+        return self._turn
+
+
+    def get_game_state(self):
+        """returns 'unfinished', 'player1 wins' or 'player2 wins'"""
+        return GAME_STATES[self._winner]
+
+
+    def get_position(self, player):
+        """returns the (x, y) of the player's pawn"""
+        cell = self._player_1 if player == 1 else self._player_2
+        return cell % SIZE, cell // SIZE
+
+
+    def get_fences_left(self, player):
+        """returns how many fences the player has left"""
+        return self._fences_1 if player == 1 else self._fences_2
+
+
+    def get_state(self):
+        """returns the position in the QuoridorGame.get_state format"""
+        return (self._player_1, self._player_2, self._h_fences, self._v_fences,
+                self._fences_1, self._fences_2, self._turn)
+
+
+    def set_state(self, state):
+        """sets the position from a QuoridorGame.get_state tuple, a pawn on
+        its goal row makes that player the winner as in QuoridorGame"""
+        (self._player_1, self._player_2, self._h_fences, self._v_fences,
+         self._fences_1, self._fences_2, self._turn) = state
+        self._winner = 0
+        if BOTTOM_ROW >> self._player_1 & 1:
+            self._winner = 1
+        elif TOP_ROW >> self._player_2 & 1:
+            self._winner = 2
+
+
+    @classmethod
+    def from_game(cls, game):
+        """returns a CompactGame holding the position of a QuoridorGame"""
+        compact = cls()
+        compact.set_state(game.get_state())
+        return compact
+
+
+    def to_game(self):
+        """returns a full QuoridorGame in the same position, without the
+        moves that led to it"""
+        game = QuoridorGame()
+        game.set_state(self.get_state())
+        return game
+
+
+    def get_board(self):
+        """returns the 17x17 board view of QuoridorGame.get_board"""
+        return self.to_game().get_board()
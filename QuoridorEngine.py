@@ -0,0 +1,248 @@
+# Author: Devon Miller
+# Date: 8/5/2021
+# Description: A computer player for QuoridorGame. The engine searches the game tree with
+#              negamax alpha-beta and iterative deepening, one depth at a time until the
+#              time or node budget runs out, and plays the best move of the deepest finished
+#              search. Positions are scored by the difference in shortest path length to
+#              the goal row plus the difference in fences left. Moves are made and taken
+#              back with apply/undo on the game itself, so the game is left as it was.
+#              An OpeningBook is asked for a move before searching and a PawnRaceTablebase
+#              (QuoridorBook.py) gives exact scores once neither player has fences left.
+
+import time
+
+from Quoridor import TranspositionTable, EXACT, LOWER, UPPER, UNREACHABLE
+
+WIN = 100000                                   # score of a won position
+INFINITY = WIN + 1000
+PATH_WEIGHT = 10                               # score for each step of path length
+FENCE_WEIGHT = 3                               # score for each fence in hand
+CHECK_EVERY = 256                              # nodes between budget checks
+
+
+class SearchTimeout(Exception):
+    """raised inside the search when the time or node budget is used up"""
+    pass
+
+
+class QuoridorEngine:
+    """picks a move for the player whose turn it is using alpha-beta
+    search and keeps count of the nodes it searched"""
+    def __init__(self, table_bytes=1 << 24, book=None, tablebase=None):
+        """the transposition table is kept between moves, book and tablebase
+        are optional OpeningBook and PawnRaceTablebase objects"""
+        self._table = TranspositionTable(table_bytes)
+        self._book = book
+        self._tablebase = tablebase
+        self._nodes = 0
+        self._elapsed = 0.0
+        self._depth = 0
+        self._deadline = None
+        self._node_limit = None
+
+
+    def get_nodes(self):
+        """returns the nodes searched by the last call to best_move"""
+        return self._nodes
+
+
+    def get_nodes_per_second(self):
+        """returns the search speed of the last call to best_move"""
+        if self._elapsed == 0:
+            return 0.0
+        return self._nodes / self._elapsed
+
+
+    def get_depth(self):
+        """returns the deepest search finished by the last call to best_move"""
+        return self._depth
+
+
+    def best_move(self, game, max_time=1.0, max_nodes=None, max_depth=64):
+        """returns the best move in apply format for the player whose turn it
+        is, or None if the game is over, searching one depth deeper at a time
+        until max_time seconds or max_nodes nodes are used, the search only
+        probes tablebase layouts that are solved already"""
+        if game.get_game_state() != "unfinished":
+            return None
+        if self._tablebase is not None:
+            self._tablebase.probe(game)                # solves a new race layout before the clock starts
+        start = time.perf_counter()
+        self._nodes, self._depth = 0, 0
+        self._deadline = None if max_time is None else start + max_time
+        self._node_limit = max_nodes
+        self._table.new_search()
+        old_table, old_listener = game.get_table(), game.get_listener()
+        game.set_table(self._table)
+        game.set_listener(None)                        # search moves are not shown to spectators
+        try:
+            best = self.book_move(game)
+            if best is None:
+                best = self.deepen(game, max_depth)
+        finally:
+            game.set_table(old_table)
+            game.set_listener(old_listener)
+            self._elapsed = time.perf_counter() - start
+        return best
+
+
+    def book_move(self, game):
+        """returns the opening book move for the position if there is one
+        and it is still legal, otherwise None"""
+        if self._book is None:
+            return None
+        move = self._book.best_move(game)
+        if move is None or game.apply(move) is not True:
+            return None
+        game.undo()
+        return move
+
+
+    def deepen(self, game, max_depth):
+        """iterative deepening, a search cut short by the budget is thrown
+        away and the best move of the last full depth is kept"""
+        moves = self.ordered_moves(game, None)
+        best = moves[0] if moves else None
+        history = game.get_history_length()
+        for depth in range(1, max_depth + 1):
+            try:
+                score, best = self.search_root(game, depth, moves, best)
+            except SearchTimeout:
+                while game.get_history_length() > history:   # unwind moves left on the board
+                    game.undo()
+                break
+            self._depth = depth
+            if abs(score) >= WIN - max_depth:                  # forced win or loss found
+                break
+        return best
+
+
+    def search_root(self, game, depth, moves, first):
+        """searches every root move with the previous best move first,
+        returns the best score and move"""
+        moves = [first] + [move for move in moves if move != first]
+        alpha, best = -INFINITY, first
+        for move in moves:
+            game.apply(move)
+            score = -self.negamax(game, depth - 1, -INFINITY, -alpha, 1)
+            game.undo()
+            if score > alpha:
+                alpha, best = score, move
+        self._table.store(game.get_hash(), depth, alpha, EXACT, best)
+        return alpha, best
+
+
+    def negamax(self, game, depth, alpha, beta, ply):
+        """returns the score of the position for the player to move"""
+        self.count_node()
+        if game.get_game_state() != "unfinished":
+            return -WIN + ply                          # the player who just moved won
+        if self._tablebase is not None:
+            plies = self._tablebase.probe(game, solve=False)
+            if plies is not None:                      # exact pawn race result
+                return WIN - ply - plies if plies > 0 else -WIN + ply - plies
+        if depth == 0:
+            return self.evaluate(game)
+        value, first = self.table_probe(game, depth, alpha, beta)
+        if value is not None:
+            return value
+        best, best_move = self.search_moves(game, depth, alpha, beta, ply, first)
+        self.store(game, depth, best, alpha, beta, best_move)
+        return best
+
+
+    def table_probe(self, game, depth, alpha, beta):
+        """returns (stored value or None, stored best move), the value only
+        when it was searched deep enough and settles the window"""
+        entry = self._table.probe(game.get_hash())
+        if entry is None:
+            return None, None
+        stored_depth, value, flag, first = entry
+        if stored_depth >= depth and self.cutoff(value, flag, alpha, beta):
+            return value, first
+        return None, first
+
+
+    def search_moves(self, game, depth, alpha, beta, ply, first):
+        """searches the moves with first in front until one fails high,
+        returns (best score, best move)"""
+        best, best_move = -INFINITY, None
+        for move in self.ordered_moves(game, first):
+            game.apply(move)
+            score = -self.negamax(game, depth - 1, -beta, -alpha, ply + 1)
+            game.undo()
+            if score > best:
+                best, best_move = score, move
+            alpha = max(alpha, score)
+            if alpha >= beta:
+                break
+        return best, best_move
+
+
+    def cutoff(self, value, flag, alpha, beta):
+        """returns True if a stored value settles the search window"""
+        if flag == EXACT:
+            return True
+        if flag == LOWER:
+            return value >= beta
+        return value <= alpha
+
+
+    def store(self, game, depth, best, alpha, beta, move):
+        """stores the search result with the kind of bound it is"""
+        if best <= alpha:
+            flag = UPPER
+        elif best >= beta:
+            flag = LOWER
+        else:
+            flag = EXACT
+        self._table.store(game.get_hash(), depth, best, flag, move)
+
+
+    def count_node(self):
+        """counts a node and stops the search when the budget is used up"""
+        self._nodes += 1
+        if self._nodes % CHECK_EVERY:
+            return
+        if self._node_limit is not None and self._nodes >= self._node_limit:
+            raise SearchTimeout()
+        if self._deadline is not None and time.perf_counter() >= self._deadline:
+            raise SearchTimeout()
+
+
+    def evaluate(self, game):
+        """scores the position for the player to move from the shortest
+        path lengths and fences left of both players"""
+        player = game.get_turn()
+        other = 3 - player
+        mine, theirs = game.distance(player), game.distance(other)
+        if mine == UNREACHABLE:                        # shut in, can never win
+            return -WIN // 2
+        score = PATH_WEIGHT * (theirs - mine)
+        score += FENCE_WEIGHT * (game.get_fences_left(player) - game.get_fences_left(other))
+        return score
+
+
+    def ordered_moves(self, game, first):
+        """returns the legal moves with the stored best move first, then
+        pawn moves that get closer to the goal, then fences across the
+        other player's shortest paths, nearest to their pawn first"""
+        player = game.get_turn()
+        other = 3 - player
+        pawn_moves = sorted(game.legal_moves(player), key=lambda move: game.distance(player, move))
+        target = game.get_position(other)
+        fences = sorted(game.legal_fences(player), key=lambda fence: self.fence_order(game, other, fence, target))
+        moves = pawn_moves + fences
+        if first in moves:
+            moves.remove(first)
+            moves.insert(0, first)
+        return moves
+
+
+    def fence_order(self, game, other, fence, target):
+        """sort key for a fence, fences that cross a shortest path of the
+        other player come first and then the ones closest to their pawn"""
+        direction, (x, y) = fence
+        before = (x, y - 1) if direction == "h" else (x - 1, y)
+        crosses = game.distance(other, before) != game.distance(other, (x, y))
+        return not crosses, abs(x - target[0]) + abs(y - target[1])
@@ -0,0 +1,350 @@
+# Author: Devon Miller
+# Date: 8/5/2021
+# Description: An on-disk index from positions to the archived games that went through them,
+#              for "how did games continue from here?" questions. PositionIndex replays the
+#              games of QuoridorRecords archives once and stores one record per position of
+#              every game: the position's snapshot key, the game id, the ply, the move played
+#              next and the game's result. Records are written as sorted segment files that
+#              are memory mapped and binary searched like the opening book, so a lookup reads
+#              only the pages the search touches and the index works however much bigger than
+#              memory it gets. Adding an archive again indexes only the games added to it
+#              since, as a new segment, and compact merges the segments into one as a stream.
+#              continuations adds up the records of a position into games played and won per
+#              next move without opening the archives.
+#
+#              Directory: manifest.json with the segment files in use, the next game id and,
+#                    per indexed batch of games, the archive path, the first game number, the
+#                    game count, the first game id and the offset after the last game, and
+#                    the segment-<n>.qpix files. The manifest is replaced in one step after
+#                    new segments are written, so a crash leaves the last saved index.
+#              Segment file: b"QRPI", version byte, record count (4 bytes), then records of
+#                    the SNAPSHOT_BYTES key, game id (4 bytes), ply (2 bytes), next move byte
+#                    (END after the last move) and result byte, sorted.
+#
+#              python QuoridorIndex.py add games.qrdr --index positions
+#              python QuoridorIndex.py query --index positions --moves '[[4, 1], [4, 7]]'
+#              python QuoridorIndex.py compact --index positions
+
+import argparse
+import heapq
+import json
+import os
+import struct
+
+from Quoridor import SNAPSHOT_BYTES, pack_snapshot
+from QuoridorBook import first_record, open_map, VERSION
+from QuoridorCompact import CompactGame
+from QuoridorRecords import RecordReader, UnendedGame, MAGIC, END, RESULTS, decode_move, encode_move
+
+INDEX_MAGIC = b"QRPI"
+INDEX_RECORD = struct.Struct(">" + str(SNAPSHOT_BYTES) + "sIHBB")
+INDEX_HEADER = len(INDEX_MAGIC) + 1 + 4
+SEGMENT_RECORDS = 1 << 20                      # records sorted in memory before a segment is written
+MANIFEST = "manifest.json"
+
+
+def position_key(game):
+    """returns the index key of a QuoridorGame or CompactGame position"""
+    return pack_snapshot(game.get_state(), game.get_game_state())
+
+
+def game_records(game_id, record):
+    """yields the packed index record of every position of a GameRecord,
+    raises ValueError for an illegal move"""
+    game = CompactGame()
+    if record.get_start() is not None:
+        game.set_state(record.get_start())
+    result = RESULTS.index(record.get_result())
+    moves = record.get_moves()
+    for ply, move in enumerate(moves):
+        yield INDEX_RECORD.pack(position_key(game), game_id, ply, encode_move(move), result)
+        if isinstance(move[0], str):
+            placed = game.place_fence(game.get_turn(), move[0], move[1])
+        else:
+            placed = game.move_pawn(game.get_turn(), move)
+        if placed is not True:
+            raise ValueError("illegal move " + str(move) + " in game " + str(game_id))
+    yield INDEX_RECORD.pack(position_key(game), game_id, len(moves), END, result)
+
+
+def write_segment(path, records):
+    """sorts packed records and writes them as a segment file"""
+    records.sort()
+    with open(path + ".tmp", "wb") as file:
+        file.write(INDEX_MAGIC + bytes((VERSION,)) + len(records).to_bytes(4, "big"))
+        file.write(b"".join(records))
+    os.replace(path + ".tmp", path)
+
+
+class Segment:
+    """one memory mapped segment file"""
+    def __init__(self, path):
+        self._path = path
+        self._file, self._map = open_map(path, INDEX_MAGIC)
+        self._count = int.from_bytes(self._map[len(INDEX_MAGIC) + 1:INDEX_HEADER], "big")
+
+
+    def __len__(self):
+        return self._count
+
+
+    def get_path(self):
+        """returns the segment file path"""
+        return self._path
+
+
+    def find(self, key):
+        """returns the unpacked records of the position key"""
+        size = INDEX_RECORD.size
+        number = first_record(self._map, INDEX_HEADER, self._count, size, key)
+        found = []
+        offset = INDEX_HEADER + number * size
+        while number < self._count and self._map[offset:offset + SNAPSHOT_BYTES] == key:
+            found.append(INDEX_RECORD.unpack_from(self._map, offset))
+            number += 1
+            offset += size
+        return found
+
+
+    def __iter__(self):
+        """loops over the packed records in order"""
+        size = INDEX_RECORD.size
+        for offset in range(INDEX_HEADER, INDEX_HEADER + self._count * size, size):
+            yield self._map[offset:offset + size]
+
+
+    def close(self):
+        """unmaps and closes the file"""
+        self._map.close()
+        self._file.close()
+
+
+class PositionIndex:
+    """a directory of segment files and the manifest of the games in them"""
+    def __init__(self, directory):
+        """opens the index in directory, made empty when it is new"""
+        self._directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._manifest = {"next_id": 0, "next_segment": 0, "segments": [], "batches": []}
+        path = os.path.join(directory, MANIFEST)
+        if os.path.exists(path):
+            with open(path) as file:
+                self._manifest = json.load(file)
+        self._segments = [Segment(os.path.join(directory, name)) for name in self._manifest["segments"]]
+
+
+    def get_game_count(self):
+        """returns the number of games indexed"""
+        return self._manifest["next_id"]
+
+
+    def get_segment_count(self):
+        """returns the number of segment files"""
+        return len(self._segments)
+
+
+    def __len__(self):
+        """returns the number of positions stored, one per ply of every game"""
+        return sum(len(segment) for segment in self._segments)
+
+
+    def save_manifest(self):
+        """writes the manifest, replacing the old one in one step"""
+        path = os.path.join(self._directory, MANIFEST)
+        with open(path + ".tmp", "w") as file:
+            json.dump(self._manifest, file, indent=1)
+        os.replace(path + ".tmp", path)
+
+
+    def new_segment_path(self):
+        """returns the path for the next segment file, a file left there by
+        a crash before the manifest was saved is overwritten"""
+        number = self._manifest["next_segment"]
+        self._manifest["next_segment"] += 1
+        return os.path.join(self._directory, "segment-%08d.qpix" % number)
+
+
+    def segment_names(self):
+        """returns the file names of the open segments"""
+        return [os.path.basename(segment.get_path()) for segment in self._segments]
+
+
+    def add_archive(self, path):
+        """indexes the games of a record file that are not indexed yet, a
+        game still being written is left for the next call, returns the
+        number of games added"""
+        archive = os.path.abspath(path)
+        batches = [batch for batch in self._manifest["batches"] if batch["path"] == archive]
+        first_game = batches[-1]["first_game"] + batches[-1]["count"] if batches else 0
+        offset = batches[-1]["offset"] if batches else len(MAGIC) + 1
+        batch = {"path": archive, "first_game": first_game, "count": 0,
+                 "first_id": self._manifest["next_id"], "offset": offset}
+        batch["count"], offset = self.index_games(path, offset, batch["first_id"])
+        if batch["count"]:
+            batch["offset"] = offset
+            self._manifest["batches"].append(batch)
+            self._manifest["next_id"] += batch["count"]
+        self._manifest["segments"] = self.segment_names()
+        self.save_manifest()
+        return batch["count"]
+
+
+    def index_games(self, path, offset, first_id):
+        """writes segments for the ended games of a record file from offset
+        on, numbered from first_id, returns (games indexed, offset after
+        the last one), the segments are opened only once every game was
+        indexed and are deleted again when one fails"""
+        next_segment = self._manifest["next_segment"]
+        written = []
+        try:
+            count, offset = self.write_segments(path, offset, first_id, written)
+        except Exception:
+            for segment_path in written:
+                os.remove(segment_path)
+            self._manifest["next_segment"] = next_segment
+            raise
+        self._segments += [Segment(segment_path) for segment_path in written]
+        return count, offset
+
+
+    def write_segments(self, path, offset, first_id, written):
+        """writes the segment files of index_games and adds their paths to
+        written, raises ValueError for an illegal move or a damaged game"""
+        count, records = 0, []
+        with RecordReader(path) as reader:
+            size = os.path.getsize(path)
+            while offset < size:
+                try:
+                    record, next_offset = reader.read_game(offset)
+                except UnendedGame:
+                    break                                  # still being written
+                records.extend(game_records(first_id + count, record))
+                count, offset = count + 1, next_offset
+                if len(records) >= SEGMENT_RECORDS:
+                    written.append(self.new_segment(records))
+                    records = []
+        if records:
+            written.append(self.new_segment(records))
+        return count, offset
+
+
+    def new_segment(self, records):
+        """writes records as the next segment file and returns its path"""
+        path = self.new_segment_path()
+        write_segment(path, records)
+        return path
+
+
+    def compact(self):
+        """merges every segment into one, reading each in order so memory
+        use does not grow with the index"""
+        if len(self._segments) < 2:
+            return
+        path = self.new_segment_path()
+        with open(path + ".tmp", "wb") as file:
+            file.write(INDEX_MAGIC + bytes((VERSION,)) + len(self).to_bytes(4, "big"))
+            for record in heapq.merge(*self._segments):
+                file.write(record)
+        os.replace(path + ".tmp", path)
+        old, self._segments = self._segments, [Segment(path)]
+        self._manifest["segments"] = self.segment_names()
+        self.save_manifest()
+        for segment in old:
+            segment.close()
+            os.remove(segment.get_path())
+
+
+    def lookup(self, game):
+        """returns a list of (game id, ply) of every indexed game that went
+        through the position of game"""
+        key = position_key(game)
+        found = []
+        for segment in self._segments:
+            found += [(game_id, ply) for _, game_id, ply, move, result in segment.find(key)]
+        return sorted(found)
+
+
+    def continuations(self, game):
+        """returns a list of (move, played, won) for the position of game,
+        most played first, move in apply format (None where games ended)
+        and won counted for the player to move"""
+        key = position_key(game)
+        mover = RESULTS.index("player" + str(game.get_turn()) + " wins")
+        counts = {}
+        for segment in self._segments:
+            for _, game_id, ply, move, result in segment.find(key):
+                played, won = counts.get(move, (0, 0))
+                counts[move] = played + 1, won + (result == mover)
+        moves = [(None if move == END else decode_move(move), played, won)
+                 for move, (played, won) in counts.items()]
+        return sorted(moves, key=lambda entry: -entry[1])
+
+
+    def find_game(self, game_id):
+        """returns (archive path, game number in the archive) of a game id"""
+        for batch in self._manifest["batches"]:
+            if batch["first_id"] <= game_id < batch["first_id"] + batch["count"]:
+                return batch["path"], batch["first_game"] + game_id - batch["first_id"]
+        raise KeyError("no game " + str(game_id))
+
+
+    def close(self):
+        """closes every segment"""
+        for segment in self._segments:
+            segment.close()
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, kind, value, traceback):
+        self.close()
+
+
+def parse_options():
+    """returns the parsed command line options"""
+    parser = argparse.ArgumentParser(description="index archived Quoridor games by position")
+    parser.add_argument("command", choices=("add", "compact", "query"))
+    parser.add_argument("archives", nargs="*", help="record files to add")
+    parser.add_argument("--index", default="positions", help="index directory")
+    parser.add_argument("--moves", default="[]", help="query position as a JSON list of moves from the start")
+    return parser.parse_args()
+
+
+def add_archives(index, paths):
+    """adds every archive and prints the counts"""
+    for path in paths:
+        print(path, index.add_archive(path), "games added")
+    print(index.get_game_count(), "games,", len(index), "positions in", index.get_segment_count(), "segments")
+
+
+def query(index, moves):
+    """prints the games through the position after moves, a JSON list of
+    moves from the start, and how they continued"""
+    game = CompactGame()
+    for move in json.loads(moves):
+        if isinstance(move[0], str):
+            game.place_fence(game.get_turn(), move[0], tuple(move[1]))
+        else:
+            game.move_pawn(game.get_turn(), tuple(move))
+    print(len(index.lookup(game)), "games through this position")
+    for move, played, won in index.continuations(game):
+        print(str(move).ljust(16), "played", played, "won %.1f%%" % (100.0 * won / played))
+
+
+def main():
+    """command line entry point"""
+    options = parse_options()
+    with PositionIndex(options.index) as index:
+        if options.command == "add":
+            add_archives(index, options.archives)
+        elif options.command == "compact":
+            index.compact()
+            print(len(index), "positions in", index.get_segment_count(), "segments")
+        else:
+            query(index, options.moves)
+
+
+if __name__ == "__main__":
+    main()
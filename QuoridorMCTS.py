@@ -0,0 +1,314 @@
+# Author: Devon Miller
+# Date: 8/5/2021
+# Description: A Monte Carlo tree search player for QuoridorGame that runs its playouts on
+#              a pool of worker processes. Root parallelism gives every worker its own tree
+#              from the same position and adds up the visit counts of the root moves. Tree
+#              parallelism keeps one tree in the main process, picks a batch of leaves with a
+#              virtual loss on each path so the batch spreads out, and plays the leaves out
+#              on the workers. Positions are sent to workers as the small tuple from
+#              QuoridorGame.get_state instead of a pickled game. Running this file prints
+#              playouts per second for 1, 2, 4 ... workers.
+
+import math
+import multiprocessing
+import os
+import random
+import time
+
+from Quoridor import QuoridorGame
+
+EXPLORATION = 1.4                              # UCT exploration constant
+MAX_PLAYOUT_PLIES = 200                        # playouts longer than this are judged by path length
+GREEDY_CHANCE = 0.7                            # playout moves that follow the shortest path
+FENCE_CHANCE = 0.15                            # playout moves that try a random fence
+
+
+def new_game(state):
+    """builds a QuoridorGame from a get_state tuple"""
+    game = QuoridorGame()
+    game.set_state(state)
+    return game
+
+
+def winner_of(game):
+    """returns 1 or 2 for a finished game and 0 when it is unfinished"""
+    if game.is_winner(1):
+        return 1
+    if game.is_winner(2):
+        return 2
+    return 0
+
+
+def playout(state, rng):
+    """plays the position out with a quick random policy that mostly
+    walks the shortest path, returns the winning player, a playout that
+    runs too long or reaches a player with no move is judged by distance"""
+    game = new_game(state)
+    for ply in range(MAX_PLAYOUT_PLIES):
+        if winner_of(game):
+            return winner_of(game)
+        player = game.get_turn()
+        chance = rng.random()
+        if chance < FENCE_CHANCE and game.get_fences_left(player):
+            fence = (rng.choice("hv"), (rng.randint(1, 8), rng.randint(1, 8)))
+            if game.apply(fence) is True:
+                continue
+        moves = game.legal_moves(player)
+        if not moves:
+            break                                  # pawn shut in by the other pawn and fences
+        if chance < GREEDY_CHANCE:
+            game.apply(min(moves, key=lambda move: game.distance(player, move)))
+        else:
+            game.apply(rng.choice(moves))
+    return judge(game)
+
+
+def judge(game):
+    """returns the winner of a finished game, otherwise the player nearer
+    to their goal, player 1 on a tie"""
+    if winner_of(game):
+        return winner_of(game)
+    return 1 if game.distance(1) <= game.distance(2) else 2
+
+
+def playout_worker(job):
+    """pool entry point for one playout, job is (state, seed)"""
+    state, seed = job
+    return playout(state, random.Random(seed))
+
+
+def root_worker(job):
+    """pool entry point for root parallelism, job is (state, playouts, seed),
+    returns (move, visits, wins) for every root move of the worker's tree"""
+    state, playouts, seed = job
+    search = MCTSPlayer(workers=1, seed=seed)
+    root = search.build_tree(new_game(state), playouts)
+    return [(child.get_move(), child.get_visits(), child.get_wins()) for child in root.get_children()]
+
+
+def candidate_moves(game):
+    """returns the pawn moves and the fences that cross a shortest path of
+    the other player, other fences are left out of the tree to keep the
+    branching factor small enough for the playouts to matter"""
+    player = game.get_turn()
+    other = 3 - player
+    moves = game.legal_moves(player)
+    for fence in game.legal_fences(player):
+        direction, (x, y) = fence
+        before = (x, y - 1) if direction == "h" else (x - 1, y)
+        if game.distance(other, before) != game.distance(other, (x, y)):
+            moves.append(fence)
+    return moves
+
+
+class Node:
+    """a position in the search tree, wins are counted for the player who
+    made the move into this node"""
+    def __init__(self, move, parent, game, rng):
+        """untried moves are shuffled so they are expanded in random order"""
+        self._move = move
+        self._parent = parent
+        self._children = []
+        self._player = 3 - game.get_turn()         # player who made the move
+        self._untried = [] if winner_of(game) else candidate_moves(game)
+        rng.shuffle(self._untried)
+        self._visits = 0
+        self._wins = 0.0
+
+
+    def get_move(self):
+        """returns the move that led to this node"""
+        return self._move
+
+
+    def get_parent(self):
+        """returns the parent node or None for the root"""
+        return self._parent
+
+
+    def get_children(self):
+        """returns the expanded children"""
+        return self._children
+
+
+    def get_visits(self):
+        """returns the visit count, virtual visits included"""
+        return self._visits
+
+
+    def get_wins(self):
+        """returns the wins of the player who moved into this node"""
+        return self._wins
+
+
+    def has_untried(self):
+        """returns True if some move has not been expanded yet"""
+        return bool(self._untried)
+
+
+    def expand(self, game, rng):
+        """plays one untried move on game and returns its new child"""
+        move = self._untried.pop()
+        game.apply(move)
+        child = Node(move, self, game, rng)
+        self._children.append(child)
+        return child
+
+
+    def best_child(self):
+        """returns the child with the highest UCT score"""
+        log_visits = math.log(self._visits)
+        return max(self._children, key=lambda child: child._wins / child._visits
+                   + EXPLORATION * math.sqrt(log_visits / child._visits))
+
+
+    def add_visit(self):
+        """counts a visit before the result is known, this is the virtual
+        loss that steers other leaves of the same batch elsewhere"""
+        self._visits += 1
+
+
+    def add_result(self, winner):
+        """adds the playout result for a visit already counted"""
+        if winner == self._player:
+            self._wins += 1
+
+
+class MCTSPlayer:
+    """picks moves with Monte Carlo tree search spread over worker processes,
+    mode is 'root' for root parallelism or 'tree' for tree parallelism"""
+    def __init__(self, workers=None, mode="root", batch_size=None, seed=None):
+        """workers defaults to every core of the machine"""
+        self._workers = workers or os.cpu_count() or 1
+        self._mode = mode
+        self._batch_size = batch_size or self._workers * 4
+        self._rng = random.Random(seed)
+        self._playouts = 0
+        self._elapsed = 0.0
+
+
+    def get_playouts_per_second(self):
+        """returns the playout speed of the last call to best_move"""
+        if self._elapsed == 0:
+            return 0.0
+        return self._playouts / self._elapsed
+
+
+    def best_move(self, game, playouts=1000):
+        """returns the most visited root move after the given number of
+        playouts, or None when the game is over or the player to move has
+        no move, the tree is grown on a copy of game so game itself is never
+        touched"""
+        if winner_of(game):
+            return None
+        start = time.perf_counter()
+        search = new_game(game.get_state())             # a listener or profiler on game sees no search moves
+        if self._workers == 1:
+            counts = self.tree_counts(self.build_tree(search, playouts))
+        elif self._mode == "tree":
+            counts = self.tree_counts(self.tree_parallel(search, playouts))
+        else:
+            counts = self.root_parallel(game, playouts)
+        self._elapsed = time.perf_counter() - start
+        self._playouts = playouts
+        return max(counts, key=counts.get) if counts else None
+
+
+    def tree_counts(self, root):
+        """returns a dict of visits for each root move"""
+        return {child.get_move(): child.get_visits() for child in root.get_children()}
+
+
+    def root_parallel(self, game, playouts):
+        """every worker grows its own tree, visit counts of the same root
+        move are added together"""
+        share = -(-playouts // self._workers)                   # playouts per worker, rounded up
+        jobs = [(game.get_state(), share, self._rng.getrandbits(32)) for worker in range(self._workers)]
+        counts = {}
+        with multiprocessing.Pool(self._workers) as pool:
+            for results in pool.imap_unordered(root_worker, jobs):
+                for move, visits, wins in results:
+                    counts[move] = counts.get(move, 0) + visits
+        return counts
+
+
+    def build_tree(self, game, playouts):
+        """grows a tree in this process with one playout per leaf, the game
+        is left as it was"""
+        root = Node(None, None, game, self._rng)
+        for count in range(playouts):
+            leaf, depth = self.select(root, game)
+            state = game.get_state()
+            for move in range(depth):
+                game.undo()
+            self.backup(leaf, playout(state, self._rng))
+        return root
+
+
+    def tree_parallel(self, game, playouts):
+        """one shared tree, each batch of leaves is picked with virtual loss
+        and played out on the pool before the results are backed up"""
+        root = Node(None, None, game, self._rng)
+        with multiprocessing.Pool(self._workers) as pool:
+            done = 0
+            while done < playouts:
+                leaves, jobs = [], []
+                for count in range(min(self._batch_size, playouts - done)):
+                    leaf, depth = self.select(root, game)
+                    leaves.append(leaf)
+                    jobs.append((game.get_state(), self._rng.getrandbits(32)))
+                    for move in range(depth):
+                        game.undo()
+                for leaf, winner in zip(leaves, pool.map(playout_worker, jobs)):
+                    self.backup(leaf, winner)
+                done += len(leaves)
+        return root
+
+
+    def select(self, root, game):
+        """walks down by UCT, expanding one new child, and plays the moves
+        on game, every node on the path gets a visit now, returns the leaf
+        and the number of moves played"""
+        node, depth = root, 0
+        node.add_visit()
+        while not node.has_untried() and node.get_children():
+            node = node.best_child()
+            game.apply(node.get_move())
+            node.add_visit()
+            depth += 1
+        if node.has_untried():
+            node = node.expand(game, self._rng)
+            node.add_visit()
+            depth += 1
+        return node, depth
+
+
+    def backup(self, leaf, winner):
+        """adds the playout result to every node from leaf up to the root"""
+        node = leaf
+        while node is not None:
+            node.add_result(winner)
+            node = node.get_parent()
+
+
+def benchmark(max_workers=None, playouts=400, mode="root"):
+    """prints and returns playouts per second for 1, 2, 4 ... workers up to
+    max_workers, which defaults to every core"""
+    max_workers = max_workers or os.cpu_count() or 1
+    counts = []
+    workers = 1
+    while workers < max_workers:
+        counts.append(workers)
+        workers *= 2
+    counts.append(max_workers)
+    results = {}
+    for workers in counts:
+        player = MCTSPlayer(workers=workers, mode=mode, seed=162)
+        player.best_move(QuoridorGame(), playouts * workers)
+        results[workers] = player.get_playouts_per_second()
+        print(workers, "workers:", round(results[workers], 1), "playouts/second")
+    return results
+
+
+if __name__ == "__main__":
+    benchmark()
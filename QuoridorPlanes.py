@@ -0,0 +1,216 @@
+# Author: Devon Miller
+# Date: 8/5/2021
+# Description: Turns positions into the flat byte planes a policy/value network is trained
+#              on. encode_batch writes a whole batch into one bytearray given once (or made
+#              once) and reused between batches, so no buffer is made per position, and it can
+#              be handed to numpy without a copy with numpy.frombuffer(planes, numpy.uint8)
+#              .reshape(count, PLANES, SIZE, SIZE). Every 9 cell row of a plane is an entry
+#              of a lookup table picked by that row of the bitmask, and the rows of a chunk of
+#              positions are gathered and copied into the buffer with one join, so no bytes
+#              are built per position. The legal move mask only runs a fair play search for
+#              the few fences that cross one shortest path of the opponent and have no way
+#              around them, every other free slot is legal. With augment each position is
+#              also written mirrored left to right, and mirror_index mirrors policy targets.
+#
+#              Position: PLANES planes of CELLS bytes, cell y*9 + x of each plane is
+#                    0 player 1 pawn, 1 player 2 pawn, 2 horizontal fence on the top edge,
+#                    3 vertical fence on the left edge, 4 player 1 fences left, 5 player 2
+#                    fences left, 6 1 when player 2 is to move (4-6 fill the whole plane).
+#              Legal move mask: MOVE_COUNT bytes indexed by the QuoridorRecords move byte,
+#                    1 for a legal move of the player to move, all 0 once the game is over.
+
+from Quoridor import SIZE, CELLS, BOARD, TOP_ROW, BOTTOM_ROW, LEFT_COLUMN, RIGHT_COLUMN, \
+    mirror_cell, mirror_move, pawn_targets
+from QuoridorBatch import open_masks, reaches_goal
+from QuoridorRecords import FIRST_V_FENCE, encode_move, decode_move
+
+PLANES = 7
+POSITION_BYTES = PLANES * CELLS
+MOVE_COUNT = FIRST_V_FENCE + SIZE * (SIZE - 1)             # 225 move bytes
+ROW = (1 << SIZE) - 1
+ROW_SHIFTS = range(0, CELLS, SIZE)
+H_MOVE_SHIFTS = ROW_SHIFTS[1:]                             # horizontal fence moves skip y = 0
+ROW_PLANES = [bytes(row >> x & 1 for x in range(SIZE)) for row in range(1 << SIZE)]
+V_MOVE_ROWS = [plane[1:] for plane in ROW_PLANES]          # vertical fence moves skip x = 0
+MIRRORED_ROWS = [int(format(row, "09b")[::-1], 2) for row in range(1 << SIZE)]
+PAWN_PLANES = [bytes(cell) + b"\x01" + bytes(CELLS - cell - 1) for cell in range(CELLS)]
+FILLED_PLANES = [bytes((count,)) * CELLS for count in range(256)]
+MIRRORED_MOVES = [encode_move(mirror_move(decode_move(index))) for index in range(MOVE_COUNT)]
+NO_MOVES = bytes(MOVE_COUNT)
+CHUNK_POSITIONS = 256                                      # states whose rows are copied in one go
+
+
+def mirror_index(index):
+    """returns the move byte of a move reflected left to right"""
+    return MIRRORED_MOVES[index]
+
+
+def mirror_state(state):
+    """returns a get_state tuple reflected left to right, the fence masks
+    are reflected one row at a time"""
+    player_1, player_2, h_fences, v_fences, fences_1, fences_2, turn = state
+    mirrored_h = mirrored_v = 0
+    for shift in ROW_SHIFTS:
+        mirrored_h |= MIRRORED_ROWS[h_fences >> shift & ROW] << shift
+        mirrored_v |= MIRRORED_ROWS[v_fences >> shift & ROW] << (shift + 1)   # left edge of 9 - x
+    return (mirror_cell(player_1), mirror_cell(player_2), mirrored_h, mirrored_v,
+            fences_1, fences_2, turn)
+
+
+def path_layers(cell, goal_row, opened):
+    """returns the breadth first search layers from cell up to the first
+    one touching goal_row, None when there is no path"""
+    up, down, left, right = opened
+    layers = [1 << cell]
+    reached = layers[0]
+    while not layers[-1] & goal_row:
+        front = layers[-1]
+        grown = ((front & up) >> SIZE | (front & down) << SIZE | (front & left) >> 1
+                 | (front & right) << 1) & ~reached
+        if not grown:
+            return None
+        layers.append(grown)
+        reached |= grown
+    return layers
+
+
+def path_slots(cell, goal_row, h_fences, v_fences):
+    """returns (horizontal slots, vertical slots) masks of the fence slots
+    crossed by one shortest path from cell to goal_row, None when there is
+    no path"""
+    up, down, left, right = opened = open_masks(h_fences, v_fences)
+    layers = path_layers(cell, goal_row, opened)
+    if layers is None:
+        return None
+    h_slots = v_slots = 0
+    step = layers[-1] & goal_row
+    step &= -step
+    for layer in reversed(layers[:-1]):                # walk back to the pawn
+        if step << SIZE & up & layer:
+            h_slots |= step << SIZE                    # came up from the cell below
+            step <<= SIZE
+        elif step >> SIZE & down & layer:
+            h_slots |= step                            # came down through its top edge
+            step >>= SIZE
+        elif step << 1 & left & layer:
+            v_slots |= step << 1                       # came left from the cell to the right
+            step <<= 1
+        else:
+            v_slots |= step                            # came right through its left edge
+            step >>= 1
+    return h_slots, v_slots
+
+
+def legal_fence_masks(state):
+    """returns (horizontal, vertical) masks of the fence slots the player
+    to move may use, only slots that cross the shortest path of the
+    opponent found by path_slots can cut them off, and of those a slot
+    with an open way around the fence through the next column (or row)
+    cannot either, the rest get a flood fill"""
+    player_1, player_2, h_fences, v_fences, fences_1, fences_2, turn = state
+    if (fences_1 if turn == 1 else fences_2) == 0:
+        return 0, 0
+    pawn, goal_row = (player_2, TOP_ROW) if turn == 1 else (player_1, BOTTOM_ROW)
+    free_h = BOARD & ~(h_fences | TOP_ROW)
+    free_v = BOARD & ~(v_fences | LEFT_COLUMN)
+    path = path_slots(pawn, goal_row, h_fences, v_fences)
+    if path is None:                                   # shut in by their own fence, as in QuoridorGame
+        return 0, 0                                    # every fence breaks the fair play rule
+    h_path, v_path = path
+    around_h = ~RIGHT_COLUMN & ~(v_fences << (SIZE - 1) | h_fences >> 1 | v_fences >> 1) \
+        | ~LEFT_COLUMN & ~(v_fences << SIZE | h_fences << 1 | v_fences)
+    around_v = ~BOTTOM_ROW & ~(h_fences >> (SIZE - 1) | v_fences >> SIZE | h_fences >> SIZE) \
+        | ~TOP_ROW & ~(h_fences << 1 | v_fences << SIZE | h_fences)
+    free_h ^= cutting_slots(free_h & h_path & ~around_h, "h", pawn, goal_row, h_fences, v_fences)
+    free_v ^= cutting_slots(free_v & v_path & ~around_v, "v", pawn, goal_row, h_fences, v_fences)
+    return free_h, free_v
+
+
+def cutting_slots(candidates, direction, pawn, goal_row, h_fences, v_fences):
+    """returns the mask of the candidate slots where a fence in direction
+    would leave the pawn no path to goal_row, one flood fill per slot"""
+    cutting = 0
+    while candidates:
+        bit = candidates & -candidates
+        candidates ^= bit
+        if direction == "h" and not reaches_goal(pawn, goal_row, h_fences | bit, v_fences) \
+                or direction == "v" and not reaches_goal(pawn, goal_row, h_fences, v_fences | bit):
+            cutting |= bit
+    return cutting
+
+
+def move_mask_rows(pieces, state):
+    """appends the rows of the MOVE_COUNT byte legal move mask of a
+    get_state tuple to pieces, every row is a table entry"""
+    player_1, player_2, h_fences, v_fences, fences_1, fences_2, turn = state
+    if BOTTOM_ROW >> player_1 & 1 or TOP_ROW >> player_2 & 1:
+        pieces.append(NO_MOVES)                        # game over
+        return
+    if turn == 1:
+        targets = pawn_targets(h_fences, v_fences, player_1, player_2)
+    else:
+        targets = pawn_targets(h_fences, v_fences, player_2, player_1)
+    pawn_mask = 0
+    for cell in targets:
+        pawn_mask |= 1 << cell
+    legal_h, legal_v = legal_fence_masks(state)
+    pieces += [ROW_PLANES[pawn_mask >> shift & ROW] for shift in ROW_SHIFTS]
+    pieces += [ROW_PLANES[legal_h >> shift & ROW] for shift in H_MOVE_SHIFTS]
+    pieces += [V_MOVE_ROWS[legal_v >> shift & ROW] for shift in ROW_SHIFTS]
+
+
+def plane_rows(pieces, state):
+    """appends the rows of the POSITION_BYTES planes of a get_state tuple
+    to pieces, every row is a table entry"""
+    player_1, player_2, h_fences, v_fences, fences_1, fences_2, turn = state
+    pieces += (PAWN_PLANES[player_1], PAWN_PLANES[player_2])
+    pieces += [ROW_PLANES[h_fences >> shift & ROW] for shift in ROW_SHIFTS]
+    pieces += [ROW_PLANES[v_fences >> shift & ROW] for shift in ROW_SHIFTS]
+    pieces += (FILLED_PLANES[fences_1], FILLED_PLANES[fences_2], FILLED_PLANES[turn - 1])
+
+
+def legal_move_mask(state):
+    """returns the MOVE_COUNT byte legal move mask of a get_state tuple"""
+    pieces = []
+    move_mask_rows(pieces, state)
+    return b"".join(pieces)
+
+
+def position_planes(state):
+    """returns the POSITION_BYTES planes of a get_state tuple"""
+    pieces = []
+    plane_rows(pieces, state)
+    return b"".join(pieces)
+
+
+def copy_rows(buffer, at, pieces):
+    """copies the gathered rows into buffer from offset at, empties pieces
+    and returns the offset after them"""
+    rows = b"".join(pieces)
+    buffer[at:at + len(rows)] = rows
+    pieces.clear()
+    return at + len(rows)
+
+
+def encode_batch(states, planes=None, masks=None, augment=False, legal=True):
+    """writes the planes and legal move masks of get_state tuples into the
+    planes and masks bytearrays, made when None and reused when big
+    enough, with augment every position is followed by its mirror image
+    and legal False skips the masks, returns (planes, masks, positions
+    written)"""
+    count = len(states) * (2 if augment else 1)
+    if planes is None or len(planes) < count * POSITION_BYTES:
+        planes = bytearray(count * POSITION_BYTES)
+    if legal and (masks is None or len(masks) < count * MOVE_COUNT):
+        masks = bytearray(count * MOVE_COUNT)
+    plane_pieces, mask_pieces = [], []
+    plane_at = mask_at = 0
+    for number, state in enumerate(states, 1):
+        for position in ((state, mirror_state(state)) if augment else (state,)):
+            plane_rows(plane_pieces, position)
+            if legal:
+                move_mask_rows(mask_pieces, position)
+        if number % CHUNK_POSITIONS == 0 or number == len(states):
+            plane_at = copy_rows(planes, plane_at, plane_pieces)
+            mask_at = copy_rows(masks, mask_at, mask_pieces) if legal else mask_at
+    return planes, masks, count
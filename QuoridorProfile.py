@@ -0,0 +1,117 @@
+# Author: Devon Miller
+# Date: 8/5/2021
+# Description: Opt in instrumentation for QuoridorGame. A GameProfiler attached to a game with
+#              set_profiler (or for one block of code with the profile context manager) counts
+#              rejected moves by reason and the work done by the fair play check, and times every
+#              call of the public game methods. Games without a profiler only pay for one
+#              attribute check on the rejection and fair play paths because the timed methods
+#              are only wrapped while a profiler is attached. Results come out as a dict or as
+#              Prometheus text.
+
+import contextlib
+import re
+import time
+
+
+class GameProfiler:
+    """collects counters, largest values, rejections and method timings
+    from the games it is attached to"""
+    def __init__(self):
+        self._counters = {}
+        self._maximums = {}
+        self._rejections = {}
+        self._timers = {}                      # method name -> [calls, total seconds, max seconds]
+
+
+    def count(self, name, amount=1):
+        """adds amount to a counter"""
+        self._counters[name] = self._counters.get(name, 0) + amount
+
+
+    def record_max(self, name, value):
+        """keeps the largest value seen for name"""
+        if value > self._maximums.get(name, 0):
+            self._maximums[name] = value
+
+
+    def reject(self, reason):
+        """counts a move rejected for reason"""
+        self._rejections[reason] = self._rejections.get(reason, 0) + 1
+
+
+    def add_time(self, name, seconds):
+        """adds one timed call of method name"""
+        timer = self._timers.get(name)
+        if timer is None:
+            timer = self._timers[name] = [0, 0.0, 0.0]
+        timer[0] += 1
+        timer[1] += seconds
+        if seconds > timer[2]:
+            timer[2] = seconds
+
+
+    def timed(self, name, method):
+        """returns method wrapped so every call is timed under name"""
+        clock = time.perf_counter
+        def wrapper(*args, **kwargs):
+            start = clock()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                self.add_time(name, clock() - start)
+        return wrapper
+
+
+    def reset(self):
+        """clears everything collected so far"""
+        self._counters.clear()
+        self._maximums.clear()
+        self._rejections.clear()
+        self._timers.clear()
+
+
+    def snapshot(self):
+        """returns a dict copy of everything collected so far"""
+        timers = {name: {"calls": calls, "total_seconds": total, "max_seconds": longest}
+                  for name, (calls, total, longest) in self._timers.items()}
+        return {"counters": dict(self._counters), "maximums": dict(self._maximums),
+                "rejections": dict(self._rejections), "timers": timers}
+
+
+    def to_prometheus(self, prefix="quoridor"):
+        """returns the snapshot in the Prometheus text exposition format"""
+        lines = []
+        for name, value in sorted(self._counters.items()):
+            metric = prefix + "_" + clean_name(name) + "_total"
+            lines += ["# TYPE " + metric + " counter", metric + " " + str(value)]
+        for name, value in sorted(self._maximums.items()):
+            metric = prefix + "_" + clean_name(name) + "_max"
+            lines += ["# TYPE " + metric + " gauge", metric + " " + str(value)]
+        lines.append("# TYPE " + prefix + "_rejections_total counter")
+        for reason, value in sorted(self._rejections.items()):
+            lines.append(prefix + '_rejections_total{reason="' + reason + '"} ' + str(value))
+        for suffix, index, kind in (("calls_total", 0, "counter"), ("seconds_total", 1, "counter"),
+                                    ("seconds_max", 2, "gauge")):
+            lines.append("# TYPE " + prefix + "_method_" + suffix + " " + kind)
+            for name, timer in sorted(self._timers.items()):
+                lines.append(prefix + "_method_" + suffix + '{method="' + name + '"} ' + repr(timer[index]))
+        return "\n".join(lines) + "\n"
+
+
+    @contextlib.contextmanager
+    def profile(self, *games):
+        """attaches the profiler to games for the length of a with block and
+        puts back whatever profiler they had before"""
+        previous = [game.get_profiler() for game in games]
+        for game in games:
+            game.set_profiler(self)
+        try:
+            yield self
+        finally:
+            for game, old in zip(games, previous):
+                game.set_profiler(old)
+
+
+def clean_name(name):
+    """returns name with characters Prometheus does not allow replaced"""
+    return re.sub("[^a-zA-Z0-9_]", "_", name)
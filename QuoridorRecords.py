@@ -0,0 +1,285 @@
+# Author: Devon Miller
+# Date: 8/5/2021
+# Description: A compact binary file format for storing many Quoridor games. Every pawn move
+#              and every fence fits in one byte, so a game is a short header followed by one
+#              byte per move. RecordWriter appends moves to the file while a game is played
+#              and RecordReader memory maps a file so games can be looped over or looked up
+#              by number without reading the whole file. A last game that is still being
+#              written is left out until it is ended. Games are replayed through
+#              QuoridorGame so every stored move is checked against the rules again.
+#
+#              File: b"QRDR" and a version byte, then the games one after another.
+#              Game: b"G", flags byte (1 = start position follows), name 1 length byte and
+#                    utf-8 name, name 2 length byte and name, 27 byte start position when
+#                    flagged, one byte per move, END byte, result byte.
+#              Move byte: 0-80 pawn move to cell y*9 + x, 81-152 horizontal fence at
+#                    (x, y) with y 1-8, 153-224 vertical fence at (x, y) with x 1-8.
+
+import mmap
+from array import array
+
+from Quoridor import QuoridorGame, SIZE, CELLS
+
+MAGIC = b"QRDR"
+VERSION = 1
+GAME_MARK = b"G"
+END = 255                                      # never a move byte
+FIRST_H_FENCE = CELLS                          # 81
+FIRST_V_FENCE = FIRST_H_FENCE + SIZE * (SIZE - 1)   # 153
+MASK_BYTES = (CELLS + 7) // 8                  # bytes for one fence mask
+STATE_BYTES = 2 + 2 * MASK_BYTES + 3
+RESULTS = ["unfinished", "player1 wins", "player2 wins"]
+
+
+def encode_move(move):
+    """returns the byte value of a move in apply format"""
+    if isinstance(move[0], str):
+        direction, (x, y) = move
+        if direction == "h" and 0 <= x < SIZE and 0 < y < SIZE:
+            return FIRST_H_FENCE + (y - 1) * SIZE + x
+        if direction == "v" and 0 < x < SIZE and 0 <= y < SIZE:
+            return FIRST_V_FENCE + y * (SIZE - 1) + x - 1
+    elif 0 <= move[0] < SIZE and 0 <= move[1] < SIZE:
+        return move[1] * SIZE + move[0]
+    raise ValueError("move " + str(move) + " is off the board")
+
+
+def decode_move(value):
+    """returns the move in apply format for a move byte"""
+    if value < FIRST_H_FENCE:
+        return value % SIZE, value // SIZE
+    if value < FIRST_V_FENCE:
+        value -= FIRST_H_FENCE
+        return "h", (value % SIZE, value // SIZE + 1)
+    value -= FIRST_V_FENCE
+    return "v", (value % (SIZE - 1) + 1, value // (SIZE - 1))
+
+
+def pack_state(state):
+    """packs a QuoridorGame.get_state tuple into STATE_BYTES bytes"""
+    player_1, player_2, h_fences, v_fences, fences_1, fences_2, turn = state
+    return bytes((player_1, player_2)) + h_fences.to_bytes(MASK_BYTES, "little") \
+        + v_fences.to_bytes(MASK_BYTES, "little") + bytes((fences_1, fences_2, turn))
+
+
+def unpack_state(data):
+    """turns STATE_BYTES bytes back into a get_state tuple"""
+    h_fences = int.from_bytes(data[2:2 + MASK_BYTES], "little")
+    v_fences = int.from_bytes(data[2 + MASK_BYTES:2 + 2 * MASK_BYTES], "little")
+    return data[0], data[1], h_fences, v_fences, data[-3], data[-2], data[-1]
+
+
+class UnendedGame(ValueError):
+    """raised when a record file stops in the middle of a game, the game
+    may still be being written"""
+
+
+class GameRecord:
+    """one stored game, moves are decoded only when asked for"""
+    def __init__(self, players, start, move_bytes, result):
+        """start is a get_state tuple or None for the opening position"""
+        self._players = players
+        self._start = start
+        self._move_bytes = move_bytes
+        self._result = result
+
+
+    def get_players(self):
+        """returns the two player names"""
+        return self._players
+
+
+    def get_start(self):
+        """returns the start position as a get_state tuple or None"""
+        return self._start
+
+
+    def get_result(self):
+        """returns the stored game state, e.g. 'player1 wins'"""
+        return self._result
+
+
+    def get_moves(self):
+        """returns the moves in apply format"""
+        return [decode_move(value) for value in self._move_bytes]
+
+
+    def replay(self):
+        """plays the game through QuoridorGame and returns it, raises
+        ValueError if a move is illegal or the result does not match"""
+        game = QuoridorGame()
+        if self._start is not None:
+            game.set_state(self._start)
+        for ply, value in enumerate(self._move_bytes):
+            if game.apply(decode_move(value)) is not True:
+                raise ValueError("illegal move " + str(decode_move(value)) + " at ply " + str(ply))
+        if game.get_game_state() != self._result:
+            raise ValueError("stored result " + self._result + " but game is " + game.get_game_state())
+        return game
+
+
+class RecordWriter:
+    """appends games to a record file, moves are written as they are played"""
+    def __init__(self, path):
+        """opens path for appending and writes the file header if it is new"""
+        self._file = open(path, "ab")
+        if self._file.tell() == 0:
+            self._file.write(MAGIC + bytes((VERSION,)))
+        self._in_game = False
+
+
+    def begin_game(self, player_1="player_1", player_2="player_2", start=None):
+        """starts a game, start is a get_state tuple or None for the opening"""
+        if self._in_game:
+            raise ValueError("previous game was not ended")
+        header = bytearray(GAME_MARK)
+        header.append(0 if start is None else 1)
+        for name in (player_1, player_2):
+            encoded = name.encode("utf-8")[:255]
+            header.append(len(encoded))
+            header += encoded
+        if start is not None:
+            header += pack_state(start)
+        self._file.write(header)
+        self._in_game = True
+
+
+    def add_move(self, move):
+        """appends one move of the current game"""
+        self._file.write(bytes((encode_move(move),)))
+
+
+    def end_game(self, game_state):
+        """ends the current game with its game state, e.g. 'player1 wins'"""
+        self._file.write(bytes((END, RESULTS.index(game_state))))
+        self._in_game = False
+
+
+    def write_game(self, moves, game_state, player_1="player_1", player_2="player_2", start=None):
+        """writes a whole game at once"""
+        self.begin_game(player_1, player_2, start)
+        self._file.write(bytes(encode_move(move) for move in moves))
+        self.end_game(game_state)
+
+
+    def flush(self):
+        """pushes buffered bytes to the file"""
+        self._file.flush()
+
+
+    def close(self):
+        """closes the file"""
+        self._file.close()
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, kind, value, traceback):
+        self.close()
+
+
+class RecordReader:
+    """reads a record file through mmap, len and indexing find game offsets
+    with one scan the first time they are used"""
+    def __init__(self, path):
+        """maps the file and checks its header"""
+        self._file = open(path, "rb")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._map[:len(MAGIC)] != MAGIC or self._map[len(MAGIC)] != VERSION:
+            raise ValueError("not a Quoridor record file")
+        self._offsets = None
+
+
+    def check_length(self, offset, end):
+        """raises UnendedGame for the game at offset if the file stops
+        before byte end"""
+        if end > len(self._map):
+            raise UnendedGame("game at offset " + str(offset) + " was never ended")
+
+
+    def read_header(self, offset):
+        """returns (players, start, offset of the first move byte) for the
+        game at offset"""
+        data = self._map
+        if data[offset:offset + 1] != GAME_MARK:
+            raise ValueError("no game at offset " + str(offset))
+        position = offset + 2
+        players = []
+        for player in range(2):
+            self.check_length(offset, position + 1)
+            self.check_length(offset, position + 1 + data[position])
+            players.append(data[position + 1:position + 1 + data[position]].decode("utf-8"))
+            position += 1 + data[position]
+        start = None
+        if data[offset + 1] & 1:
+            self.check_length(offset, position + STATE_BYTES)
+            start = unpack_state(data[position:position + STATE_BYTES])
+            position += STATE_BYTES
+        return tuple(players), start, position
+
+
+    def read_game(self, offset):
+        """returns (GameRecord, offset of the next game) for the game at
+        offset, raises UnendedGame if the file stops inside the game and
+        ValueError if the bytes there are not a game"""
+        data = self._map
+        players, start, position = self.read_header(offset)
+        end = data.find(bytes((END,)), position)           # moves never hold the END byte
+        self.check_length(offset, len(data) + 1 if end == -1 else end + 2)
+        if data[end + 1] >= len(RESULTS):
+            raise ValueError("bad result byte for the game at offset " + str(offset))
+        return GameRecord(players, start, data[position:end], RESULTS[data[end + 1]]), end + 2
+
+
+    def ended_games(self):
+        """yields (offset, GameRecord) for every game from the start of the
+        file, stopping before a last game that is still being written"""
+        offset = len(MAGIC) + 1
+        while offset < len(self._map):
+            try:
+                record, next_offset = self.read_game(offset)
+            except UnendedGame:
+                return
+            yield offset, record
+            offset = next_offset
+
+
+    def __iter__(self):
+        """loops over the ended games from the start of the file"""
+        for offset, record in self.ended_games():
+            yield record
+
+
+    def build_index(self):
+        """finds the offset of every ended game, stored in an array of 64
+        bit ints"""
+        self._offsets = array("Q", (offset for offset, record in self.ended_games()))
+
+
+    def __len__(self):
+        if self._offsets is None:
+            self.build_index()
+        return len(self._offsets)
+
+
+    def __getitem__(self, number):
+        """returns game number as a GameRecord"""
+        if self._offsets is None:
+            self.build_index()
+        return self.read_game(self._offsets[number])[0]
+
+
+    def close(self):
+        """unmaps and closes the file"""
+        self._map.close()
+        self._file.close()
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, kind, value, traceback):
+        self.close()
@@ -0,0 +1,295 @@
+# Author: Devon Miller
+# Date: 8/5/2021
+# Description: An asyncio server that hosts many QuoridorGame sessions in one event loop.
+#              Clients send one JSON object per line and get one JSON object back per line.
+#              A request runs without awaiting, so it finishes before the loop starts another
+#              and games need no lock. Games nobody has used for idle_timeout seconds are
+#              removed, and each connection only reads up to max_pending requests ahead of
+#              the answers so a slow client cannot fill the server's memory. The load command
+#              starts many games at once, plays random legal pawn moves and prints the 50th
+#              and 99th percentile move latency. --compact hosts CompactGame positions
+#              instead of full QuoridorGames to fit far more games in memory.
+#
+#              Requests ("id" is optional and echoed back):
+#                {"op": "new"}                                       -> {"game": id}
+#                {"op": "move_pawn", "game": id, "player": 1, "to": [x, y]}
+#                {"op": "place_fence", "game": id, "player": 1, "direction": "h", "at": [x, y]}
+#                {"op": "is_winner", "game": id, "player": 1}
+#                {"op": "legal_moves", "game": id, "player": 1}
+#                {"op": "state", "game": id}  {"op": "board", "game": id}  {"op": "close", "game": id}
+#              Answers have "ok": true and a "result", or "ok": false and an "error".
+#
+#              python QuoridorServer.py serve --port 8162 [--compact]
+#              python QuoridorServer.py load --port 8162 --games 10000 --moves 10
+
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import time
+
+from Quoridor import QuoridorGame
+from QuoridorCompact import CompactGame
+
+DEFAULT_PORT = 8162
+
+
+class Session:
+    """one hosted game and the time it was last used"""
+    def __init__(self, game_class=QuoridorGame):
+        self._game = game_class()
+        self._last_used = time.monotonic()
+
+
+    def get_game(self):
+        """returns the QuoridorGame"""
+        return self._game
+
+
+    def touch(self):
+        """marks the session as used now"""
+        self._last_used = time.monotonic()
+
+
+    def idle_for(self, now):
+        """returns the seconds since the session was last used"""
+        return now - self._last_used
+
+
+class GameServer:
+    """serves the line delimited JSON protocol for many games"""
+    def __init__(self, host="127.0.0.1", port=DEFAULT_PORT, idle_timeout=300.0,
+                 max_games=100000, max_pending=32, game_class=QuoridorGame):
+        """max_pending is how many requests one connection may have waiting,
+        game_class is QuoridorGame or CompactGame"""
+        self._host = host
+        self._port = port
+        self._idle_timeout = idle_timeout
+        self._max_games = max_games
+        self._max_pending = max_pending
+        self._game_class = game_class
+        self._sessions = {}
+        self._ids = itertools.count(1)
+        self._server = None
+        self._evictor = None
+        self._clients = {}                       # handler task of every open connection
+
+
+    def get_game_count(self):
+        """returns the number of hosted games"""
+        return len(self._sessions)
+
+
+    async def start(self):
+        """starts listening and the idle session evictor"""
+        self._server = await asyncio.start_server(self.handle_client, self._host, self._port)
+        self._evictor = asyncio.ensure_future(self.evict_idle())
+        return self._server
+
+
+    async def close(self):
+        """stops listening and the evictor, closes open connections and
+        waits for their handlers to finish"""
+        self._evictor.cancel()
+        self._server.close()
+        for writer in self._clients.values():
+            writer.close()
+        await asyncio.gather(*self._clients, return_exceptions=True)
+        await self._server.wait_closed()
+
+
+    async def evict_idle(self):
+        """removes sessions that were idle longer than idle_timeout"""
+        while True:
+            await asyncio.sleep(self._idle_timeout / 4)
+            now = time.monotonic()
+            for game_id in [key for key, session in self._sessions.items()
+                            if session.idle_for(now) > self._idle_timeout]:
+                del self._sessions[game_id]
+
+
+    async def handle_client(self, reader, writer):
+        """reads requests into a bounded queue while another task answers
+        them in order, a full queue stops reading from the socket"""
+        queue = asyncio.Queue(self._max_pending)
+        answering = asyncio.ensure_future(self.answer(queue, writer))
+        self._clients[asyncio.current_task()] = writer
+        try:
+            while True:
+                line = await reader.readline()
+                if not line or not await self.enqueue(queue, line, answering):
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            await self.enqueue(queue, None, answering)
+            await answering
+            writer.close()
+            del self._clients[asyncio.current_task()]
+
+
+    async def enqueue(self, queue, line, answering):
+        """puts line on the queue unless the answering task ends first,
+        returns False once nobody reads the queue anymore"""
+        if answering.done():
+            return False
+        if not queue.full():
+            queue.put_nowait(line)
+            return True
+        putting = asyncio.ensure_future(queue.put(line))
+        await asyncio.wait((putting, answering), return_when=asyncio.FIRST_COMPLETED)
+        if putting.done():
+            return True
+        putting.cancel()
+        return False
+
+
+    async def answer(self, queue, writer):
+        """answers queued requests, waiting for the socket to drain"""
+        while True:
+            line = await queue.get()
+            if line is None:
+                return
+            response = await self.handle_line(line)
+            writer.write(json.dumps(response).encode("utf-8") + b"\n")
+            try:
+                await writer.drain()
+            except ConnectionError:               # client went away, drop the rest
+                return
+
+
+    async def handle_line(self, line):
+        """turns one request line into a response dict"""
+        request = {}
+        try:
+            request = json.loads(line)
+            response = await self.handle_request(request)
+        except (ValueError, KeyError, TypeError, IndexError) as error:
+            response = {"ok": False, "error": type(error).__name__ + ": " + str(error)}
+        if isinstance(request, dict) and "id" in request:
+            response["id"] = request["id"]
+        return response
+
+
+    async def handle_request(self, request):
+        """runs one request, run does not await so no other request can
+        use the game in the middle of it"""
+        operation = request["op"]
+        if operation == "new":
+            return self.new_game()
+        session = self._sessions.get(request["game"])
+        if session is None:
+            return {"ok": False, "error": "no such game"}
+        if operation == "close":
+            del self._sessions[request["game"]]
+            return {"ok": True, "result": True}
+        session.touch()
+        return {"ok": True, "result": self.run(session.get_game(), operation, request)}
+
+
+    def new_game(self):
+        """creates a session unless the server is full"""
+        if len(self._sessions) >= self._max_games:
+            return {"ok": False, "error": "server full"}
+        game_id = str(next(self._ids))
+        self._sessions[game_id] = Session(self._game_class)
+        return {"ok": True, "game": game_id}
+
+
+    def run(self, game, operation, request):
+        """calls the QuoridorGame method for operation"""
+        if operation == "move_pawn":
+            return game.move_pawn(request["player"], tuple(request["to"]))
+        if operation == "place_fence":
+            return game.place_fence(request["player"], request["direction"], tuple(request["at"]))
+        if operation == "is_winner":
+            return game.is_winner(request["player"])
+        if operation == "legal_moves":
+            return game.legal_moves(request["player"])
+        if operation == "board":
+            return game.get_board()
+        if operation == "state":
+            return {"turn": game.get_turn(), "game_state": game.get_game_state(),
+                    "positions": [game.get_position(1), game.get_position(2)],
+                    "fences_left": [game.get_fences_left(1), game.get_fences_left(2)]}
+        raise ValueError("unknown op " + str(operation))
+
+
+async def call(reader, writer, request):
+    """sends one request and waits for its answer"""
+    writer.write(json.dumps(request).encode("utf-8") + b"\n")
+    await writer.drain()
+    return json.loads(await reader.readline())
+
+
+async def load_client(host, port, games, moves, latencies, rng):
+    """one connection that starts games and plays random pawn moves in
+    them in turn, adding the time of every move_pawn call to latencies"""
+    reader, writer = await asyncio.open_connection(host, port)
+    ids = [(await call(reader, writer, {"op": "new"}))["game"] for game in range(games)]
+    turns = dict.fromkeys(ids, 1)
+    for move in range(moves):
+        for game_id in ids:
+            player = turns[game_id]
+            legal = (await call(reader, writer, {"op": "legal_moves", "game": game_id, "player": player})).get("result")
+            if not legal:                              # game over or evicted
+                continue
+            start = time.perf_counter()
+            await call(reader, writer, {"op": "move_pawn", "game": game_id, "player": player,
+                                        "to": rng.choice(legal)})
+            latencies.append(time.perf_counter() - start)
+            turns[game_id] = 3 - player
+    for game_id in ids:
+        await call(reader, writer, {"op": "close", "game": game_id})
+    writer.close()
+
+
+def percentile(values, fraction):
+    """returns the value at fraction of the way through sorted values"""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+async def load_test(host="127.0.0.1", port=DEFAULT_PORT, games=10000, moves=10, connections=100, seed=162):
+    """runs games spread over connections at the same time and returns a
+    dict with the number of moves and the p50 and p99 move latency in ms"""
+    rng = random.Random(seed)
+    latencies = []
+    share = -(-games // connections)
+    clients = [load_client(host, port, min(share, games - start), moves, latencies, rng)
+               for start in range(0, games, share)]
+    began = time.perf_counter()
+    await asyncio.gather(*clients)
+    elapsed = time.perf_counter() - began
+    return {"moves": len(latencies), "moves_per_second": len(latencies) / elapsed,
+            "p50_ms": percentile(latencies, 0.50) * 1000, "p99_ms": percentile(latencies, 0.99) * 1000}
+
+
+async def serve(host, port, compact=False):
+    """runs the server until the process is stopped"""
+    server = GameServer(host, port, game_class=CompactGame if compact else QuoridorGame)
+    listener = await server.start()
+    async with listener:
+        await listener.serve_forever()
+
+
+def main():
+    """command line entry point"""
+    parser = argparse.ArgumentParser(description="Quoridor game server")
+    parser.add_argument("command", choices=["serve", "load"])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--games", type=int, default=10000)
+    parser.add_argument("--moves", type=int, default=10)
+    parser.add_argument("--connections", type=int, default=100)
+    parser.add_argument("--compact", action="store_true", help="host CompactGame positions")
+    options = parser.parse_args()
+    if options.command == "serve":
+        asyncio.run(serve(options.host, options.port, options.compact))
+    else:
+        print(asyncio.run(load_test(options.host, options.port, options.games, options.moves, options.connections)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,336 @@
+# Author: Devon Miller
+# Date: 8/5/2021
+# Description: Hands positions to analysis worker processes through shared memory instead of
+#              pickling QuoridorGame objects. PositionArena is one multiprocessing.shared_memory
+#              block holding a packed snapshot and a result slot for every position and one
+#              ring buffer of work items per worker. The coordinator writes a batch of
+#              positions once and pushes (start, stop) ranges onto the rings, each worker reads
+#              the snapshots in place through a memoryview, writes the winner, the number of
+#              legal moves and an evaluation into the result slots and moves its ring's tail
+#              on. Every ring has one writer for its head (the coordinator) and one for its
+#              tail (its worker), so no lock is needed: a side only ever reads the other's
+#              counter, and results are written before the tail that publishes them.
+#              Running this file compares positions per second with a multiprocessing.Pool
+#              that is sent pickled QuoridorGame objects.
+#
+#              Block: stop flag, then per worker the ring head, tail and RING_SLOTS items
+#                     (8 bytes each, an item is start << 32 | stop), then capacity snapshots
+#                     of SNAPSHOT_BYTES, then capacity results of RESULT.
+#
+#              python QuoridorShared.py --positions 20000 --workers 2
+
+import argparse
+import multiprocessing
+import os
+import struct
+import time
+from multiprocessing import resource_tracker, shared_memory
+
+from Quoridor import QuoridorGame, SIZE, TOP_ROW, BOTTOM_ROW, SNAPSHOT_BYTES, UNREACHABLE, \
+    pack_snapshot, unpack_snapshot
+from QuoridorBatch import BatchQuoridor, open_masks
+from QuoridorEngine import PATH_WEIGHT, FENCE_WEIGHT
+from QuoridorPlanes import legal_move_mask
+
+RING_SLOTS = 64                                # work items a worker can have queued
+ITEM_POSITIONS = 256                           # positions in one work item
+RESULT = struct.Struct("<BHh")                 # winner, legal moves, evaluation
+IDLE_SLEEP = 0.0005                            # seconds to wait on an empty ring or on full rings
+
+
+def goal_distance(cell, goal_row, h_fences, v_fences):
+    """bitmask breadth first search, returns the steps from cell to the goal
+    row or UNREACHABLE"""
+    up, down, left, right = open_masks(h_fences, v_fences)
+    reached = 1 << cell
+    steps = 0
+    while not reached & goal_row:
+        grown = reached | (reached & up) >> SIZE | (reached & down) << SIZE \
+            | (reached & left) >> 1 | (reached & right) << 1
+        if grown == reached:
+            return UNREACHABLE
+        reached = grown
+        steps += 1
+    return steps
+
+
+def analyse_state(state):
+    """returns (winner, legal moves, evaluation) of a get_state tuple, the
+    evaluation is QuoridorEngine's for the player to move"""
+    player_1, player_2, h_fences, v_fences, fences_1, fences_2, turn = state
+    if BOTTOM_ROW >> player_1 & 1:
+        return 1, 0, 0
+    if TOP_ROW >> player_2 & 1:
+        return 2, 0, 0
+    moves = sum(legal_move_mask(state))
+    distance_1 = goal_distance(player_1, BOTTOM_ROW, h_fences, v_fences)
+    distance_2 = goal_distance(player_2, TOP_ROW, h_fences, v_fences)
+    evaluation = PATH_WEIGHT * (distance_2 - distance_1) + FENCE_WEIGHT * (fences_1 - fences_2)
+    return 0, moves, evaluation if turn == 1 else -evaluation
+
+
+def analyse_game(game):
+    """pool entry point of the pickle based approach"""
+    return analyse_state(game.get_state())
+
+
+class PositionArena:
+    """positions, result slots and per worker ring buffers in one shared
+    memory block"""
+    def __init__(self, capacity, workers=1, name=None, track=True):
+        """makes a new block, or attaches to the block called name, a
+        process not started by the creator's multiprocessing has its own
+        resource tracker and passes track False so the tracker does not
+        unlink the block when the process exits"""
+        self._capacity = capacity
+        self._workers = workers
+        self._control_words = 1 + workers * (2 + RING_SLOTS)
+        self._positions_at = self._control_words * 8
+        self._results_at = self._positions_at + capacity * SNAPSHOT_BYTES
+        size = self._results_at + capacity * RESULT.size
+        if name is None:
+            self._memory = shared_memory.SharedMemory(create=True, size=size)
+        else:
+            try:
+                self._memory = shared_memory.SharedMemory(name=name, track=track)
+            except TypeError:                              # no track argument before Python 3.13
+                self._memory = shared_memory.SharedMemory(name=name)
+                if not track:
+                    resource_tracker.unregister(self._memory._name, "shared_memory")
+        self._buffer = self._memory.buf
+        self._control = self._buffer[:self._positions_at].cast("Q")
+
+
+    def get_name(self):
+        """returns the name other processes attach with"""
+        return self._memory.name
+
+
+    def get_capacity(self):
+        """returns the number of position slots"""
+        return self._capacity
+
+
+    def get_workers(self):
+        """returns the number of rings"""
+        return self._workers
+
+
+    def write_positions(self, states, start=0):
+        """packs get_state tuples into the slots from start on"""
+        offset = self._positions_at + start * SNAPSHOT_BYTES
+        for state in states:
+            game_state = "player1 wins" if BOTTOM_ROW >> state[0] & 1 else \
+                "player2 wins" if TOP_ROW >> state[1] & 1 else "unfinished"
+            self._buffer[offset:offset + SNAPSHOT_BYTES] = pack_snapshot(state, game_state)
+            offset += SNAPSHOT_BYTES
+
+
+    def position(self, index):
+        """returns a memoryview of the snapshot in slot index, no copy"""
+        offset = self._positions_at + index * SNAPSHOT_BYTES
+        return self._buffer[offset:offset + SNAPSHOT_BYTES]
+
+
+    def set_result(self, index, result):
+        """writes (winner, legal moves, evaluation) into slot index"""
+        RESULT.pack_into(self._buffer, self._results_at + index * RESULT.size, *result)
+
+
+    def result(self, index):
+        """returns (winner, legal moves, evaluation) of slot index"""
+        return RESULT.unpack_from(self._buffer, self._results_at + index * RESULT.size)
+
+
+    def ring_at(self, worker):
+        """returns the control word of the worker's ring head"""
+        return 1 + worker * (2 + RING_SLOTS)
+
+
+    def submit(self, worker, start, stop):
+        """queues positions start to stop for the worker, returns False when
+        its ring is full, only the coordinator calls this"""
+        at = self.ring_at(worker)
+        head = self._control[at]
+        if head - self._control[at + 1] >= RING_SLOTS:
+            return False
+        self._control[at + 2 + head % RING_SLOTS] = start << 32 | stop
+        self._control[at] = head + 1                   # publish after the item is written
+        return True
+
+
+    def next_item(self, worker):
+        """returns the worker's oldest queued (start, stop) or None, only
+        that worker calls this and finish_item"""
+        at = self.ring_at(worker)
+        tail = self._control[at + 1]
+        if tail == self._control[at]:
+            return None
+        item = self._control[at + 2 + tail % RING_SLOTS]
+        return item >> 32, item & 0xFFFFFFFF
+
+
+    def finish_item(self, worker):
+        """frees the oldest item once its results are written"""
+        self._control[self.ring_at(worker) + 1] += 1
+
+
+    def pending(self, worker):
+        """returns the number of items queued and not finished"""
+        at = self.ring_at(worker)
+        return self._control[at] - self._control[at + 1]
+
+
+    def stop(self):
+        """asks every worker to exit"""
+        self._control[0] = 1
+
+
+    def stopping(self):
+        """returns True once stop was called"""
+        return self._control[0] == 1
+
+
+    def close(self):
+        """detaches this process from the block"""
+        self._control.release()
+        self._buffer = None
+        self._memory.close()
+
+
+    def unlink(self):
+        """frees the block, called once by the process that made it"""
+        self._memory.unlink()
+
+
+def worker_loop(name, capacity, workers, worker):
+    """process entry point, analyses the items of one ring until stopped"""
+    arena = PositionArena(capacity, workers, name)
+    try:
+        while not arena.stopping():
+            item = arena.next_item(worker)
+            if item is None:
+                time.sleep(IDLE_SLEEP)
+                continue
+            for index in range(*item):
+                arena.set_result(index, analyse_state(unpack_snapshot(arena.position(index))[0]))
+            arena.finish_item(worker)
+    finally:
+        arena.close()
+
+
+class AnalysisPool:
+    """worker processes reading positions from a PositionArena"""
+    def __init__(self, capacity, workers=None):
+        self._workers = workers or os.cpu_count() or 1
+        self._arena = PositionArena(capacity, self._workers)
+        self._processes = [multiprocessing.Process(target=worker_loop, daemon=True,
+                                                   args=(self._arena.get_name(), capacity, self._workers, worker))
+                           for worker in range(self._workers)]
+        for process in self._processes:
+            process.start()
+
+
+    def analyse(self, states):
+        """returns (winner, legal moves, evaluation) for every get_state
+        tuple, at most the arena capacity at a time"""
+        if len(states) > self._arena.get_capacity():
+            raise ValueError("more positions than the arena holds")
+        self._arena.write_positions(states)
+        items = [(start, min(start + ITEM_POSITIONS, len(states)))
+                 for start in range(0, len(states), ITEM_POSITIONS)]
+        self.submit_items(items)
+        while any(self._arena.pending(worker) for worker in range(self._workers)):
+            self.check_workers()
+            time.sleep(IDLE_SLEEP)
+        return [self._arena.result(index) for index in range(len(states))]
+
+
+    def submit_items(self, items):
+        """queues (start, stop) items round robin, skipping full rings, and
+        waits IDLE_SLEEP after a round in which every ring was full"""
+        worker, refused = 0, 0
+        while items:
+            if self._arena.submit(worker, *items[-1]):
+                items.pop()
+                refused = 0
+            else:
+                refused += 1
+            if refused == self._workers:
+                self.check_workers()
+                time.sleep(IDLE_SLEEP)
+                refused = 0
+            worker = (worker + 1) % self._workers
+
+
+    def check_workers(self):
+        """raises RuntimeError when a worker process has exited"""
+        if not all(process.is_alive() for process in self._processes):
+            raise RuntimeError("an analysis worker exited")
+
+
+    def close(self):
+        """stops the workers and frees the arena"""
+        self._arena.stop()
+        for process in self._processes:
+            process.join()
+        self._arena.close()
+        self._arena.unlink()
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, kind, value, traceback):
+        self.close()
+
+
+def sample_states(count, seed=162):
+    """returns count get_state tuples from random BatchQuoridor games"""
+    batch = BatchQuoridor(max(1, count // 40), seed)
+    states = []
+    while len(states) < count:
+        batch.step()
+        states.extend(batch.get_state(index) for index in range(batch.get_count()))
+    return states[:count]
+
+
+def benchmark(positions=20000, workers=None, rounds=3):
+    """prints and returns positions per second for the arena and for a
+    pool sent pickled games, the results of both are checked to match"""
+    workers = workers or os.cpu_count() or 1
+    states = sample_states(positions)
+    games = []
+    for state in states:
+        game = QuoridorGame()
+        game.set_state(state)
+        games.append(game)
+    with AnalysisPool(positions, workers) as pool:
+        start = time.perf_counter()
+        for round_number in range(rounds):
+            shared = pool.analyse(states)
+        arena_rate = rounds * positions / (time.perf_counter() - start)
+    with multiprocessing.Pool(workers) as pool:
+        start = time.perf_counter()
+        for round_number in range(rounds):
+            pickled = pool.map(analyse_game, games, chunksize=ITEM_POSITIONS)
+        pickle_rate = rounds * positions / (time.perf_counter() - start)
+    if [tuple(result) for result in pickled] != shared:
+        raise AssertionError("arena and pickle results differ")
+    print("shared arena   %9.0f positions/s" % arena_rate)
+    print("pickled games  %9.0f positions/s" % pickle_rate)
+    return {"arena": arena_rate, "pickle": pickle_rate}
+
+
+def main():
+    """command line entry point, runs the benchmark"""
+    parser = argparse.ArgumentParser(description="shared memory arena benchmark")
+    parser.add_argument("--positions", type=int, default=20000)
+    parser.add_argument("--workers", type=int, default=None, help="processes, every core by default")
+    options = parser.parse_args()
+    benchmark(options.positions, options.workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+# Author: Devon Miller
+# Date: 8/5/2021
+# Description: Live streaming of a QuoridorGame to many spectators. SpectatorHub registers
+#              itself as the game's listener and turns every committed move into a small
+#              numbered frame, which it encodes once and hands to every subscriber. Every
+#              keyframe_every moves, and after an undo or set_state, it also sends a keyframe
+#              with the whole position, so a spectator joining late gets the last keyframe and
+#              the moves since then and is in sync. A subscriber whose callback raises is
+#              logged and dropped, so one broken spectator cannot stop the game or the others.
+#              SpectatorView rebuilds the game from the frames on the watching side.
+#
+#              Frame: sequence number (4 bytes), kind byte, then for a move frame the move
+#                     byte of QuoridorRecords (6 bytes) and for a keyframe the SNAPSHOT_BYTES
+#                     snapshot of QuoridorGame.to_bytes (28 bytes).
+
+import itertools
+import logging
+
+from Quoridor import QuoridorGame, SNAPSHOT_BYTES
+from QuoridorRecords import encode_move, decode_move
+
+MOVE_FRAME = ord("M")
+KEYFRAME = ord("K")
+HEADER_BYTES = 5
+
+logger = logging.getLogger(__name__)
+
+
+def encode_frame(sequence, move=None, snapshot=None):
+    """returns a move frame, or a keyframe when snapshot is given"""
+    header = sequence.to_bytes(4, "big")
+    if snapshot is not None:
+        return header + bytes((KEYFRAME,)) + snapshot
+    return header + bytes((MOVE_FRAME, encode_move(move)))
+
+
+def decode_frame(frame):
+    """returns (sequence, move, snapshot), move is None for a keyframe and
+    snapshot is None for a move frame"""
+    sequence = int.from_bytes(frame[:4], "big")
+    if frame[4] == KEYFRAME:
+        if len(frame) != HEADER_BYTES + SNAPSHOT_BYTES:
+            raise ValueError("keyframe must be " + str(HEADER_BYTES + SNAPSHOT_BYTES) + " bytes")
+        return sequence, None, bytes(frame[HEADER_BYTES:])
+    if frame[4] == MOVE_FRAME and len(frame) == HEADER_BYTES + 1:
+        return sequence, decode_move(frame[HEADER_BYTES]), None
+    raise ValueError("unknown frame")
+
+
+class SpectatorHub:
+    """numbers, encodes and fans out the moves of one game"""
+    def __init__(self, game, keyframe_every=32):
+        """attaches to game and starts the stream with a keyframe"""
+        self._game = game
+        self._keyframe_every = keyframe_every
+        self._sequence = 0
+        self._since_keyframe = []                  # last keyframe and the move frames after it
+        self._subscribers = {}
+        self._ids = itertools.count(1)
+        self._frames_sent = 0
+        self.send_keyframe()
+        game.set_listener(self.on_move)
+
+
+    def close(self):
+        """detaches from the game and drops every subscriber"""
+        if self._game.get_listener() == self.on_move:
+            self._game.set_listener(None)
+        self._subscribers.clear()
+
+
+    def subscribe(self, callback, catch_up=True):
+        """callback(frame) gets every frame from now on, first the last
+        keyframe and the moves since then when catch_up is True, returns
+        an id for unsubscribe, a callback that raises during the catch up
+        is never added"""
+        subscriber = next(self._ids)
+        if catch_up:
+            for frame in self._since_keyframe:
+                if not self.deliver(subscriber, callback, frame):
+                    return subscriber
+        self._subscribers[subscriber] = callback
+        return subscriber
+
+
+    def unsubscribe(self, subscriber):
+        """stops sending frames to the subscriber"""
+        self._subscribers.pop(subscriber, None)
+
+
+    def get_subscriber_count(self):
+        """returns the number of subscribers"""
+        return len(self._subscribers)
+
+
+    def get_sequence(self):
+        """returns the sequence number of the last frame"""
+        return self._sequence
+
+
+    def get_frames_sent(self):
+        """returns the number of frames handed to subscribers"""
+        return self._frames_sent
+
+
+    def on_move(self, game, move):
+        """game listener, a move becomes a move frame and anything else a
+        keyframe, a keyframe also follows every keyframe_every moves"""
+        if move is None:
+            self.send_keyframe()
+            return
+        self._sequence += 1
+        frame = encode_frame(self._sequence, move)
+        self._since_keyframe.append(frame)
+        self.broadcast(frame)
+        if len(self._since_keyframe) > self._keyframe_every:
+            self.send_keyframe()
+
+
+    def send_keyframe(self):
+        """sends the whole position and starts a new catch up list"""
+        self._sequence += 1
+        frame = encode_frame(self._sequence, snapshot=self._game.to_bytes())
+        self._since_keyframe = [frame]
+        self.broadcast(frame)
+
+
+    def broadcast(self, frame):
+        """hands the same frame bytes to every subscriber"""
+        for subscriber, callback in list(self._subscribers.items()):
+            self._frames_sent += self.deliver(subscriber, callback, frame)
+
+
+    def deliver(self, subscriber, callback, frame):
+        """hands one frame to one subscriber, returns False when the callback
+        raised, which logs the error and drops the subscriber"""
+        try:
+            callback(frame)
+        except Exception:
+            logger.exception("dropping spectator %d after its callback failed", subscriber)
+            self._subscribers.pop(subscriber, None)
+            return False
+        return True
+
+
+class SpectatorView:
+    """the watching side, keeps a QuoridorGame in step with the frames of a
+    hub, frames after a gap are skipped until the next keyframe"""
+    def __init__(self):
+        self._game = None
+        self._sequence = None
+
+
+    def get_game(self):
+        """returns the rebuilt game, None before the first keyframe"""
+        return self._game
+
+
+    def in_sync(self):
+        """returns True when the view has every frame up to the last one"""
+        return self._game is not None
+
+
+    def feed(self, frame):
+        """applies one frame, returns False when it was skipped"""
+        sequence, move, snapshot = decode_frame(frame)
+        if snapshot is not None:
+            self._game = QuoridorGame.from_bytes(snapshot)
+        elif self._game is None or sequence != self._sequence + 1:
+            self._game = None                      # missed a frame, wait for a keyframe
+            return False
+        elif self._game.apply(move) is not True:
+            raise ValueError("frame " + str(sequence) + " holds an illegal move")
+        self._sequence = sequence
+        return True
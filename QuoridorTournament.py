@@ -0,0 +1,377 @@
+# Author: Devon Miller
+# Date: 8/5/2021
+# Description: Plays tournaments between Quoridor players on a pool of worker processes and
+#              rates them with Elo. A player is a name and a spec, the spec is one of the built
+#              in players (random, greedy, engine) or a plugin "module:attribute", a class or
+#              function called with a seed that returns an object with best_move(game,
+#              max_time) returning a move in apply format. The schedule is a round robin
+#              (every pair) or a gauntlet (the first player against every other), every pairing
+#              is played an even number of times so both players move first equally often.
+#              Players get a copy of the game for each move and lose the game for an illegal
+#              move, for raising an exception or for going over the move time by more than
+#              TIME_GRACE, a move running that long is cut off with a SIGALRM timer where the
+#              platform has one and otherwise only judged once it returns. Every finished
+#              game is appended to the results file at once, and running the same command
+#              again skips the games already in it, so a run stopped with Ctrl-C resumes.
+#
+#              Result line: {"game": 7, "player1": "engine", "player2": "random",
+#                            "score": 1.0, "reason": "goal", "plies": 31, "seconds": 2.4}
+#                           (score is for player1, 0.5 for a game stopped at max_plies)
+#
+#              python QuoridorTournament.py --player fast=engine --player base=greedy
+#                     --player mine=mybot:Bot --rounds 20 --move-time 0.1 --results run.jsonl
+
+import argparse
+import importlib
+import json
+import math
+import multiprocessing
+import os
+import random
+import signal
+import threading
+import time
+
+from Quoridor import QuoridorGame
+from QuoridorEngine import QuoridorEngine
+
+TIME_GRACE = 0.25                              # seconds a move may run over the move time
+MAX_PLIES = 300                                # a game this long is scored as a draw
+ENGINE_TABLE_BYTES = 1 << 22
+CONFIDENCE_Z = 1.96                            # 95% confidence interval
+SCORE_LIMIT = 0.001                            # scores are kept this far from 0 and 1 for Elo
+
+
+class RandomPlayer:
+    """plays a random legal pawn move, or a random legal fence one move in five"""
+    def __init__(self, seed=None):
+        self._rng = random.Random(seed)
+
+
+    def best_move(self, game, max_time):
+        """returns a random move for the player to move"""
+        player = game.get_turn()
+        if self._rng.random() < 0.2:
+            fences = game.legal_fences(player)
+            if fences:
+                return self._rng.choice(fences)
+        moves = game.legal_moves(player)
+        return self._rng.choice(moves) if moves else None
+
+
+class GreedyPlayer:
+    """walks a shortest path to the goal row and never places a fence"""
+    def __init__(self, seed=None):
+        pass
+
+
+    def best_move(self, game, max_time):
+        """returns the pawn move that gets closest to the goal row"""
+        player = game.get_turn()
+        moves = game.legal_moves(player)
+        return min(moves, key=lambda move: game.distance(player, move)) if moves else None
+
+
+def engine_player(seed=None):
+    """returns a QuoridorEngine, its best_move already takes max_time"""
+    return QuoridorEngine(ENGINE_TABLE_BYTES)
+
+
+BUILT_IN_PLAYERS = {"random": RandomPlayer, "greedy": GreedyPlayer, "engine": engine_player}
+
+
+def load_player(spec, seed):
+    """makes the player for a built in name or a "module:attribute" plugin"""
+    if spec in BUILT_IN_PLAYERS:
+        return BUILT_IN_PLAYERS[spec](seed)
+    module, separator, attribute = spec.partition(":")
+    if not separator:
+        raise ValueError("player " + spec + " is not built in and not module:attribute")
+    return getattr(importlib.import_module(module), attribute)(seed)
+
+
+def round_robin(names, rounds):
+    """returns (first, second) name pairs for every pair of players, each
+    pair plays rounds times with either player moving first"""
+    pairs = []
+    for round_number in range(rounds):
+        for index, first in enumerate(names):
+            for second in names[index + 1:]:
+                pairs += [(first, second), (second, first)]
+    return pairs
+
+
+def gauntlet(names, rounds):
+    """returns (first, second) name pairs of the first player against every
+    other player rounds times with either player moving first"""
+    pairs = []
+    for round_number in range(rounds):
+        for other in names[1:]:
+            pairs += [(names[0], other), (other, names[0])]
+    return pairs
+
+
+SCHEDULES = {"round-robin": round_robin, "gauntlet": gauntlet}
+
+
+class MoveTimeout(BaseException):
+    """raised inside a player's best_move when it runs over its time, not an
+    Exception so a plugin catching Exception does not swallow it"""
+    pass
+
+
+def raise_timeout(signal_number, frame):
+    """SIGALRM handler that stops a move running over its time"""
+    raise MoveTimeout()
+
+
+def timed_move(player, game, move_time):
+    """returns player.best_move for a copy of game, cut off with MoveTimeout
+    after move_time plus TIME_GRACE seconds where SIGALRM timers exist (the
+    main thread on Unix), elsewhere a late move is only caught after it
+    returns"""
+    copy = QuoridorGame.from_bytes(game.to_bytes())
+    if not hasattr(signal, "setitimer") or threading.current_thread() is not threading.main_thread():
+        return player.best_move(copy, move_time)
+    previous = signal.signal(signal.SIGALRM, raise_timeout)
+    signal.setitimer(signal.ITIMER_REAL, move_time + TIME_GRACE)
+    try:
+        return player.best_move(copy, move_time)
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+
+def play_move(game, player, move_time):
+    """asks the player for a move and makes it, returns None when it was
+    made or the reason the player loses: time, error or illegal"""
+    move_start = time.perf_counter()
+    try:
+        move = timed_move(player, game, move_time)
+    except MoveTimeout:
+        return "time"
+    except Exception:                                  # a broken plugin loses, the tournament goes on
+        return "error"
+    if time.perf_counter() - move_start > move_time + TIME_GRACE:
+        return "time"
+    if move is None or game.apply(move) is not True:
+        return "illegal"
+    return None
+
+
+def play_game(job):
+    """pool entry point, job is (game number, player1 name, player1 spec,
+    player2 name, player2 spec, move time, max plies, seed), returns the
+    result dict"""
+    number, name_1, spec_1, name_2, spec_2, move_time, max_plies, seed = job
+    players = {1: load_player(spec_1, seed), 2: load_player(spec_2, seed + 1)}
+    game = QuoridorGame()
+    start = time.perf_counter()
+    score, reason, plies = 0.5, "max_plies", 0
+    while plies < max_plies:
+        if game.is_winner(1) or game.is_winner(2):
+            score, reason = (1.0 if game.is_winner(1) else 0.0), "goal"
+            break
+        player = game.get_turn()
+        reason = play_move(game, players[player], move_time)
+        if reason is not None:
+            score = 0.0 if player == 1 else 1.0
+            break
+        reason = "max_plies"
+        plies += 1
+    return {"game": number, "player1": name_1, "player2": name_2, "score": score, "reason": reason,
+            "plies": plies, "seconds": round(time.perf_counter() - start, 3)}
+
+
+def read_results(path):
+    """returns the result dicts already in the results file, a line cut
+    short when a run was stopped is skipped"""
+    results = []
+    if not os.path.exists(path):
+        return results
+    with open(path) as file:
+        for line in file:
+            try:
+                results.append(json.loads(line))
+            except ValueError:
+                continue
+    return results
+
+
+def scheduled_results(path, pairs):
+    """returns the results in the file that belong to games of pairs, a
+    result of another schedule is left out and its game played again"""
+    return [result for result in read_results(path) if 0 <= result["game"] < len(pairs)
+            and pairs[result["game"]] == (result["player1"], result["player2"])]
+
+
+def pending_jobs(players, pairs, done, move_time, max_plies, seed):
+    """returns the play_game jobs of the pairs whose game number is not in
+    done, every game gets its own seed from its number"""
+    return [(number, first, players[first], second, players[second], move_time, max_plies, seed + 2 * number)
+            for number, (first, second) in enumerate(pairs) if number not in done]
+
+
+def finished_games(jobs, workers):
+    """yields the result of every job as it finishes, on a pool of workers
+    processes or in this process for 1, the pool is stopped when the
+    generator is closed"""
+    if workers == 1:
+        yield from map(play_game, jobs)
+        return
+    pool = multiprocessing.Pool(workers)
+    try:
+        yield from pool.imap_unordered(play_game, jobs)
+    finally:
+        pool.terminate()
+
+
+def end_last_line(output):
+    """ends a line cut short by a stop so the next result starts on a line
+    of its own, output is open in a+ mode"""
+    if output.tell():
+        output.seek(output.tell() - 1)
+        if output.read(1) != "\n":
+            output.write("\n")
+
+
+def run_tournament(players, pairs, results_path, move_time=0.1, workers=None,
+                   max_plies=MAX_PLIES, seed=162):
+    """plays every pair not yet in the results file, players maps names to
+    specs, returns every result once all games are done"""
+    results = scheduled_results(results_path, pairs)
+    jobs = pending_jobs(players, pairs, {result["game"] for result in results}, move_time, max_plies, seed)
+    games = finished_games(jobs, workers or os.cpu_count() or 1)
+    with open(results_path, "a+") as output:
+        end_last_line(output)
+        try:
+            for result in games:
+                output.write(json.dumps(result) + "\n")
+                output.flush()
+                results.append(result)
+        finally:
+            games.close()
+    return results
+
+
+def elo_difference(score):
+    """returns the Elo difference that gives the expected score"""
+    score = min(max(score, SCORE_LIMIT), 1 - SCORE_LIMIT)
+    return -400 * math.log10(1 / score - 1)
+
+
+def wilson_interval(score, count):
+    """returns the Wilson score interval of a mean score over count games,
+    it stays wide for a short run of only wins or only losses"""
+    z = CONFIDENCE_Z
+    center = (score + z * z / (2 * count)) / (1 + z * z / count)
+    half = z * math.sqrt(score * (1 - score) / count + z * z / (4 * count * count)) / (1 + z * z / count)
+    return center - half, center + half
+
+
+def collect_games(results, names):
+    """returns {name: [(opponent, score), ...]} of the results between
+    players in names"""
+    games = {name: [] for name in names}
+    for result in results:
+        if result["player1"] not in games or result["player2"] not in games:
+            continue
+        games[result["player1"]].append((result["player2"], result["score"]))
+        games[result["player2"]].append((result["player1"], 1 - result["score"]))
+    return games
+
+
+def bradley_terry(games, names, tolerance=1e-7, max_iterations=10000):
+    """returns {name: Elo} centered on 0, the maximum likelihood Bradley-Terry
+    strengths found with minorization-maximization updates until no rating
+    moves by more than tolerance, a draw counts as half a win and every
+    player also gets one virtual draw against a player of strength 1 so a
+    player with only wins or only losses keeps a finite rating"""
+    strength = {name: 1.0 for name in names}
+    for iteration in range(max_iterations):
+        new = {}
+        for name in names:
+            won = 0.5 + sum(score for opponent, score in games[name])
+            weight = 1 / (strength[name] + 1) + sum(1 / (strength[name] + strength[opponent])
+                                                    for opponent, score in games[name])
+            new[name] = won / weight
+        change = max(abs(math.log(new[name] / strength[name])) for name in names)
+        strength = new
+        if change < tolerance:
+            break
+    elo = {name: 400 * math.log10(strength[name]) for name in names}
+    center = sum(elo.values()) / len(elo)
+    return {name: rating - center for name, rating in elo.items()}
+
+
+def ratings(results, names):
+    """returns {name: (elo, low, high, games, score)}, elo from
+    bradley_terry and low to high the 95% interval of the player's
+    performance, the Wilson interval of their score put against the
+    average rating of their opponents"""
+    games = collect_games(results, names)
+    elo = bradley_terry(games, names)
+    table = {}
+    for name in names:
+        count = len(games[name])
+        if not count:
+            table[name] = (elo[name], -math.inf, math.inf, 0, 0.0)
+            continue
+        score = sum(value for opponent, value in games[name]) / count
+        average = sum(elo[opponent] for opponent, value in games[name]) / count
+        low, high = wilson_interval(score, count)
+        table[name] = (elo[name], average + elo_difference(low), average + elo_difference(high), count, score)
+    return table
+
+
+def print_ratings(table):
+    """prints the ratings best first"""
+    print("player".ljust(16) + "elo".rjust(7) + "95% interval".rjust(18) + "games".rjust(7) + "score".rjust(7))
+    for name, (elo, low, high, count, score) in sorted(table.items(), key=lambda item: -item[1][0]):
+        print(name.ljust(16) + ("%.0f" % elo).rjust(7) + ("%.0f to %.0f" % (low, high)).rjust(18)
+              + str(count).rjust(7) + ("%.3f" % score).rjust(7))
+
+
+def parse_options():
+    """returns the parsed command line options"""
+    parser = argparse.ArgumentParser(description="play a Quoridor tournament and rate the players")
+    parser.add_argument("--player", action="append", required=True,
+                        help="name=spec, spec is random, greedy, engine or module:attribute")
+    parser.add_argument("--schedule", choices=sorted(SCHEDULES), default="round-robin")
+    parser.add_argument("--rounds", type=int, default=10, help="games per pairing with each player first")
+    parser.add_argument("--move-time", type=float, default=0.1, help="seconds per move")
+    parser.add_argument("--max-plies", type=int, default=MAX_PLIES)
+    parser.add_argument("--workers", type=int, default=None, help="processes, every core by default")
+    parser.add_argument("--results", default="tournament.jsonl", help="results file, resumed when it exists")
+    parser.add_argument("--seed", type=int, default=162)
+    return parser.parse_args()
+
+
+def parse_players(arguments):
+    """returns {name: spec} for name=spec arguments, a bare spec is also
+    its own name"""
+    players = {}
+    for argument in arguments:
+        name, separator, spec = argument.partition("=")
+        players[name] = spec if separator else name
+    return players
+
+
+def main():
+    """command line entry point"""
+    options = parse_options()
+    players = parse_players(options.player)
+    names = list(players)
+    pairs = SCHEDULES[options.schedule](names, options.rounds)
+    try:
+        results = run_tournament(players, pairs, options.results, options.move_time, options.workers,
+                                 options.max_plies, options.seed)
+    except KeyboardInterrupt:
+        print("stopped, run the same command again to resume")
+        results = scheduled_results(options.results, pairs)
+    print(len(results), "of", len(pairs), "games played")
+    print_ratings(ratings(results, names))
+
+
+if __name__ == "__main__":
+    main()
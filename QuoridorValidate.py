@@ -0,0 +1,188 @@
+# Author: Devon Miller
+# Date: 8/5/2021
+# Description: Checks large batches of game logs sent in by clients by replaying every call
+#              through QuoridorGame. Logs are read one line at a time from files or stdin, cut
+#              into chunks and handed to a pool of worker processes, which parse and replay
+#              them. Only max_pending chunks are ever waiting for a worker, so memory stays the
+#              same however long the input is, and the reports come back in input order. Each
+#              report lists the calls the rules rejected and the game state the log ends in,
+#              and a summary counts logs, calls, rejected calls and results.
+#
+#              Log line (one JSON object per line, calls use the GameServer request format):
+#                {"id": "game-1", "calls": [{"op": "move_pawn", "player": 1, "to": [4, 1]},
+#                 {"op": "place_fence", "player": 2, "direction": "h", "at": [3, 3]}, ...],
+#                 "result": "player1 wins"}                 ("id" and "result" are optional)
+#              Report line:
+#                {"line": 1, "id": "game-1", "calls": 2, "illegal": [[index, returned]],
+#                 "game_state": "unfinished", "result_matches": true}  or  {"line": 1, "error": ...}
+#
+#              python QuoridorValidate.py logs/*.jsonl --workers 8 --report reports.jsonl
+#              cat day.jsonl | python QuoridorValidate.py --report problems.jsonl --illegal-only
+
+import argparse
+import collections
+import itertools
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+from Quoridor import QuoridorGame
+
+CHUNK_LINES = 256                              # log lines sent to a worker at a time
+
+
+def replay_call(game, call):
+    """runs one logged call on the game and returns what it returned"""
+    operation = call["op"]
+    if operation == "move_pawn":
+        return game.move_pawn(call["player"], tuple(call["to"]))
+    if operation == "place_fence":
+        return game.place_fence(call["player"], call["direction"], tuple(call["at"]))
+    raise ValueError("unknown op " + str(operation))
+
+
+def validate_log(log):
+    """replays one parsed log and returns its report dict"""
+    game = QuoridorGame()
+    calls = log["calls"]
+    illegal = []
+    for index, call in enumerate(calls):
+        returned = replay_call(game, call)
+        if returned is not True:
+            illegal.append([index, returned])
+    report = {"id": log.get("id"), "calls": len(calls), "illegal": illegal,
+              "game_state": game.get_game_state()}
+    if "result" in log:
+        report["result_matches"] = log["result"] == report["game_state"]
+    return report
+
+
+def validate_line(number, line):
+    """parses and replays one log line, a line that cannot be read gets a
+    report with an error instead"""
+    try:
+        report = validate_log(json.loads(line))
+    except (ValueError, KeyError, TypeError, IndexError) as error:
+        report = {"error": type(error).__name__ + ": " + str(error)}
+    report["line"] = number
+    return report
+
+
+def validate_chunk(chunk):
+    """pool entry point, chunk is a list of (line number, line)"""
+    return [validate_line(number, line) for number, line in chunk]
+
+
+def read_chunks(lines, size=CHUNK_LINES):
+    """yields lists of up to size (line number, line) pairs, blank lines
+    are skipped"""
+    numbered = ((number, line) for number, line in enumerate(lines, 1) if line.strip())
+    while True:
+        chunk = list(itertools.islice(numbered, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def validate_lines(lines, workers=None, chunk_size=CHUNK_LINES, max_pending=None):
+    """yields the report of every log line in input order, replaying on
+    workers processes (every core by default) with at most max_pending
+    chunks read ahead of the reports"""
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        for chunk in read_chunks(lines, chunk_size):
+            yield from validate_chunk(chunk)
+        return
+    max_pending = max_pending or workers * 2
+    with multiprocessing.Pool(workers) as pool:
+        pending = collections.deque()
+        for chunk in read_chunks(lines, chunk_size):
+            pending.append(pool.apply_async(validate_chunk, (chunk,)))
+            if len(pending) >= max_pending:
+                yield from pending.popleft().get()
+        while pending:
+            yield from pending.popleft().get()
+
+
+def new_summary():
+    """returns an empty summary dict for add_report"""
+    return {"logs": 0, "calls": 0, "illegal_calls": 0, "logs_with_illegal": 0, "unreadable": 0,
+            "result_mismatches": 0, "game_states": {}}
+
+
+def add_report(summary, report):
+    """adds one report to the summary"""
+    summary["logs"] += 1
+    if "error" in report:
+        summary["unreadable"] += 1
+        return
+    summary["calls"] += report["calls"]
+    summary["illegal_calls"] += len(report["illegal"])
+    summary["logs_with_illegal"] += bool(report["illegal"])
+    summary["result_mismatches"] += report.get("result_matches") is False
+    states = summary["game_states"]
+    states[report["game_state"]] = states.get(report["game_state"], 0) + 1
+
+
+def read_lines(paths):
+    """yields the lines of every file in paths one at a time, stdin for
+    no paths or '-'"""
+    for path in paths or ["-"]:
+        if path == "-":
+            yield from sys.stdin
+        else:
+            with open(path) as file:
+                yield from file
+
+
+def is_problem(report):
+    """returns True if the log of report could not be read, had an illegal
+    call or ended in another result than it says"""
+    return "error" in report or bool(report["illegal"]) or report.get("result_matches") is False
+
+
+def write_reports(reports, summary, path=None, illegal_only=False):
+    """adds every report to the summary and writes it as a line to path,
+    only the problem reports when illegal_only"""
+    output = open(path, "w") if path else None
+    try:
+        for report in reports:
+            add_report(summary, report)
+            if output is not None and (not illegal_only or is_problem(report)):
+                output.write(json.dumps(report) + "\n")
+    finally:
+        if output is not None:
+            output.close()
+
+
+def parse_options():
+    """returns the parsed command line options"""
+    parser = argparse.ArgumentParser(description="replay and check Quoridor game logs")
+    parser.add_argument("paths", nargs="*", help="log files, stdin when none are given")
+    parser.add_argument("--workers", type=int, default=None, help="processes, every core by default")
+    parser.add_argument("--chunk", type=int, default=CHUNK_LINES, help="log lines per worker task")
+    parser.add_argument("--report", help="write one report line per log to this file")
+    parser.add_argument("--illegal-only", action="store_true", help="report only logs with problems")
+    return parser.parse_args()
+
+
+def main():
+    """command line entry point, exits with 1 when a log had an illegal
+    call, an unreadable line or a result that did not match"""
+    options = parse_options()
+    summary = new_summary()
+    start = time.perf_counter()
+    reports = validate_lines(read_lines(options.paths), options.workers, options.chunk)
+    write_reports(reports, summary, options.report, options.illegal_only)
+    elapsed = time.perf_counter() - start
+    summary["seconds"] = round(elapsed, 3)
+    summary["logs_per_second"] = round(summary["logs"] / elapsed, 1) if elapsed else 0.0
+    print(json.dumps(summary, indent=2, sort_keys=True))
+    if summary["logs_with_illegal"] or summary["unreadable"] or summary["result_mismatches"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
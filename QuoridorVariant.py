@@ -0,0 +1,231 @@
+# Author: Devon Miller
+# Date: 8/5/2021
+# Description: Quoridor on a board of any odd size with 2 or 4 players. VariantGame takes the
+#              board size, the fences each player starts with and the number of players, and
+#              keeps the same bitmask board as QuoridorGame: cell (x, y) is bit y*size + x and
+#              a fence is one bit of the horizontal or vertical fence mask. Pawn moves are
+#              checked against move tables built once per board size by the same builder as
+#              QuoridorGame's, the fair play rule is a bitmask flood fill that adds one breadth
+#              first search layer of cells per step with a few shifts of the whole board and a
+#              win is one bit test against the goal mask, so the cost of a move grows about
+#              linearly with the board size.
+#
+#              Player 1 starts in the middle of the top row and player 2 in the middle of the
+#              bottom row, each going for the opposite row. With 4 players, player 3 starts in
+#              the middle of the left column and player 4 of the right column, going for the
+#              opposite column. Players move in turn 1, 2, (3, 4) and the first pawn to reach
+#              its goal wins. A pawn may jump another pawn next to it, or go diagonal around
+#              it when a fence, the board edge or a third pawn is behind it.
+
+from Quoridor import FAIR_PLAY_MESSAGE, build_move_tables
+
+PLAYER_COUNTS = (2, 4)
+_boards = {}                                   # board size -> tables from board_tables
+
+
+def board_tables(size):
+    """returns (pawn moves, board, top row, bottom row, left column, right
+    column) for a board size cells wide, built the first time each size
+    is used"""
+    if size not in _boards:
+        cells = size * size
+        top_row = (1 << size) - 1
+        left_column = sum(1 << (row * size) for row in range(size))
+        _boards[size] = (build_move_tables(size)[1], (1 << cells) - 1, top_row,
+                         top_row << (cells - size), left_column, left_column << (size - 1))
+    return _boards[size]
+
+
+def default_fences(size, players):
+    """returns the fences each player starts with, 11 each for two players
+    on the classic 9x9 board, growing with the board and split in half for
+    four players"""
+    fences = size + 2
+    return fences if players == 2 else fences // 2
+
+
+class VariantGame:
+    """a Quoridor game with a configurable board size, fence count and
+    number of players"""
+    def __init__(self, size=9, fences=None, players=2):
+        """size is the odd number of cells along each side, fences is the
+        number each player starts with (default_fences when None) and
+        players is 2 or 4"""
+        if size < 3 or size % 2 == 0:
+            raise ValueError("board size must be odd and at least 3")
+        if players not in PLAYER_COUNTS:
+            raise ValueError("a game has 2 or 4 players")
+        if fences is None:
+            fences = default_fences(size, players)
+        self._size = size
+        self._players = players
+        self._pawn_moves, self._board, top_row, bottom_row, left_column, right_column = board_tables(size)
+        middle = size // 2
+        starts = [middle, (size - 1) * size + middle, middle * size, middle * size + size - 1]
+        goals = [bottom_row, top_row, right_column, left_column]
+        self._positions = starts[:players]
+        self._goals = goals[:players]
+        self._fences = [fences] * players
+        self._h_fences = 0                             # horizontal fence slots used
+        self._v_fences = 0                             # vertical fence slots used
+        self._turn = 1
+        self._winner = 0                               # 0 while unfinished
+
+
+    def get_size(self):
+        """returns the number of cells along each side"""
+        return self._size
+
+
+    def get_player_count(self):
+        """returns 2 or 4"""
+        return self._players
+
+
+    def get_turn(self):
+        """returns the number of the player whose turn it is"""
+        return self._turn
+
+
+    def get_game_state(self):
+        """returns 'unfinished' or 'player<n> wins'"""
+        if self._winner:
+            return "player" + str(self._winner) + " wins"
+        return "unfinished"
+
+
+    def is_winner(self, player):
+        """returns True if player has won"""
+        return self._winner != 0 and self._winner == player
+
+
+    def get_position(self, player):
+        """returns the (x, y) of the player's pawn"""
+        cell = self._positions[player - 1]
+        return cell % self._size, cell // self._size
+
+
+    def get_fences_left(self, player):
+        """returns how many fences the player has left"""
+        return self._fences[player - 1]
+
+
+    def is_turn(self, player):
+        """returns True if the game is unfinished and it is player's turn"""
+        return not self._winner and player == self._turn
+
+
+    def occupied(self):
+        """returns a mask with the cell of every pawn set"""
+        mask = 0
+        for cell in self._positions:
+            mask |= 1 << cell
+        return mask
+
+
+    def pawn_allowed(self, current, occupied, cell):
+        """returns True if the pawn on current may move to the free cell,
+        looked up in the move tables, a diagonal is also allowed when a
+        third pawn stands behind the one being passed"""
+        h_fences, v_fences = self._h_fences, self._v_fences
+        for middle, open_h, open_v, closed_h, closed_v in self._pawn_moves[current].get(cell, ()):
+            if middle != -1 and not occupied >> middle & 1:   # jump or diagonal needs a pawn there
+                continue
+            if h_fences & open_h or v_fences & open_v:         # fence in the way
+                continue
+            if (closed_h | closed_v) and not (h_fences & closed_h or v_fences & closed_v
+                                              or occupied >> (2 * middle - current) & 1):
+                continue                                       # diagonal only when the jump is blocked
+            return True
+        return False
+
+
+    def legal_moves(self, player):
+        """returns every (x, y) the player's pawn may move to, empty if it
+        is not their turn"""
+        if not self.is_turn(player):
+            return []
+        current = self._positions[player - 1]
+        occupied = self.occupied()
+        return [(cell % self._size, cell // self._size) for cell in self._pawn_moves[current]
+                if not occupied >> cell & 1 and self.pawn_allowed(current, occupied, cell)]
+
+
+    def move_pawn(self, player, new_space):
+        """moves the player's pawn to new_space (x, y) if it is a legal
+        move, returns True if it moved and False otherwise"""
+        last = self._size - 1
+        if new_space[1] < 0 or new_space[0] < 0 or new_space[1] > last or new_space[0] > last:
+            return False
+        if not self.is_turn(player):
+            return False
+        cell = new_space[1] * self._size + new_space[0]
+        occupied = self.occupied()
+        if occupied >> cell & 1:                               # space is taken by a pawn
+            return False
+        if not self.pawn_allowed(self._positions[player - 1], occupied, cell):
+            return False
+        self._positions[player - 1] = cell
+        if self._goals[player - 1] >> cell & 1:
+            self._winner = player
+        self.next_turn()
+        return True
+
+
+    def place_fence(self, player, direction, position):
+        """places a fence for the player, returns True when placed,
+        FAIR_PLAY_MESSAGE when it would shut another pawn in and False for
+        any other illegal fence"""
+        last = self._size - 1
+        if position[1] < 0 or position[0] < 0 or position[1] > last or position[0] > last:
+            return False
+        if direction == "v" and position[0] == 0 or direction == "h" and position[1] == 0:
+            return False
+        if direction != "v" and direction != "h":
+            return False
+        if not self.is_turn(player) or self._fences[player - 1] == 0:
+            return False
+        fences = self.with_fence(direction, position)
+        if fences is None:
+            return False
+        for other in range(1, self._players + 1):              # fair play rule for the others
+            if other != player and not self.reaches_goal(other, *fences):
+                return FAIR_PLAY_MESSAGE
+        self._h_fences, self._v_fences = fences
+        self._fences[player - 1] -= 1
+        self.next_turn()
+        return True
+
+
+    def with_fence(self, direction, position):
+        """returns the (horizontal, vertical) fence masks with the fence
+        added, None when its slot is taken"""
+        bit = 1 << (position[1] * self._size + position[0])
+        if direction == "h":
+            return None if self._h_fences & bit else (self._h_fences | bit, self._v_fences)
+        return None if self._v_fences & bit else (self._h_fences, self._v_fences | bit)
+
+
+    def reaches_goal(self, player, h_fences, v_fences):
+        """bitmask flood fill, returns True if the player's pawn has a path
+        to their goal with the given fences"""
+        size = self._size
+        board, top_row, bottom_row, left_column, right_column = board_tables(size)[1:]
+        up = board & ~(h_fences | top_row)
+        down = board & ~(h_fences >> size | bottom_row)
+        left = board & ~(v_fences | left_column)
+        right = board & ~(v_fences >> 1 | right_column)
+        goal = self._goals[player - 1]
+        reached = 1 << self._positions[player - 1]
+        while not reached & goal:
+            grown = reached | (reached & up) >> size | (reached & down) << size \
+                | (reached & left) >> 1 | (reached & right) << 1
+            if grown == reached:
+                return False
+            reached = grown
+        return True
+
+
+    def next_turn(self):
+        """passes the turn to the next player"""
+        self._turn = self._turn % self._players + 1
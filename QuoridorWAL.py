@@ -0,0 +1,383 @@
+# Author: Devon Miller
+# Date: 8/5/2021
+# Description: A write-ahead log that lets a process hosting many games come back after a
+#              crash. GameStore hosts the games and appends every accepted move_pawn and
+#              place_fence call to the log as 5 bytes (game id and the QuoridorRecords move
+#              byte). Records are written in batches with one fsync per batch (group commit):
+#              a batch goes to disk once sync_every records are waiting or the oldest waiting
+#              record is sync_interval seconds old, and sync() forces it. The age is watched by
+#              a background thread, so a move is synced on time even when no move follows it.
+#              A crash loses at most the records not yet synced. checkpoint writes every game
+#              as a SNAPSHOT_BYTES snapshot, starts a new log file and deletes the old log and
+#              snapshot, so the log never grows past checkpoint_every records. Opening a store
+#              on a directory recovers it: the newest snapshot is loaded and the log written
+#              after it is replayed.
+#
+#              snapshot-<n>.qsnp: b"QRSN", version byte, next game id (4 bytes), game count
+#                    (4 bytes), then per game its id (4 bytes) and QuoridorGame.to_bytes.
+#              log-<n>.qwal: batches of record count (4 bytes), crc32 of the records (4 bytes)
+#                    and the records, a batch cut short by a crash fails its check and it and
+#                    everything after it is ignored.
+#
+#              python QuoridorWAL.py --games 100000 --moves 20
+
+import argparse
+import os
+import random
+import shutil
+import struct
+import tempfile
+import threading
+import time
+import zlib
+
+from Quoridor import QuoridorGame, SNAPSHOT_BYTES, pack_snapshot, unpack_snapshot
+from QuoridorCompact import CompactGame
+from QuoridorRecords import encode_move, decode_move
+
+SNAPSHOT_MAGIC = b"QRSN"
+VERSION = 1
+RECORD = struct.Struct(">IB")                  # game id, move byte or NEW_GAME / CLOSE_GAME
+BATCH = struct.Struct(">II")                   # record count, crc32 of the records
+SNAPSHOT_RECORD = struct.Struct(">I" + str(SNAPSHOT_BYTES) + "s")
+NEW_GAME = 250                                 # never a move byte
+CLOSE_GAME = 251
+
+
+def snapshot_bytes(game):
+    """returns the snapshot of a QuoridorGame or CompactGame"""
+    return pack_snapshot(game.get_state(), game.get_game_state())
+
+
+def file_number(name, prefix, suffix):
+    """returns n for a file named prefix-<n>suffix, None for other names"""
+    if name.startswith(prefix + "-") and name.endswith(suffix):
+        number = name[len(prefix) + 1:-len(suffix)]
+        if number.isdigit():
+            return int(number)
+    return None
+
+
+class GameStore:
+    """games kept in memory with every accepted move in a write-ahead log"""
+    def __init__(self, directory, game_class=QuoridorGame, durable=True, sync_every=256,
+                 sync_interval=0.005, checkpoint_every=1 << 20):
+        """recovers the games found in directory, durable False writes the
+        log without fsync"""
+        self._directory = directory
+        self._game_class = game_class
+        self._durable = durable
+        self._sync_every = sync_every
+        self._sync_interval = sync_interval
+        self._checkpoint_every = checkpoint_every
+        self._games = {}
+        self._next_id = 1
+        self._pending = []                         # records not yet written
+        self._oldest = None                        # time the oldest pending record was added
+        self._logged = 0                           # records in the current log file
+        self._syncs = 0
+        self._lock = threading.RLock()             # held by the flusher thread while it syncs
+        self._closing = threading.Event()
+        os.makedirs(directory, exist_ok=True)
+        self._number = self.recover()
+        self._log = open(self.path("log", self._number, ".qwal"), "ab")
+        self._flusher = threading.Thread(target=self.flush_loop, daemon=True)
+        self._flusher.start()
+
+
+    def path(self, prefix, number, suffix):
+        """returns the path of a numbered file in the store directory"""
+        return os.path.join(self._directory, prefix + "-" + str(number) + suffix)
+
+
+    def get_game(self, game_id):
+        """returns the game with game_id"""
+        return self._games[game_id]
+
+
+    def get_game_count(self):
+        """returns the number of games in the store"""
+        return len(self._games)
+
+
+    def get_sync_count(self):
+        """returns how many batches were written to the log"""
+        return self._syncs
+
+
+    def new_game(self):
+        """starts a game and returns its id"""
+        game_id = self._next_id
+        self._next_id += 1
+        self._games[game_id] = self._game_class()
+        self.append(game_id, NEW_GAME)
+        return game_id
+
+
+    def close_game(self, game_id):
+        """removes a game from the store"""
+        del self._games[game_id]
+        self.append(game_id, CLOSE_GAME)
+
+
+    def move_pawn(self, game_id, player, new_space):
+        """move_pawn on the game, logged when it is accepted"""
+        result = self._games[game_id].move_pawn(player, new_space)
+        if result is True:
+            self.append(game_id, encode_move(tuple(new_space)))
+        return result
+
+
+    def place_fence(self, game_id, player, direction, position):
+        """place_fence on the game, logged when it is accepted"""
+        result = self._games[game_id].place_fence(player, direction, position)
+        if result is True:
+            self.append(game_id, encode_move((direction, tuple(position))))
+        return result
+
+
+    def append(self, game_id, value):
+        """queues one record, the batch is written once it is big or old
+        enough and a checkpoint is made when the log is long enough"""
+        with self._lock:
+            self._pending.append(RECORD.pack(game_id, value))
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+            if len(self._pending) >= self._sync_every or time.monotonic() - self._oldest >= self._sync_interval:
+                self.sync()
+            if self._logged + len(self._pending) >= self._checkpoint_every:
+                self.checkpoint()
+
+
+    def flush_loop(self):
+        """thread that syncs the pending records once the oldest is
+        sync_interval seconds old, until the store is closed"""
+        delay = self._sync_interval
+        while not self._closing.wait(delay):
+            with self._lock:
+                age = 0.0 if self._oldest is None else time.monotonic() - self._oldest
+                if age >= self._sync_interval:
+                    self.sync()
+                    age = 0.0
+            delay = self._sync_interval - age
+
+
+    def sync(self):
+        """writes the pending records as one batch and waits for the disk
+        when durable, every move accepted before the call is then safe"""
+        with self._lock:
+            if not self._pending:
+                return
+            records = b"".join(self._pending)
+            self._log.write(BATCH.pack(len(self._pending), zlib.crc32(records)) + records)
+            self._log.flush()
+            if self._durable:
+                os.fsync(self._log.fileno())
+            self._logged += len(self._pending)
+            self._pending = []
+            self._oldest = None
+            self._syncs += 1
+
+
+    def checkpoint(self):
+        """writes a snapshot of every game, starts a new log and deletes
+        the files the snapshot replaces"""
+        self.sync()
+        number = self._number + 1
+        temporary = self.path("snapshot", number, ".tmp")
+        with open(temporary, "wb") as file:
+            file.write(SNAPSHOT_MAGIC + bytes((VERSION,)) + self._next_id.to_bytes(4, "big")
+                       + len(self._games).to_bytes(4, "big"))
+            file.write(b"".join(SNAPSHOT_RECORD.pack(game_id, snapshot_bytes(game))
+                                for game_id, game in self._games.items()))
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temporary, self.path("snapshot", number, ".qsnp"))
+        with self._lock:
+            self._log.close()
+            self._log = open(self.path("log", number, ".qwal"), "ab")
+        self._number, self._logged = number, 0
+        for name in os.listdir(self._directory):
+            old = file_number(name, "log", ".qwal")
+            if old is None:
+                old = file_number(name, "snapshot", ".qsnp")
+            if old is not None and old < number:
+                os.remove(os.path.join(self._directory, name))
+
+
+    def recover(self):
+        """loads the newest snapshot and replays the logs written after it,
+        returns the number of the log to append to"""
+        names = os.listdir(self._directory)
+        snapshots = [file_number(name, "snapshot", ".qsnp") for name in names]
+        snapshots = [number for number in snapshots if number is not None]
+        number = max(snapshots, default=0)
+        if snapshots:
+            self.load_snapshot(self.path("snapshot", number, ".qsnp"))
+        logs = [file_number(name, "log", ".qwal") for name in names]
+        for log in sorted(log for log in logs if log is not None and log >= number):
+            self.replay(self.path("log", log, ".qwal"))
+            number = log
+        return number
+
+
+    def load_snapshot(self, path):
+        """adds every game of a snapshot file"""
+        with open(path, "rb") as file:
+            data = file.read()
+        if data[:len(SNAPSHOT_MAGIC)] != SNAPSHOT_MAGIC or data[len(SNAPSHOT_MAGIC)] != VERSION:
+            raise ValueError(path + " is not a snapshot file")
+        start = len(SNAPSHOT_MAGIC) + 1
+        self._next_id = int.from_bytes(data[start:start + 4], "big")
+        count = int.from_bytes(data[start + 4:start + 8], "big")
+        for game_id, snapshot in SNAPSHOT_RECORD.iter_unpack(data[start + 8:start + 8 + count * SNAPSHOT_RECORD.size]):
+            game = self._game_class()
+            game.set_state(unpack_snapshot(snapshot)[0])
+            self._games[game_id] = game
+
+
+    def replay(self, path):
+        """applies the records of a log file, a batch cut short by a crash
+        and anything after it is cut off the file so new batches follow the
+        last good one"""
+        with open(path, "rb") as file:
+            data = file.read()
+        offset = 0
+        while offset + BATCH.size <= len(data):
+            count, checksum = BATCH.unpack_from(data, offset)
+            records = data[offset + BATCH.size:offset + BATCH.size + count * RECORD.size]
+            if len(records) != count * RECORD.size or zlib.crc32(records) != checksum:
+                break
+            for game_id, value in RECORD.iter_unpack(records):
+                self.replay_record(game_id, value)
+            offset += BATCH.size + len(records)
+        if offset < len(data):
+            os.truncate(path, offset)
+
+
+    def replay_record(self, game_id, value):
+        """applies one log record"""
+        if value == NEW_GAME:
+            self._games[game_id] = self._game_class()
+            self._next_id = max(self._next_id, game_id + 1)
+            return
+        if value == CLOSE_GAME:
+            self._games.pop(game_id, None)
+            return
+        game = self._games[game_id]
+        move = decode_move(value)
+        if isinstance(move[0], str):
+            result = game.place_fence(game.get_turn(), move[0], move[1])
+        else:
+            result = game.move_pawn(game.get_turn(), move)
+        if result is not True:
+            raise ValueError("log holds an illegal move for game " + str(game_id))
+
+
+    def close(self):
+        """stops the flusher thread, writes the pending records and closes
+        the log"""
+        self._closing.set()
+        self._flusher.join()
+        self.sync()
+        self._log.close()
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, kind, value, traceback):
+        self.close()
+
+
+class MemoryStore:
+    """the game calls of GameStore without a log, the baseline for the
+    benchmark"""
+    def __init__(self, game_class=QuoridorGame):
+        """starts with no games"""
+        self._game_class = game_class
+        self._games = {}
+
+
+    def get_game(self, game_id):
+        """returns the game with game_id"""
+        return self._games[game_id]
+
+
+    def new_game(self):
+        """starts a game and returns its id"""
+        game_id = len(self._games) + 1
+        self._games[game_id] = self._game_class()
+        return game_id
+
+
+    def move_pawn(self, game_id, player, new_space):
+        """move_pawn on the game"""
+        return self._games[game_id].move_pawn(player, new_space)
+
+
+    def sync(self):
+        """nothing to write"""
+        pass
+
+
+def play(store, ids, moves, rng):
+    """plays moves random pawn moves in every game, returns the count"""
+    made = 0
+    for move in range(moves):
+        for game_id in ids:
+            game = store.get_game(game_id)
+            player = game.get_turn()
+            legal = game.legal_moves(player)
+            if legal and store.move_pawn(game_id, player, rng.choice(legal)) is True:
+                made += 1
+    store.sync()
+    return made
+
+
+def timed_play(store, games, moves, seed):
+    """starts games games in store and returns (moves per second of play,
+    game ids)"""
+    ids = [store.new_game() for game in range(games)]
+    start = time.perf_counter()
+    made = play(store, ids, moves, random.Random(seed))
+    return made / (time.perf_counter() - start), ids
+
+
+def benchmark(games=10000, moves=20, game_class=CompactGame, seed=162):
+    """prints and returns moves per second without a log, with the log
+    but no fsync and with group commit, and the seconds to recover"""
+    results = {"no log": timed_play(MemoryStore(game_class), games, moves, seed)[0]}
+    directory = tempfile.mkdtemp(prefix="quoridor-wal-")
+    try:
+        for name, durable in (("no fsync", False), ("group commit", True)):
+            with GameStore(os.path.join(directory, name), game_class, durable, checkpoint_every=1 << 30) as store:
+                results[name], ids = timed_play(store, games, moves, seed)
+        with GameStore(os.path.join(directory, "group commit"), game_class) as store:
+            store.checkpoint()                             # snapshot, then a log tail to replay
+            play(store, ids, 2, random.Random(seed))
+        start = time.perf_counter()
+        with GameStore(os.path.join(directory, "group commit"), game_class) as recovered:
+            results["recovery_seconds"] = time.perf_counter() - start
+            results["recovered_games"] = recovered.get_game_count()
+    finally:
+        shutil.rmtree(directory)
+    for name in ("no log", "no fsync", "group commit"):
+        print(name.ljust(14), str(round(results[name])).rjust(9), "moves/s")
+    print("recovered", results["recovered_games"], "games in %.2f s" % results["recovery_seconds"])
+    return results
+
+
+def main():
+    """command line entry point, runs the benchmark"""
+    parser = argparse.ArgumentParser(description="write-ahead log benchmark")
+    parser.add_argument("--games", type=int, default=10000)
+    parser.add_argument("--moves", type=int, default=20)
+    parser.add_argument("--full", action="store_true", help="use QuoridorGame instead of CompactGame")
+    options = parser.parse_args()
+    benchmark(options.games, options.moves, QuoridorGame if options.full else CompactGame)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+# Author: Devon Miller
+# Date: 8/5/2021
+# Description: Randomized checks of QuoridorGame against a plain reference written from the
+#              rules with coordinates and a breadth first search instead of bitmasks and
+#              incremental grids. Random games are played and after every move the goal
+#              distances of every cell, the legal fences and the hash are compared with a full
+#              recompute, and every move is undone and made again to check undo. Snapshots
+#              must read back as the same position, and a game played in mirror image must
+#              get the same canonical key at every ply.
+#
+#              python -m unittest test_Quoridor
+
+import random
+import unittest
+from collections import deque
+
+from Quoridor import QuoridorGame, SIZE, CELLS, UNREACHABLE, SNAPSHOT_BYTES, mirror_cell, mirror_fences, \
+    mirror_move, pack_snapshot, unpack_snapshot
+
+GAMES = 8                                      # random games per test
+MAX_PLIES = 80
+FENCE_CHANCE = 0.35                            # moves that place a fence when one is legal
+
+
+def step_open(h_fences, v_fences, x, y, dx, dy):
+    """returns True if a pawn on (x, y) may step by (dx, dy), reading the
+    fence masks one edge at a time"""
+    if not (0 <= x + dx < SIZE and 0 <= y + dy < SIZE):
+        return False
+    if dy == -1:
+        return not h_fences >> (y * SIZE + x) & 1
+    if dy == 1:
+        return not h_fences >> ((y + 1) * SIZE + x) & 1
+    if dx == -1:
+        return not v_fences >> (y * SIZE + x) & 1
+    return not v_fences >> (y * SIZE + x + 1) & 1
+
+
+def reference_distances(h_fences, v_fences, goal_y):
+    """returns the steps from every cell to row goal_y, found by a breadth
+    first search out from the goal row, UNREACHABLE for cut off cells"""
+    distances = [UNREACHABLE] * CELLS
+    queue = deque()
+    for x in range(SIZE):
+        distances[goal_y * SIZE + x] = 0
+        queue.append((x, goal_y))
+    while queue:
+        x, y = queue.popleft()
+        for dx, dy in ((1, 0), (-1, 0), (0, 1), (0, -1)):
+            cell = (y + dy) * SIZE + x + dx
+            if step_open(h_fences, v_fences, x, y, dx, dy) and distances[cell] == UNREACHABLE:
+                distances[cell] = distances[y * SIZE + x] + 1
+                queue.append((x + dx, y + dy))
+    return distances
+
+
+def reference_reaches(h_fences, v_fences, cell, goal_y):
+    """returns True if a pawn on cell has a path to row goal_y"""
+    seen = {(cell % SIZE, cell // SIZE)}
+    stack = list(seen)
+    while stack:
+        x, y = stack.pop()
+        if y == goal_y:
+            return True
+        for dx, dy in ((1, 0), (-1, 0), (0, 1), (0, -1)):
+            if step_open(h_fences, v_fences, x, y, dx, dy) and (x + dx, y + dy) not in seen:
+                seen.add((x + dx, y + dy))
+                stack.append((x + dx, y + dy))
+    return False
+
+
+def reference_fences(state):
+    """returns the set of fences the player to move may place, every free
+    slot that leaves the other player a path to their goal row"""
+    player_1, player_2, h_fences, v_fences, fences_1, fences_2, turn = state
+    if (fences_1 if turn == 1 else fences_2) == 0:
+        return set()
+    other, goal_y = (player_2, 0) if turn == 1 else (player_1, SIZE - 1)
+    fences = set()
+    for slot in range(CELLS):
+        x, y = slot % SIZE, slot // SIZE
+        if y > 0 and not h_fences >> slot & 1:
+            if reference_reaches(h_fences | 1 << slot, v_fences, other, goal_y):
+                fences.add(("h", (x, y)))
+        if x > 0 and not v_fences >> slot & 1:
+            if reference_reaches(h_fences, v_fences | 1 << slot, other, goal_y):
+                fences.add(("v", (x, y)))
+    return fences
+
+
+def random_move(game, rng):
+    """returns a random legal move of the player to move, None when there
+    is none"""
+    player = game.get_turn()
+    fences = game.legal_fences(player)
+    moves = game.legal_moves(player)
+    if fences and (rng.random() < FENCE_CHANCE or not moves):
+        return rng.choice(fences)
+    return rng.choice(moves) if moves else None
+
+
+class QuoridorGameTest(unittest.TestCase):
+    """random games checked move by move against the reference"""
+    def check_position(self, game):
+        """compares distances, legal fences and the hash with a recompute"""
+        state = game.get_state()
+        self.assertEqual(game.get_hash(), game.compute_hash())
+        for player, goal_y in ((1, SIZE - 1), (2, 0)):
+            distances = reference_distances(state[2], state[3], goal_y)
+            self.assertEqual([game.distance(player, (cell % SIZE, cell // SIZE)) for cell in range(CELLS)],
+                             distances)
+        if game.get_game_state() == "unfinished":
+            self.assertEqual(set(game.legal_fences(game.get_turn())), reference_fences(state))
+
+
+    def check_undo(self, game, move):
+        """makes move, undoes it and checks the position is back, then makes
+        it again"""
+        state, key = game.get_state(), game.get_hash()
+        self.assertIs(game.apply(move), True)
+        self.assertIs(game.undo(), True)
+        self.assertEqual((game.get_state(), game.get_hash()), (state, key))
+        self.assertIs(game.apply(move), True)
+
+
+    def test_random_games_match_reference(self):
+        """plays random games, checking every position on the way and again
+        while the game is taken back move by move"""
+        rng = random.Random(162)
+        for number in range(GAMES):
+            game = QuoridorGame()
+            seen = []
+            while game.get_game_state() == "unfinished" and len(seen) < MAX_PLIES:
+                self.check_position(game)
+                move = random_move(game, rng)
+                if move is None:
+                    break
+                seen.append((game.get_state(), game.get_hash()))
+                self.check_undo(game, move)
+            self.check_position(game)
+            while seen:                                # take the whole game back
+                game.undo()
+                self.assertEqual((game.get_state(), game.get_hash()), seen.pop())
+            self.check_position(game)
+
+
+class SnapshotTest(unittest.TestCase):
+    """pack_snapshot and canonical_key on random games"""
+    def test_snapshot_round_trip(self):
+        """every position of random games, won ones too, and a board full
+        of fence bits read back the same"""
+        rng = random.Random(163)
+        for number in range(GAMES):
+            game = QuoridorGame()
+            while True:
+                data = game.to_bytes()
+                self.assertEqual(len(data), SNAPSHOT_BYTES)
+                self.assertEqual(unpack_snapshot(data), (game.get_state(), game.get_game_state()))
+                copy = QuoridorGame.from_bytes(data)
+                self.assertEqual((copy.get_state(), copy.get_game_state(), copy.get_hash()),
+                                 (game.get_state(), game.get_game_state(), game.get_hash()))
+                move = random_move(game, rng)
+                if move is None or game.get_game_state() != "unfinished":
+                    break
+                game.apply(move)
+        h_fences = sum(1 << slot for slot in range(SIZE, CELLS))
+        v_fences = sum(1 << slot for slot in range(CELLS) if slot % SIZE)
+        state = (80, 0, h_fences, v_fences, 10, 0, 2)
+        self.assertEqual(unpack_snapshot(pack_snapshot(state, "player2 wins")), (state, "player2 wins"))
+
+
+    def test_canonical_key_is_mirror_invariant(self):
+        """a game and its mirror image share the key at every ply, with
+        mirrored set on exactly one of them unless the position is its own
+        mirror image"""
+        rng = random.Random(164)
+        for number in range(GAMES):
+            game, mirror = QuoridorGame(), QuoridorGame()
+            for ply in range(MAX_PLIES):
+                key, mirrored = game.canonical_key()
+                mirror_key, mirror_mirrored = mirror.canonical_key()
+                self.assertEqual(key, mirror_key)
+                state = game.get_state()
+                flipped = (mirror_cell(state[0]), mirror_cell(state[1])) + mirror_fences(state[2], state[3]) + state[4:]
+                self.assertEqual(mirror.get_state(), flipped)
+                self.assertEqual(mirrored != mirror_mirrored, flipped != state)
+                move = random_move(game, rng)
+                if move is None or game.get_game_state() != "unfinished":
+                    break
+                self.assertIs(mirror.apply(mirror_move(move)), True)
+                game.apply(move)
+
+
+if __name__ == "__main__":
+    unittest.main()
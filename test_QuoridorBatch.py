@@ -0,0 +1,79 @@
+# Author: Devon Miller
+# Date: 8/5/2021
+# Description: Randomized checks of BatchQuoridor. Recorded random games are replayed through
+#              QuoridorGame, which must accept every move and end in the same position with the
+#              same winner. The packed legal pawn masks are compared with legal_moves of a
+#              QuoridorGame kept in step with every game, and the packed fair play check with
+#              legal_fences.
+#
+#              python -m unittest test_QuoridorBatch
+
+import random
+import unittest
+
+from Quoridor import QuoridorGame, SIZE
+from QuoridorBatch import BatchQuoridor
+
+GAMES = 300
+MAX_PLIES = 400
+FENCE_PLIES = 12                               # plies of fences around the pawns
+
+
+def boxing_fence(state, rng):
+    """returns a fence on an edge of the other pawn's cell half of the
+    time, None (a random move) otherwise"""
+    if rng.random() < 0.5:
+        return None
+    cell = state[1] if state[6] == 1 else state[0]
+    x, y = cell % SIZE, cell // SIZE
+    return rng.choice([("h", (x, y)), ("h", (x, y + 1)), ("v", (x, y)), ("v", (x + 1, y))])
+
+
+class BatchQuoridorTest(unittest.TestCase):
+    """BatchQuoridor against QuoridorGame"""
+    def test_recorded_games_replay_through_quoridor_game(self):
+        """every recorded game gives the same result in QuoridorGame"""
+        batch = BatchQuoridor(GAMES, seed=162, fence_chance=0.3, record=True)
+        batch.run(MAX_PLIES)
+        for index in range(GAMES):
+            self.assertTrue(batch.verify(index))
+
+
+    def test_pawn_masks_match_legal_moves(self):
+        """the masks of every step are the legal moves QuoridorGame gives
+        for the same position"""
+        batch = BatchQuoridor(GAMES // 3, seed=162, fence_chance=0.3, record=True)
+        games = [QuoridorGame() for index in range(batch.get_count())]
+        for ply in range(MAX_PLIES):
+            masks = batch.legal_pawn_masks()
+            for index, game in enumerate(games):
+                for move in batch.get_moves(index)[game.get_history_length():]:
+                    self.assertIs(game.apply(move), True)
+                self.assertEqual(game.get_state(), batch.get_state(index))
+                if game.get_game_state() == "unfinished":
+                    moves = game.legal_moves(game.get_turn())
+                    self.assertEqual(masks[index], sum(1 << y * SIZE + x for x, y in moves))
+            batch.step()
+
+
+    def test_packed_fair_play_matches_legal_fences(self):
+        """every free slot of a position is checked together and the fences
+        kept are the legal fences of QuoridorGame, the games get fences
+        next to the pawns so the fair play rule comes up"""
+        batch = BatchQuoridor(GAMES // 10, seed=162)
+        rng = random.Random(162)
+        for ply in range(FENCE_PLIES):
+            batch.step(lambda batch, masks: [boxing_fence(batch.get_state(index), rng)
+                                             for index in range(batch.get_count())])
+        for index in range(batch.get_count()):
+            game = QuoridorGame()
+            game.set_state(batch.get_state(index))
+            tried = [(index, direction, slot) for direction in "hv" for slot in range(SIZE * SIZE)
+                     if batch.slot_free(index, direction, slot)]
+            kept = {(direction, (slot % SIZE, slot // SIZE))
+                    for (index, direction, slot), fair in zip(tried, batch.fair_play(tried)) if fair}
+            self.assertEqual(kept, set(game.legal_fences(game.get_turn())))
+
+
+if __name__ == "__main__":
+    unittest.main()
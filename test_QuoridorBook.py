@@ -0,0 +1,95 @@
+# Author: Devon Miller
+# Date: 8/5/2021
+# Description: Checks of the pawn race tablebase. On small races, pawns a few rows from their
+#              goal with a few random fences on the board and none in hand, the tablebase must
+#              give the same result as a full width negamax search without it, and a tablebase
+#              file must read back the same results. The engine must solve the layout of a
+#              race before its clock starts and never solve one in the middle of a search.
+#
+#              python -m unittest test_QuoridorBook
+
+import os
+import random
+import tempfile
+import unittest
+
+from Quoridor import QuoridorGame, SIZE
+from QuoridorBook import PawnRaceTablebase
+from QuoridorEngine import QuoridorEngine, WIN, INFINITY
+
+RACES = 12
+FENCES = 4                                     # fences on the board of each race
+SEARCH_DEPTH = 7                               # results of up to this many plies are compared
+
+
+def random_layout(rng):
+    """returns (h fences, v fences) of FENCES random legal fences"""
+    game = QuoridorGame()
+    for number in range(FENCES):
+        game.apply(rng.choice(game.legal_fences(game.get_turn())))
+    return game.get_state()[2:4]
+
+
+def small_race(rng):
+    """returns a QuoridorGame of a pawn race with both pawns within three
+    rows of their goal and no fences in hand"""
+    h_fences, v_fences = random_layout(rng)
+    player_1 = rng.randrange(5, 8) * SIZE + rng.randrange(SIZE)
+    player_2 = rng.randrange(1, 4) * SIZE + rng.randrange(SIZE)
+    game = QuoridorGame()
+    game.set_state((player_1, player_2, h_fences, v_fences, 0, 0, rng.choice((1, 2))))
+    return game
+
+
+def search_score(plies):
+    """returns the negamax score at the root of a tablebase result"""
+    return WIN - plies if plies > 0 else -WIN - plies
+
+
+class PawnRaceTablebaseTest(unittest.TestCase):
+    """PawnRaceTablebase against search and through a file"""
+    def test_matches_negamax_on_small_races(self):
+        """every race decided within SEARCH_DEPTH plies gets the score a
+        search without the tablebase finds"""
+        rng = random.Random(162)
+        tablebase = PawnRaceTablebase()
+        compared = 0
+        while compared < RACES:
+            game = small_race(rng)
+            plies = tablebase.probe(game)
+            if plies is None or abs(plies) > SEARCH_DEPTH:
+                continue
+            score = QuoridorEngine(1 << 16).negamax(game, SEARCH_DEPTH, -INFINITY, INFINITY, 0)
+            self.assertEqual(score, search_score(plies), game.get_state())
+            compared += 1
+
+
+    def test_file_reads_back_the_solved_layout(self):
+        """a layout written to the directory gives the same results"""
+        rng = random.Random(163)
+        games = [small_race(rng) for number in range(RACES)]
+        in_memory = PawnRaceTablebase()
+        with tempfile.TemporaryDirectory() as directory:
+            with PawnRaceTablebase(directory) as tablebase:
+                for game in games:
+                    self.assertEqual(tablebase.probe(game), in_memory.probe(game))
+                self.assertEqual(len(os.listdir(directory)), RACES)
+
+
+    def test_engine_solves_layouts_before_searching(self):
+        """a race at the root is solved before the search, a layout only
+        reached in the search is not solved"""
+        rng = random.Random(164)
+        tablebase = PawnRaceTablebase()
+        engine = QuoridorEngine(1 << 16, tablebase=tablebase)
+        game = small_race(rng)
+        self.assertIs(game.apply(engine.best_move(game, max_time=None, max_depth=3)), True)
+        self.assertEqual(len(tablebase), 1)
+        player_1, player_2, h_fences, v_fences, fences_1, fences_2, turn = small_race(rng).get_state()
+        game.set_state((player_1, player_2, h_fences, v_fences, 1, 0, 1))   # one fence left to place
+        self.assertIsNotNone(engine.best_move(game, max_time=None, max_depth=2))
+        self.assertEqual(len(tablebase), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
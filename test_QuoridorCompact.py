@@ -0,0 +1,58 @@
+# Author: Devon Miller
+# Date: 8/5/2021
+# Description: Randomized check that CompactGame answers every call the way QuoridorGame does.
+#              The same stream of random calls, legal and illegal (wrong player, off the
+#              board, unknown direction), goes to both games and the results, winners,
+#              states and legal moves are compared after every call.
+#
+#              python -m unittest test_QuoridorCompact
+
+import random
+import unittest
+
+from Quoridor import QuoridorGame
+from QuoridorCompact import CompactGame
+
+GAMES = 200
+MAX_CALLS = 200
+
+
+def random_call(game, rng):
+    """returns (method name, arguments) of a random call on game, about a
+    third of them legal pawn moves"""
+    player = rng.choice((1, 2, 3)) if rng.random() < 0.1 else game.get_turn()
+    roll = rng.random()
+    if roll < 0.35:
+        return "move_pawn", (player, (rng.randint(-1, 9), rng.randint(-1, 9)))
+    if roll < 0.7 and game.legal_moves(player):
+        return "move_pawn", (player, rng.choice(game.legal_moves(player)))
+    return "place_fence", (player, rng.choice("hvx"), (rng.randint(-1, 9), rng.randint(-1, 9)))
+
+
+class CompactGameTest(unittest.TestCase):
+    """CompactGame against QuoridorGame call for call"""
+    def check_same(self, game, compact):
+        """compares everything both games report"""
+        self.assertEqual(compact.get_state(), game.get_state())
+        self.assertEqual(compact.get_game_state(), game.get_game_state())
+        for player in (1, 2, 3):
+            self.assertEqual(compact.is_winner(player), game.is_winner(player))
+        for player in (1, 2):
+            self.assertEqual(sorted(compact.legal_moves(player)), sorted(game.legal_moves(player)))
+
+
+    def test_random_calls_match_quoridor_game(self):
+        """plays the same random calls on both games"""
+        rng = random.Random(162)
+        for number in range(GAMES):
+            game, compact = QuoridorGame(), CompactGame()
+            for call in range(MAX_CALLS):
+                name, arguments = random_call(game, rng)
+                self.assertEqual(getattr(compact, name)(*arguments), getattr(game, name)(*arguments))
+                self.check_same(game, compact)
+            self.assertEqual(CompactGame.from_game(game).get_state(), game.get_state())
+            self.assertEqual(compact.to_game().get_state(), game.get_state())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,73 @@
+# Author: Devon Miller
+# Date: 8/5/2021
+# Description: Checks of the alpha-beta engine. It must take a win in one move, answer with a
+#              legal move in random positions without changing them, and leave the game as it
+#              was when the budget runs out in the middle of a search.
+#
+#              python -m unittest test_QuoridorEngine
+
+import random
+import unittest
+
+from Quoridor import QuoridorGame, SIZE
+from QuoridorEngine import QuoridorEngine, CHECK_EVERY
+from test_Quoridor import random_move
+
+POSITIONS = 10
+MAX_NODES = 2 * CHECK_EVERY
+
+
+def random_position(rng, plies):
+    """returns a QuoridorGame after up to plies random moves"""
+    game = QuoridorGame()
+    for ply in range(plies):
+        move = random_move(game, rng)
+        if move is None or game.get_game_state() != "unfinished":
+            break
+        game.apply(move)
+    return game
+
+
+class QuoridorEngineTest(unittest.TestCase):
+    """QuoridorEngine.best_move on small budgets"""
+    def test_takes_win_in_one(self):
+        """a pawn one step from its goal row steps onto it"""
+        for player, cell, other in ((1, 7 * SIZE + 2, 40), (2, SIZE + 6, 40)):
+            game = QuoridorGame()
+            game.set_state((cell, other, 0, 0, 5, 5, 1) if player == 1 else (other, cell, 0, 0, 5, 5, 2))
+            move = QuoridorEngine(1 << 16).best_move(game, max_time=None, max_depth=3)
+            self.assertIs(game.apply(move), True)
+            self.assertTrue(game.is_winner(player))
+
+
+    def test_moves_are_legal(self):
+        """best_move is legal and the position is the same afterwards"""
+        rng = random.Random(162)
+        engine = QuoridorEngine(1 << 16)
+        for number in range(POSITIONS):
+            game = random_position(rng, rng.randrange(30))
+            if game.get_game_state() != "unfinished":
+                continue
+            state, key, length = game.get_state(), game.get_hash(), game.get_history_length()
+            player = game.get_turn()
+            move = engine.best_move(game, max_time=None, max_nodes=MAX_NODES)
+            self.assertEqual((game.get_state(), game.get_hash(), game.get_history_length()), (state, key, length))
+            self.assertIn(move, game.legal_moves(player) + game.legal_fences(player))
+
+
+    def test_budget_in_mid_search_unwinds_the_game(self):
+        """a search stopped by SearchTimeout takes back the moves it made
+        and keeps the move of the last full depth"""
+        rng = random.Random(162)
+        for number in range(5):
+            game = random_position(rng, 10)
+            state, key, length = game.get_state(), game.get_hash(), game.get_history_length()
+            engine = QuoridorEngine(1 << 16)
+            move = engine.best_move(game, max_time=None, max_nodes=1)
+            self.assertEqual(engine.get_nodes(), CHECK_EVERY)            # stopped at the first check
+            self.assertEqual((game.get_state(), game.get_hash(), game.get_history_length()), (state, key, length))
+            self.assertIs(game.apply(move), True)
+
+
+if __name__ == "__main__":
+    unittest.main()
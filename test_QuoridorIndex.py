@@ -0,0 +1,141 @@
+# Author: Devon Miller
+# Date: 8/5/2021
+# Description: Checks of the position index. Random games from BatchQuoridor are written to an
+#              archive and indexed, and lookup and continuations are compared with a dict of
+#              every position built by replaying the games, after adding, after adding the
+#              same archive again once more games were written to it and after compact. An
+#              archive with an illegal move or a damaged game must leave the index as it was.
+#
+#              python -m unittest test_QuoridorIndex
+
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from QuoridorBatch import BatchQuoridor
+from QuoridorCompact import CompactGame
+from QuoridorIndex import PositionIndex, position_key
+from QuoridorRecords import RecordWriter, RESULTS
+
+GAMES = 20
+SMALL_SEGMENT = 300                            # records per segment so one add writes several
+
+
+def write_games(path, count, seed):
+    """appends count random games to the archive at path and returns their
+    move lists"""
+    batch = BatchQuoridor(count, seed, record=True)
+    batch.run()
+    games = [batch.get_moves(index) for index in range(count)]
+    with RecordWriter(path) as writer:
+        for index, moves in enumerate(games):
+            writer.write_game(moves, RESULTS[batch.get_winners()[index]])
+    return games
+
+
+def positions(games):
+    """returns {position key: [(game id, ply), ...]} and {position key:
+    CompactGame} of every position of games, game ids from 0"""
+    found, boards = {}, {}
+    for game_id, moves in enumerate(games):
+        game = CompactGame()
+        for ply in range(len(moves) + 1):
+            key = position_key(game)
+            found.setdefault(key, []).append((game_id, ply))
+            boards.setdefault(key, CompactGame.from_game(game.to_game()))
+            if ply < len(moves):
+                move = moves[ply]
+                if isinstance(move[0], str):
+                    game.place_fence(game.get_turn(), move[0], move[1])
+                else:
+                    game.move_pawn(game.get_turn(), move)
+    return found, boards
+
+
+class PositionIndexTest(unittest.TestCase):
+    """PositionIndex against positions replayed by the test"""
+    def setUp(self):
+        self._directory = tempfile.mkdtemp(prefix="quoridor-index-test-")
+        self._archive = os.path.join(self._directory, "games.qrdr")
+        self._index = os.path.join(self._directory, "index")
+
+
+    def tearDown(self):
+        shutil.rmtree(self._directory)
+
+
+    def check_lookups(self, index, games):
+        """every position of games is found in exactly the games through it"""
+        found, boards = positions(games)
+        self.assertEqual(len(index), sum(len(moves) + 1 for moves in games))
+        for key, board in boards.items():
+            self.assertEqual(index.lookup(board), sorted(found[key]))
+        start = position_key(CompactGame())
+        played = sum(played for move, played, won in index.continuations(boards[start]))
+        self.assertEqual(played, len(found[start]))
+
+
+    def test_add_again_and_compact(self):
+        """adding again indexes only the new ended games, compact keeps
+        every record in one segment"""
+        with mock.patch("QuoridorIndex.SEGMENT_RECORDS", SMALL_SEGMENT):
+            games = write_games(self._archive, GAMES, 162)
+            with PositionIndex(self._index) as index:
+                self.assertEqual(index.add_archive(self._archive), GAMES)
+                self.assertGreater(index.get_segment_count(), 1)
+                games += write_games(self._archive, GAMES // 2, 163)
+                with RecordWriter(self._archive) as writer:       # a game still being written
+                    writer.begin_game()
+                    writer.add_move((4, 1))
+                self.assertEqual(index.add_archive(self._archive), GAMES // 2)
+                self.assertEqual(index.add_archive(self._archive), 0)
+            with PositionIndex(self._index) as index:
+                self.assertEqual(index.get_game_count(), len(games))
+                self.check_lookups(index, games)
+                index.compact()
+                self.assertEqual(index.get_segment_count(), 1)
+                self.check_lookups(index, games)
+                self.assertEqual(index.find_game(GAMES + 2), (os.path.abspath(self._archive), GAMES + 2))
+
+
+    def check_failed_add(self, games):
+        """add_archive raises ValueError and leaves the index and its
+        directory as they were"""
+        with PositionIndex(self._index) as index:
+            count, files = len(index), sorted(os.listdir(self._index))
+            with self.assertRaises(ValueError):
+                index.add_archive(self._archive)
+            self.assertEqual((len(index), index.get_game_count()), (count, len(games)))
+            self.assertEqual(sorted(os.listdir(self._index)), files)
+        with PositionIndex(self._index) as index:
+            self.check_lookups(index, games)
+
+
+    def test_illegal_move_leaves_index_alone(self):
+        """a game with an illegal move after some segments were written"""
+        with mock.patch("QuoridorIndex.SEGMENT_RECORDS", SMALL_SEGMENT):
+            games = write_games(self._archive, GAMES // 2, 162)
+            with PositionIndex(self._index) as index:
+                index.add_archive(self._archive)
+            write_games(self._archive, GAMES // 2, 163)
+            with RecordWriter(self._archive) as writer:
+                writer.write_game([(4, 1), (4, 1)], "unfinished")
+            self.check_failed_add(games)
+
+
+    def test_damaged_game_is_an_error(self):
+        """a bad result byte is not taken for a game still being written"""
+        games = write_games(self._archive, GAMES // 2, 162)
+        with PositionIndex(self._index) as index:
+            index.add_archive(self._archive)
+        write_games(self._archive, 2, 163)
+        with open(self._archive, "r+b") as file:
+            file.seek(-1, os.SEEK_END)
+            file.write(bytes((9,)))
+        self.check_failed_add(games)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,53 @@
+# Author: Devon Miller
+# Date: 8/5/2021
+# Description: Checks of the Monte Carlo tree search player in one process. Positions where
+#              both pawns are shut in by each other and the fences must be judged by distance
+#              instead of failing, and best_move must only return legal moves.
+#
+#              python -m unittest test_QuoridorMCTS
+
+import random
+import unittest
+
+from Quoridor import QuoridorGame
+from QuoridorMCTS import MCTSPlayer, new_game, playout
+
+PLAYOUTS = 60
+# player 1 on (0, 0) and player 2 right below it, fences over (0, 2), left of (1, 1) and left
+# of (1, 0): neither pawn has a move and player 1 is cut off from its goal
+SHUT_IN = (0, 9, 1 << 18, 1 << 10 | 1 << 1, 5, 5)
+
+
+class MCTSPlayerTest(unittest.TestCase):
+    """playouts and best_move without worker processes"""
+    def test_playout_with_no_pawn_move_is_judged(self):
+        """a playout that reaches a pawn with no move ends and the nearer
+        player wins"""
+        for turn in (1, 2):
+            self.assertEqual(new_game(SHUT_IN + (turn,)).legal_moves(turn), [])
+            for seed in range(20):
+                self.assertEqual(playout(SHUT_IN + (turn,), random.Random(seed)), 2)
+
+
+    def test_best_move_when_pawn_is_shut_in(self):
+        """player 1 can only place a fence, player 2 has no move at all"""
+        game = new_game(SHUT_IN + (1,))
+        move = MCTSPlayer(workers=1, seed=162).best_move(game, PLAYOUTS)
+        self.assertIn(move, game.legal_fences(1))
+        self.assertIsNone(MCTSPlayer(workers=1, seed=162).best_move(new_game(SHUT_IN + (2,)), PLAYOUTS))
+
+
+    def test_best_move_is_legal(self):
+        """best_move answers with a legal move and leaves the game alone"""
+        rng = random.Random(162)
+        game = QuoridorGame()
+        for ply in range(6):
+            state = game.get_state()
+            move = MCTSPlayer(workers=1, seed=rng.random()).best_move(game, PLAYOUTS)
+            self.assertEqual(game.get_state(), state)
+            self.assertIn(move, game.legal_moves(game.get_turn()) + game.legal_fences(game.get_turn()))
+            self.assertIs(game.apply(move), True)
+
+
+if __name__ == "__main__":
+    unittest.main()
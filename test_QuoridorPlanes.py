@@ -0,0 +1,118 @@
+# Author: Devon Miller
+# Date: 8/5/2021
+# Description: Checks of the feature plane encoder. Positions of random games, half of them
+#              with fences crowded around the pawns so the fair play rule decides many fences,
+#              are encoded with augment, and the legal move mask of every position and of its
+#              mirror image must be exactly the legal_moves and legal_fences of a QuoridorGame
+#              set to it. The mirrored mask and planes must be the original ones reflected, and
+#              buffers reused for a second batch must not keep anything of the first.
+#
+#              python -m unittest test_QuoridorPlanes
+
+import random
+import unittest
+
+from Quoridor import QuoridorGame, SIZE, CELLS, mirror_cell, mirror_fences
+from QuoridorPlanes import POSITION_BYTES, MOVE_COUNT, encode_batch, mirror_index, mirror_state, \
+    position_planes, legal_move_mask
+from QuoridorRecords import decode_move
+from test_Quoridor import random_move
+
+GAMES = 6
+MAX_PLIES = 80
+NEAR = 2                                       # distance from the other pawn of crowding fences
+
+
+def crowding_move(game, rng):
+    """returns a fence close to the other pawn most of the time, so the
+    fair play rule decides many fences, otherwise a random move"""
+    player = game.get_turn()
+    x, y = game.get_position(3 - player)
+    near = [fence for fence in game.legal_fences(player)
+            if abs(fence[1][0] - x) <= NEAR and abs(fence[1][1] - y) <= NEAR]
+    if near and rng.random() < 0.7:
+        return rng.choice(near)
+    return random_move(game, rng)
+
+
+def random_states(rng):
+    """returns the get_state tuple of every position of GAMES random
+    games, half of them crowded with fences, won positions included"""
+    states = []
+    for number in range(GAMES):
+        game = QuoridorGame()
+        for ply in range(MAX_PLIES):
+            states.append(game.get_state())
+            move = crowding_move(game, rng) if number % 2 else random_move(game, rng)
+            if move is None or game.get_game_state() != "unfinished":
+                break
+            game.apply(move)
+    return states
+
+
+def reference_moves(state):
+    """returns the set of legal moves of the player to move in a position,
+    empty once the game is over"""
+    game = QuoridorGame()
+    game.set_state(state)
+    if game.get_game_state() != "unfinished":
+        return set()
+    player = game.get_turn()
+    return set(game.legal_moves(player) + game.legal_fences(player))
+
+
+def mask_moves(mask):
+    """returns the set of moves set in a legal move mask"""
+    return {decode_move(index) for index in range(MOVE_COUNT) if mask[index]}
+
+
+class EncodeBatchTest(unittest.TestCase):
+    """encode_batch against QuoridorGame"""
+    def test_legal_mask_matches_game(self):
+        """the mask of every position and its mirror image is the legal
+        move set of the game"""
+        states = random_states(random.Random(162))
+        planes, masks, count = encode_batch(states, augment=True)
+        self.assertEqual(count, 2 * len(states))
+        for number, state in enumerate(states):
+            mirrored = mirror_state(state)
+            for position, index in ((state, 2 * number), (mirrored, 2 * number + 1)):
+                mask = masks[index * MOVE_COUNT:(index + 1) * MOVE_COUNT]
+                self.assertEqual(mask_moves(mask), reference_moves(position), position)
+                self.assertEqual(bytes(mask), legal_move_mask(position))
+                self.assertEqual(bytes(planes[index * POSITION_BYTES:(index + 1) * POSITION_BYTES]),
+                                 position_planes(position))
+
+
+    def test_mirror_image(self):
+        """mirror_state agrees with mirror_fences, and the mirrored mask and
+        planes are the originals reflected"""
+        for state in random_states(random.Random(163)):
+            mirrored = mirror_state(state)
+            self.assertEqual(mirrored[2:4], mirror_fences(state[2], state[3]))
+            self.assertEqual(mirror_state(mirrored), state)
+            mask, mirrored_mask = legal_move_mask(state), legal_move_mask(mirrored)
+            self.assertEqual([mirrored_mask[mirror_index(index)] for index in range(MOVE_COUNT)], list(mask))
+            planes, mirrored_planes = position_planes(state), position_planes(mirrored)
+            for plane in (0, 1, 4, 5, 6):                  # pawns and filled planes move cell by cell
+                start = plane * CELLS
+                self.assertEqual([mirrored_planes[start + mirror_cell(cell)] for cell in range(CELLS)],
+                                 list(planes[start:start + CELLS]))
+            self.assertEqual(sum(mirrored_planes[2 * CELLS:4 * CELLS]), sum(planes[2 * CELLS:4 * CELLS]))
+
+
+    def test_reused_buffers(self):
+        """a second, smaller batch into the same buffers writes the same
+        bytes as a batch into new ones"""
+        rng = random.Random(164)
+        first, second = random_states(rng), random_states(rng)[:SIZE * 20]
+        planes, masks, count = encode_batch(first)
+        reused = encode_batch(second, planes, masks)
+        self.assertIs(reused[0], planes)
+        fresh = encode_batch(second)
+        self.assertEqual(reused[0][:len(fresh[0])], fresh[0])
+        self.assertEqual(reused[1][:len(fresh[1])], fresh[1])
+
+
+if __name__ == "__main__":
+    unittest.main()
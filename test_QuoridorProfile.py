@@ -0,0 +1,107 @@
+# Author: Devon Miller
+# Date: 8/5/2021
+# Description: Checks of the game profiler. A game makes a known set of rejected and accepted
+#              calls with a GameProfiler attached, and the rejection counts, the fair play
+#              counters and the method call counts must be exactly those calls. The Prometheus
+#              text must declare every metric once before its samples and hold the same numbers,
+#              and a game must run its plain methods again once the profiler is taken off.
+#
+#              python -m unittest test_QuoridorProfile
+
+import re
+import unittest
+
+from Quoridor import QuoridorGame, TIMED_METHODS
+from QuoridorProfile import GameProfiler
+
+BOXED_IN = (4, 76, 0, 1 << 76 | 1 << 77, 5, 5, 1)      # player 2 fenced in left and right on its row
+SAMPLE = re.compile(r'^[a-zA-Z_][a-zA-Z0-9_]*(\{[a-z]+="[^"]*"\})? [0-9.e+-]+$')
+
+
+def profiled_calls(game):
+    """makes rejected and accepted calls on game in a known order"""
+    game.move_pawn(2, (4, 7))                          # wrong_turn
+    game.move_pawn(1, (9, 0))                          # out_of_range
+    game.place_fence(1, "h", (0, 0))                   # on_edge
+    game.place_fence(1, "x", (3, 3))                   # bad_direction
+    game.place_fence(1, "h", (4, 8))                   # fair_play, player 2 would be shut in
+    game.place_fence(1, "h", (2, 4))                   # accepted
+    game.place_fence(2, "h", (2, 4))                   # slot_taken
+    game.move_pawn(2, (3, 3))                          # illegal_move
+    game.move_pawn(2, (4, 7))                          # accepted
+
+
+class GameProfilerTest(unittest.TestCase):
+    """counts and output of a profiler on known calls"""
+    def profile(self):
+        """returns (game, profiler) after profiled_calls"""
+        game = QuoridorGame()
+        game.set_state(BOXED_IN)
+        profiler = GameProfiler()
+        with profiler.profile(game):
+            profiled_calls(game)
+        return game, profiler
+
+
+    def test_counts(self):
+        """every rejection reason, fair play check and method call is
+        counted once"""
+        game, profiler = self.profile()
+        snapshot = profiler.snapshot()
+        self.assertEqual(snapshot["rejections"], {"wrong_turn": 1, "out_of_range": 1, "on_edge": 1, "bad_direction": 1,
+                                                  "fair_play": 1, "slot_taken": 1, "illegal_move": 1})
+        self.assertEqual(snapshot["counters"]["fairplay_checks"], 2)
+        self.assertIn("fairplay_cells_repaired", snapshot["maximums"])
+        calls = {name: timer["calls"] for name, timer in snapshot["timers"].items()}
+        self.assertEqual(calls, {"move_pawn": 4, "place_fence": 5})
+        for timer in snapshot["timers"].values():
+            self.assertTrue(0 <= timer["max_seconds"] <= timer["total_seconds"])
+        profiler.reset()
+        self.assertEqual(profiler.snapshot(), {"counters": {}, "maximums": {}, "rejections": {}, "timers": {}})
+
+
+    def test_off_after_profile(self):
+        """the with block puts back the previous profiler and the plain
+        methods, later calls are not counted"""
+        game, profiler = self.profile()
+        self.assertIsNone(game.get_profiler())
+        self.assertFalse(set(TIMED_METHODS) & set(vars(game)))
+        before = profiler.snapshot()
+        game.move_pawn(2, (4, 7))
+        game.legal_moves(1)
+        self.assertEqual(profiler.snapshot(), before)
+        outer = GameProfiler()
+        game.set_profiler(outer)
+        with profiler.profile(game):
+            game.legal_moves(1)
+        self.assertIs(game.get_profiler(), outer)
+        self.assertEqual(profiler.snapshot()["timers"]["legal_moves"]["calls"], 1)
+        self.assertNotIn("legal_moves", outer.snapshot()["timers"])
+
+
+    def test_prometheus_output(self):
+        """every sample line is well formed, follows the TYPE line of its
+        metric and holds the snapshot's numbers"""
+        game, profiler = self.profile()
+        profiler.count("odd-name.here", 3)
+        text = profiler.to_prometheus()
+        self.assertTrue(text.endswith("\n"))
+        declared = []
+        for line in text.splitlines():
+            if line.startswith("# TYPE "):
+                name, kind = line.split()[2:]
+                self.assertIn(kind, ("counter", "gauge"))
+                self.assertNotIn(name, declared)
+                declared.append(name)
+                continue
+            self.assertRegex(line, SAMPLE)
+            self.assertEqual(re.split(r"[{ ]", line)[0], declared[-1])
+        lines = text.splitlines()
+        self.assertIn('quoridor_rejections_total{reason="fair_play"} 1', lines)
+        self.assertIn("quoridor_fairplay_checks_total 2", lines)
+        self.assertIn("quoridor_odd_name_here_total 3", lines)
+        self.assertIn('quoridor_method_calls_total{method="place_fence"} 5', lines)
+
+
+if __name__ == "__main__":
+    unittest.main()
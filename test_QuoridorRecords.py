@@ -0,0 +1,122 @@
+# Author: Devon Miller
+# Date: 8/5/2021
+# Description: Checks of the record file format. Random games are written with RecordWriter and
+#              read back with RecordReader by looping and by number, the bytes of a game are
+#              checked against the format, and a file whose last game is still being written
+#              must read as the games before it.
+#
+#              python -m unittest test_QuoridorRecords
+
+import os
+import random
+import tempfile
+import unittest
+
+from Quoridor import QuoridorGame, SIZE
+from QuoridorRecords import RecordReader, RecordWriter, UnendedGame, MAGIC, VERSION, END, RESULTS, \
+    FIRST_V_FENCE, encode_move, decode_move
+from test_Quoridor import random_move
+
+GAMES = 20
+MAX_PLIES = 120
+
+
+def random_game(rng):
+    """returns (start state or None, moves, game) of a random game, half
+    of them from a position a few moves in"""
+    game = QuoridorGame()
+    for ply in range(rng.randrange(2) * 6):
+        game.apply(random_move(game, rng))
+    start = game.get_state() if game.get_history_length() else None
+    moves = []
+    while game.get_game_state() == "unfinished" and len(moves) < MAX_PLIES:
+        move = random_move(game, rng)
+        if move is None:
+            break
+        moves.append(move)
+        game.apply(move)
+    return start, moves, game
+
+
+class RecordsTest(unittest.TestCase):
+    """RecordWriter and RecordReader on temporary files"""
+    def setUp(self):
+        self._directory = tempfile.TemporaryDirectory()
+        self._path = os.path.join(self._directory.name, "games.qrd")
+
+
+    def tearDown(self):
+        self._directory.cleanup()
+
+
+    def test_move_bytes_round_trip(self):
+        """every move byte decodes to a move that encodes back to it"""
+        for value in range(FIRST_V_FENCE + SIZE * (SIZE - 1)):
+            self.assertEqual(encode_move(decode_move(value)), value)
+        for move in ((9, 0), ("h", (0, 0)), ("v", (0, 4)), ("x", (1, 1))):
+            with self.assertRaises(ValueError):
+                encode_move(move)
+
+
+    def test_written_games_read_back(self):
+        """games come back the same by looping, by number and replayed"""
+        rng = random.Random(162)
+        games = [random_game(rng) for number in range(GAMES)]
+        with RecordWriter(self._path) as writer:
+            for number, (start, moves, game) in enumerate(games):
+                writer.write_game(moves, game.get_game_state(), "white" + str(number), "black", start)
+        with RecordReader(self._path) as reader:
+            self.assertEqual(len(reader), GAMES)
+            for number, record in enumerate(reader):
+                start, moves, game = games[number]
+                self.assertEqual(record.get_players(), ("white" + str(number), "black"))
+                self.assertEqual((record.get_start(), record.get_moves()), (start, moves))
+                self.assertEqual(record.replay().get_state(), game.get_state())
+            for number in rng.sample(range(GAMES), 10):
+                self.assertEqual(reader[number].get_moves(), games[number][1])
+
+
+    def test_game_bytes(self):
+        """header, one byte per move, then END and the result byte"""
+        with RecordWriter(self._path) as writer:
+            writer.write_game([(4, 1), ("h", (2, 3)), (4, 7)], "player2 wins", "a", "bc")
+        with open(self._path, "rb") as file:
+            data = file.read()
+        moves = bytes((13, encode_move(("h", (2, 3))), 67))
+        game = b"G\x00\x01a\x02bc" + moves + bytes((END, RESULTS.index("player2 wins")))
+        self.assertEqual(data, MAGIC + bytes((VERSION,)) + game)
+
+
+    def test_unended_last_game_is_left_out(self):
+        """a game still being written is not read until it is ended"""
+        writer = RecordWriter(self._path)
+        writer.write_game([(4, 1)], "unfinished")
+        writer.begin_game("live", "game")
+        writer.add_move((4, 1))
+        writer.flush()
+        with RecordReader(self._path) as reader:
+            self.assertEqual((len(reader), len(list(reader))), (1, 1))
+            with self.assertRaises(UnendedGame):
+                reader.read_game(reader.read_game(len(MAGIC) + 1)[1])
+        writer.end_game("unfinished")
+        writer.close()
+        with RecordReader(self._path) as reader:
+            self.assertEqual([record.get_players() for record in reader],
+                             [("player_1", "player_2"), ("live", "game")])
+
+
+    def test_bad_result_byte_is_an_error(self):
+        """a result byte that is not a result is corruption, not a game
+        still being written"""
+        with RecordWriter(self._path) as writer:
+            writer.write_game([(4, 1)], "unfinished")
+        with open(self._path, "r+b") as file:
+            file.seek(-1, os.SEEK_END)
+            file.write(bytes((7,)))
+        with RecordReader(self._path) as reader:
+            with self.assertRaises(ValueError):
+                len(reader)
+
+
+if __name__ == "__main__":
+    unittest.main()
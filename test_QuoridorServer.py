@@ -0,0 +1,95 @@
+# Author: Devon Miller
+# Date: 8/5/2021
+# Description: Checks of the game server protocol. A GameServer is started on a port the system
+#              picks, a client plays a short game to a win over one connection, for QuoridorGame
+#              and CompactGame, and malformed or unknown requests must get an error answer
+#              without closing the connection.
+#
+#              python -m unittest test_QuoridorServer
+
+import asyncio
+import json
+import unittest
+
+from Quoridor import QuoridorGame
+from QuoridorCompact import CompactGame
+from QuoridorServer import GameServer, call
+
+PLAYER_1_MOVES = [(4, y) for y in range(1, 9)]                # straight down to the goal row
+PLAYER_2_MOVES = [(3, 8), (2, 8)] * 4                         # side to side, out of the way
+
+
+class GameServerTest(unittest.IsolatedAsyncioTestCase):
+    """one server on an ephemeral port per test"""
+    async def start(self, game_class=QuoridorGame):
+        """starts a server and opens a connection to it"""
+        self._server = GameServer(port=0, game_class=game_class)
+        listener = await self._server.start()
+        port = listener.sockets[0].getsockname()[1]
+        self._reader, self._writer = await asyncio.open_connection("127.0.0.1", port)
+
+
+    async def asyncTearDown(self):
+        self._writer.close()
+        await self._server.close()
+
+
+    async def play_short_game(self, game_class):
+        """player 1 walks to the goal row while player 2 steps aside"""
+        await self.start(game_class)
+        answer = await call(self._reader, self._writer, {"op": "new", "id": 7})
+        self.assertEqual((answer["ok"], answer["id"]), (True, 7))
+        game = answer["game"]
+        for move_1, move_2 in zip(PLAYER_1_MOVES, PLAYER_2_MOVES):
+            answer = await call(self._reader, self._writer,
+                                {"op": "move_pawn", "game": game, "player": 1, "to": move_1})
+            self.assertEqual(answer, {"ok": True, "result": True})
+            if move_1 != PLAYER_1_MOVES[-1]:
+                answer = await call(self._reader, self._writer,
+                                    {"op": "move_pawn", "game": game, "player": 2, "to": move_2})
+                self.assertEqual(answer, {"ok": True, "result": True})
+        answer = await call(self._reader, self._writer, {"op": "is_winner", "game": game, "player": 1})
+        self.assertIs(answer["result"], True)
+        state = (await call(self._reader, self._writer, {"op": "state", "game": game}))["result"]
+        self.assertEqual((state["game_state"], state["positions"]), ("player1 wins", [[4, 8], [3, 8]]))
+        self.assertEqual(self._server.get_game_count(), 1)
+        await call(self._reader, self._writer, {"op": "close", "game": game})
+        self.assertEqual(self._server.get_game_count(), 0)
+
+
+    async def test_short_game(self):
+        """a whole game over the protocol with the full game"""
+        await self.play_short_game(QuoridorGame)
+
+
+    async def test_short_game_compact(self):
+        """the same game with CompactGame positions"""
+        await self.play_short_game(CompactGame)
+
+
+    async def send_line(self, line):
+        """sends a raw request line and returns the answer"""
+        self._writer.write(line + b"\n")
+        await self._writer.drain()
+        return json.loads(await self._reader.readline())
+
+
+    async def test_malformed_requests(self):
+        """bad lines get an error answer and the connection stays usable"""
+        await self.start()
+        game = (await call(self._reader, self._writer, {"op": "new"}))["game"]
+        errors = [(b"not json", "JSONDecodeError"), (b"[1, 2]", "TypeError"),
+                  (b'{"op": "move_pawn", "game": "' + game.encode() + b'", "player": 1}', "KeyError"),
+                  (b'{"op": "jump", "game": "' + game.encode() + b'"}', "ValueError")]
+        for line, kind in errors:
+            answer = await self.send_line(line)
+            self.assertIs(answer["ok"], False)
+            self.assertTrue(answer["error"].startswith(kind), answer)
+        answer = await call(self._reader, self._writer, {"op": "state", "game": "nobody", "id": "x"})
+        self.assertEqual(answer, {"ok": False, "error": "no such game", "id": "x"})
+        answer = await call(self._reader, self._writer, {"op": "move_pawn", "game": game, "player": 1, "to": [4, 1]})
+        self.assertEqual(answer, {"ok": True, "result": True})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,46 @@
+# Author: Devon Miller
+# Date: 8/5/2021
+# Description: Checks of the shared memory analysis pool. Positions from random BatchQuoridor
+#              games are analysed by worker processes through the arena and the results must
+#              be those of analyse_state in this process, also with one position per work item
+#              so the rings fill up and the coordinator has to wait for the workers. A pool
+#              whose workers were killed must raise instead of waiting for them forever.
+#
+#              python -m unittest test_QuoridorShared
+
+import multiprocessing
+import unittest
+from unittest import mock
+
+from QuoridorShared import AnalysisPool, analyse_state, sample_states
+
+POSITIONS = 400
+WORKERS = 2
+
+
+class AnalysisPoolTest(unittest.TestCase):
+    """AnalysisPool against analyse_state"""
+    def test_results_match_analyse_state(self):
+        """every result comes back to the slot of its position"""
+        states = sample_states(POSITIONS)
+        expected = [analyse_state(state) for state in states]
+        with AnalysisPool(POSITIONS, WORKERS) as pool:
+            self.assertEqual(pool.analyse(states), expected)
+            with mock.patch("QuoridorShared.ITEM_POSITIONS", 1):      # more items than the rings hold
+                self.assertEqual(pool.analyse(states[::-1]), expected[::-1])
+
+
+    def test_dead_workers_raise(self):
+        """analyse raises RuntimeError when the workers are gone"""
+        states = sample_states(POSITIONS)
+        with AnalysisPool(POSITIONS, WORKERS) as pool:
+            for process in multiprocessing.active_children():
+                process.terminate()
+                process.join()
+            with mock.patch("QuoridorShared.ITEM_POSITIONS", 1):
+                with self.assertRaises(RuntimeError):
+                    pool.analyse(states)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,106 @@
+# Author: Devon Miller
+# Date: 8/5/2021
+# Description: Checks of the spectator stream. A random game is played with a SpectatorHub
+#              attached, and the frames are checked to be numbered one after another, to be
+#              move frames between keyframes that come every keyframe_every moves and after an
+#              undo, and to rebuild the game in a SpectatorView that joined at the start or
+#              late. A subscriber whose callback raises must be dropped without stopping the
+#              game or the other subscribers.
+#
+#              python -m unittest test_QuoridorSpectate
+
+import logging
+import random
+import unittest
+
+from Quoridor import QuoridorGame
+from QuoridorSpectate import SpectatorHub, SpectatorView, decode_frame
+from test_Quoridor import random_move
+
+KEYFRAME_EVERY = 8
+PLIES = 60
+
+
+def play(game, rng, plies):
+    """plays up to plies random moves, fewer when the game ends"""
+    for ply in range(plies):
+        move = random_move(game, rng)
+        if game.get_game_state() != "unfinished" or move is None:
+            return
+        game.apply(move)
+
+
+class SpectatorHubTest(unittest.TestCase):
+    """frames of a hub on a random game"""
+    def test_frame_numbering_and_deltas(self):
+        """sequence numbers have no gaps and the moves between keyframes
+        are the moves the game played"""
+        game = QuoridorGame()
+        hub = SpectatorHub(game, KEYFRAME_EVERY)
+        frames = []
+        hub.subscribe(frames.append)
+        play(game, random.Random(162), PLIES)
+        decoded = [decode_frame(frame) for frame in frames]
+        self.assertEqual([sequence for sequence, move, snapshot in decoded], list(range(1, len(frames) + 1)))
+        self.assertEqual(hub.get_sequence(), len(frames))
+        moves = [move for sequence, move, snapshot in decoded if move is not None]
+        self.assertEqual(len(moves), game.get_history_length())
+        runs = [0]
+        for sequence, move, snapshot in decoded[1:]:
+            runs[-1:] = [runs[-1], 0] if snapshot is not None else [runs[-1] + 1]
+        self.assertIsNotNone(decoded[0][2])
+        self.assertEqual(runs[:-1], [KEYFRAME_EVERY] * (len(runs) - 1))
+        self.assertLess(runs[-1], KEYFRAME_EVERY)
+        replay = QuoridorGame()
+        for move in moves:
+            self.assertIs(replay.apply(move), True)
+        self.assertEqual(replay.get_state(), game.get_state())
+
+
+    def test_views_stay_in_sync(self):
+        """a view from the start and one that joins late after an undo end
+        on the position of the game"""
+        game = QuoridorGame()
+        hub = SpectatorHub(game, KEYFRAME_EVERY)
+        early, late, frames = SpectatorView(), SpectatorView(), []
+        hub.subscribe(early.feed)
+        hub.subscribe(frames.append)
+        rng = random.Random(163)
+        play(game, rng, PLIES // 2)
+        game.undo()
+        self.assertEqual(decode_frame(frames[-1])[2], game.to_bytes())
+        hub.subscribe(late.feed)
+        play(game, rng, PLIES // 2)
+        for view in (early, late):
+            self.assertTrue(view.in_sync())
+            self.assertEqual(view.get_game().get_state(), game.get_state())
+        self.assertEqual(hub.get_subscriber_count(), 3)
+
+
+    def test_failing_subscriber_is_dropped(self):
+        """a callback that raises is removed, the game goes on and the
+        other subscribers get every frame"""
+        game = QuoridorGame()
+        hub = SpectatorHub(game, KEYFRAME_EVERY)
+        view = SpectatorView()
+        hub.subscribe(view.feed)
+        failed = []
+
+        def broken(frame):
+            failed.append(frame)
+            if len(failed) == 3:
+                raise ConnectionError("spectator went away")
+        hub.subscribe(broken)
+        with self.assertLogs("QuoridorSpectate", logging.ERROR):
+            play(game, random.Random(164), PLIES)
+        self.assertEqual(len(failed), 3)
+        self.assertEqual(hub.get_subscriber_count(), 1)
+        self.assertEqual(view.get_game().get_state(), game.get_state())
+        self.assertGreater(game.get_history_length(), 3)
+        with self.assertLogs("QuoridorSpectate", logging.ERROR):
+            hub.subscribe(lambda frame: 1 / 0)
+        self.assertEqual(hub.get_subscriber_count(), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,102 @@
+# Author: Devon Miller
+# Date: 8/5/2021
+# Description: Checks of the tournament runner and its ratings. The Bradley-Terry fit and the
+#              Wilson interval are compared with values worked out by hand for known win
+#              counts, and a short tournament is run twice on one results file to check that
+#              the second run only plays the games missing from it.
+#
+#              python -m unittest test_QuoridorTournament
+
+import json
+import math
+import os
+import tempfile
+import unittest
+
+from QuoridorTournament import bradley_terry, wilson_interval, collect_games, ratings, run_tournament, \
+    round_robin
+
+WIN_3_OF_4 = 400 * math.log10(3)               # Elo of a 3 to 1 strength ratio, about 190.8
+
+
+def results_of(wins, losses, first="a", second="b"):
+    """returns result dicts of first winning wins and losing losses games
+    against second"""
+    return [{"player1": first, "player2": second, "score": 1.0}] * wins + \
+        [{"player1": first, "player2": second, "score": 0.0}] * losses
+
+
+def untimed(result):
+    """returns the fields of a result that do not depend on the clock"""
+    return result["game"], result["player1"], result["player2"], result["score"], result["reason"], result["plies"]
+
+
+class RatingsTest(unittest.TestCase):
+    """bradley_terry and wilson_interval on known win counts"""
+    def test_bradley_terry_known_counts(self):
+        """with many games the virtual draws hardly count and a 3 to 1
+        record is a 3 to 1 strength ratio, ratings are centered on 0"""
+        elo = bradley_terry(collect_games(results_of(60, 20), ["a", "b"]), ["a", "b"])
+        self.assertAlmostEqual(elo["a"] - elo["b"], WIN_3_OF_4, delta=2)
+        self.assertAlmostEqual(elo["a"] + elo["b"], 0.0)
+        chain = results_of(60, 20, "a", "b") + results_of(60, 20, "b", "c")
+        elo = bradley_terry(collect_games(chain, ["a", "b", "c"]), ["a", "b", "c"])
+        self.assertAlmostEqual(elo["a"] - elo["b"], WIN_3_OF_4, delta=4)
+        self.assertAlmostEqual(elo["b"] - elo["c"], WIN_3_OF_4, delta=4)
+
+
+    def test_bradley_terry_even_and_one_sided(self):
+        """an even record rates both players 0, a record of only wins
+        stays finite"""
+        elo = bradley_terry(collect_games(results_of(5, 5), ["a", "b"]), ["a", "b"])
+        self.assertAlmostEqual(elo["a"], 0.0, places=6)
+        elo = bradley_terry(collect_games(results_of(4, 0), ["a", "b"]), ["a", "b"])
+        self.assertTrue(0 < elo["a"] < 1000)
+        self.assertAlmostEqual(elo["a"], -elo["b"])
+
+
+    def test_wilson_interval(self):
+        """50 of 100 and 10 of 10 against the textbook Wilson intervals"""
+        low, high = wilson_interval(0.5, 100)
+        self.assertAlmostEqual(low, 0.40383, places=4)
+        self.assertAlmostEqual(high, 0.59617, places=4)
+        low, high = wilson_interval(1.0, 10)
+        self.assertAlmostEqual(low, 0.72249, places=4)
+        self.assertAlmostEqual(high, 1.0)
+
+
+    def test_ratings_table(self):
+        """games and score per player and the interval around the rating"""
+        table = ratings(results_of(60, 20), ["a", "b", "c"])
+        elo, low, high, count, score = table["a"]
+        self.assertEqual((count, score), (80, 0.75))
+        self.assertTrue(low < elo < high)
+        self.assertEqual(table["c"][1:4], (-math.inf, math.inf, 0))
+
+
+class RunTournamentTest(unittest.TestCase):
+    """a short tournament in this process"""
+    def test_second_run_plays_only_missing_games(self):
+        """a results file with a game missing and a line cut short gets
+        just that game played again"""
+        players = {"greedy": "greedy", "random": "random"}
+        pairs = round_robin(list(players), 1)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "results.jsonl")
+            first = run_tournament(players, pairs, path, move_time=1.0, workers=1, max_plies=40)
+            self.assertEqual(sorted(result["game"] for result in first), [0, 1])
+            with open(path) as file:
+                lines = file.readlines()
+            with open(path, "w") as file:
+                file.write(lines[0] + lines[1][:10])                  # second game cut short
+            second = run_tournament(players, pairs, path, move_time=1.0, workers=1, max_plies=40)
+            self.assertEqual(sorted(untimed(result) for result in second),
+                             sorted(untimed(result) for result in first))
+            with open(path) as file:
+                lines = file.read().splitlines()
+            self.assertEqual(len(lines), 3)
+            self.assertEqual(json.loads(lines[2])["game"], json.loads(lines[0])["game"] ^ 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,83 @@
+# Author: Devon Miller
+# Date: 8/5/2021
+# Description: Checks of the log validator. Logs with an illegal move, a call by the wrong
+#              player, a line cut short and a wrong result must each be reported, clean logs
+#              must not, and the reports must come back in input order from the worker pool.
+#
+#              python -m unittest test_QuoridorValidate
+
+import json
+import os
+import tempfile
+import unittest
+
+from QuoridorValidate import validate_line, validate_lines, new_summary, write_reports
+
+OPENING = [{"op": "move_pawn", "player": 1, "to": [4, 1]}, {"op": "move_pawn", "player": 2, "to": [4, 7]},
+           {"op": "place_fence", "player": 1, "direction": "h", "at": [3, 3]}]
+
+
+def log_line(calls, result=None, name="game"):
+    """returns one log line for calls"""
+    log = {"id": name, "calls": calls}
+    if result is not None:
+        log["result"] = result
+    return json.dumps(log)
+
+
+class ValidateTest(unittest.TestCase):
+    """validate_line and validate_lines on small logs"""
+    def test_clean_log(self):
+        """a legal log reports no problems and its game state"""
+        report = validate_line(1, log_line(OPENING, "unfinished"))
+        self.assertEqual(report, {"line": 1, "id": "game", "calls": 3, "illegal": [],
+                                  "game_state": "unfinished", "result_matches": True})
+
+
+    def test_illegal_move(self):
+        """a jump over nothing is rejected and the replay goes on"""
+        calls = OPENING[:2] + [{"op": "move_pawn", "player": 1, "to": [4, 3]}] + OPENING[2:]
+        report = validate_line(2, log_line(calls))
+        self.assertEqual(report["illegal"], [[2, False]])
+        self.assertEqual(report["calls"], 4)
+
+
+    def test_wrong_player(self):
+        """a call by the player whose turn it is not is rejected"""
+        calls = [{"op": "move_pawn", "player": 2, "to": [4, 7]}] + OPENING
+        self.assertEqual(validate_line(1, log_line(calls))["illegal"], [[0, False]])
+
+
+    def test_truncated_line(self):
+        """a line cut short is reported as unreadable, so is a call with a
+        missing field"""
+        self.assertIn("JSONDecodeError", validate_line(5, log_line(OPENING)[:40])["error"])
+        report = validate_line(6, log_line([{"op": "move_pawn", "player": 1}]))
+        self.assertEqual((report["line"], report["error"][:8]), (6, "KeyError"))
+
+
+    def test_wrong_result(self):
+        """a log claiming a win the calls do not reach"""
+        self.assertIs(validate_line(1, log_line(OPENING, "player1 wins"))["result_matches"], False)
+
+
+    def test_pool_reports_in_order(self):
+        """reports of many lines on two workers come back in input order,
+        only the problems are written with illegal_only"""
+        lines = [log_line(OPENING if number % 3 else OPENING[1:], name=str(number)) for number in range(40)]
+        lines.insert(7, "\n")
+        reports = list(validate_lines(lines, workers=2, chunk_size=3, max_pending=2))
+        self.assertEqual([report["id"] for report in reports], [str(number) for number in range(40)])
+        self.assertEqual(reports[7]["line"], 9)                         # the blank line is skipped
+        summary = new_summary()
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "reports.jsonl")
+            write_reports(reports, summary, path, illegal_only=True)
+            with open(path) as file:
+                written = [json.loads(line)["id"] for line in file]
+        self.assertEqual(written, [str(number) for number in range(0, 40, 3)])
+        self.assertEqual((summary["logs"], summary["logs_with_illegal"], summary["calls"]), (40, 14, 40 * 3 - 14))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,138 @@
+# Author: Devon Miller
+# Date: 8/5/2021
+# Description: Randomized checks of VariantGame. On the classic board with 2 players it must
+#              answer every call the way QuoridorGame does. On other board sizes and with 4
+#              players its pawn moves and fair play answers are compared with a reference
+#              written from the rules with coordinates, using the fences the test itself saw
+#              accepted.
+#
+#              python -m unittest test_QuoridorVariant
+
+import random
+import unittest
+
+from Quoridor import QuoridorGame, FAIR_PLAY_MESSAGE
+from QuoridorVariant import VariantGame
+from test_QuoridorCompact import random_call
+
+GAMES = 100
+MAX_CALLS = 200
+BOARD_SIZES = (5, 7, 9, 11, 13)
+FENCE_CHANCE = 0.3
+
+
+def step_open(size, fences, x, y, dx, dy):
+    """returns True if a pawn on (x, y) may step by (dx, dy), fences is a
+    set of (direction, (x, y)) placed so far"""
+    if not (0 <= x + dx < size and 0 <= y + dy < size):
+        return False
+    if dy:
+        return ("h", (x, max(y, y + dy))) not in fences
+    return ("v", (max(x, x + dx), y)) not in fences
+
+
+def reference_moves(size, fences, pawns, player):
+    """returns the set of (x, y) the player's pawn may move to, a jump when
+    the cell behind the pawn passed is open and free, the diagonals around
+    it otherwise"""
+    x, y = pawns[player - 1]
+    moves = set()
+    for dx, dy in ((0, -1), (0, 1), (-1, 0), (1, 0)):
+        if not step_open(size, fences, x, y, dx, dy):
+            continue
+        near = (x + dx, y + dy)
+        if near not in pawns:
+            moves.add(near)
+        elif step_open(size, fences, *near, dx, dy) and (near[0] + dx, near[1] + dy) not in pawns:
+            moves.add((near[0] + dx, near[1] + dy))
+        else:
+            for side_x, side_y in ((dy, dx), (-dy, -dx)):
+                side = (near[0] + side_x, near[1] + side_y)
+                if step_open(size, fences, *near, side_x, side_y) and side not in pawns:
+                    moves.add(side)
+    return moves
+
+
+def reference_reaches(size, fences, start, player):
+    """returns True if a pawn of player on start has a path to its goal
+    side, rows for players 1 and 2 and columns for 3 and 4"""
+    goal = (lambda x, y: y == size - 1, lambda x, y: y == 0,
+            lambda x, y: x == size - 1, lambda x, y: x == 0)[player - 1]
+    seen, stack = {start}, [start]
+    while stack:
+        x, y = stack.pop()
+        if goal(x, y):
+            return True
+        for dx, dy in ((0, -1), (0, 1), (-1, 0), (1, 0)):
+            if step_open(size, fences, x, y, dx, dy) and (x + dx, y + dy) not in seen:
+                seen.add((x + dx, y + dy))
+                stack.append((x + dx, y + dy))
+    return False
+
+
+def random_fence(size, pawns, rng):
+    """returns a random fence, half of them on an edge of a pawn's cell so
+    pawns get boxed in and the fair play rule comes up"""
+    if rng.random() < 0.5:
+        x, y = rng.choice(pawns)
+        return rng.choice([("h", (x, y)), ("h", (x, y + 1)), ("v", (x, y)), ("v", (x + 1, y))])
+    return rng.choice("hv"), (rng.randint(1, size - 1), rng.randint(1, size - 1))
+
+
+class VariantGameTest(unittest.TestCase):
+    """VariantGame against QuoridorGame and against the reference"""
+    def test_classic_board_matches_quoridor_game(self):
+        """plays the same random calls on VariantGame(9, 11, 2) and on
+        QuoridorGame"""
+        rng = random.Random(162)
+        for number in range(GAMES):
+            game, variant = QuoridorGame(), VariantGame(9, 11, 2)
+            for call in range(MAX_CALLS):
+                name, arguments = random_call(game, rng)
+                self.assertEqual(getattr(variant, name)(*arguments), getattr(game, name)(*arguments))
+                self.assertEqual(variant.get_game_state(), game.get_game_state())
+                for player in (1, 2):
+                    self.assertEqual(variant.get_position(player), game.get_position(player))
+                    self.assertEqual(variant.get_fences_left(player), game.get_fences_left(player))
+                    self.assertEqual(sorted(variant.legal_moves(player)), sorted(game.legal_moves(player)))
+
+
+    def check_fence(self, game, fences, pawns, direction, position):
+        """tries a fence and checks the answer with the reference, returns
+        True if it was placed"""
+        player = game.get_turn()
+        result = game.place_fence(player, direction, position)
+        if result is False:
+            return False
+        placed = fences | {(direction, position)}
+        blocked = [other for other in range(1, game.get_player_count() + 1)
+                   if other != player and not reference_reaches(game.get_size(), placed, pawns[other - 1], other)]
+        self.assertEqual(result, FAIR_PLAY_MESSAGE if blocked else True)
+        return result is True
+
+
+    def test_other_boards_match_reference(self):
+        """random games on every board size with 2 and 4 players"""
+        rng = random.Random(162)
+        for number in range(GAMES):
+            size = rng.choice(BOARD_SIZES)
+            game, fences = VariantGame(size, players=rng.choice((2, 4))), set()
+            for call in range(MAX_CALLS):
+                if game.get_game_state() != "unfinished":
+                    break
+                player = game.get_turn()
+                pawns = [game.get_position(other) for other in range(1, game.get_player_count() + 1)]
+                moves = game.legal_moves(player)
+                self.assertEqual(set(moves), reference_moves(size, fences, pawns, player))
+                if game.get_fences_left(player) and (rng.random() < FENCE_CHANCE or not moves):
+                    fence = random_fence(size, pawns, rng)
+                    if self.check_fence(game, fences, pawns, *fence):
+                        fences.add(fence)
+                elif not moves:
+                    break
+                else:
+                    self.assertIs(game.move_pawn(player, rng.choice(moves)), True)
+
+
+if __name__ == "__main__":
+    unittest.main()
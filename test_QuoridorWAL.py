@@ -0,0 +1,109 @@
+# Author: Devon Miller
+# Date: 8/5/2021
+# Description: Crash recovery checks of GameStore. Random moves are written to a store that is
+#              then dropped without close, as a crash would leave it, and the store recovered
+#              from the directory must hold the same games as replaying the accepted moves on
+#              fresh games, with checkpoints made along the way and with a batch torn in half
+#              at the end of the log.
+#
+#              python -m unittest test_QuoridorWAL
+
+import os
+import random
+import shutil
+import tempfile
+import unittest
+
+from Quoridor import QuoridorGame
+from QuoridorCompact import CompactGame
+from QuoridorWAL import GameStore, BATCH, file_number
+
+GAMES = 12
+CALLS = 1500
+SYNC_EVERY = 7
+CHECKPOINT_EVERY = 300
+
+
+def random_calls(store, replayed, rng):
+    """makes CALLS random moves and fences on the games of store, ended
+    games are closed and replaced, every call the store takes is made
+    again on the QuoridorGame of the same id in replayed"""
+    for call in range(CALLS):
+        game_id = rng.choice(sorted(replayed))
+        game = store.get_game(game_id)
+        player = game.get_turn()
+        if game.get_game_state() != "unfinished":
+            store.close_game(game_id)
+            del replayed[game_id]
+            replayed[store.new_game()] = QuoridorGame()
+        elif rng.random() < 0.3 and game.get_fences_left(player):
+            fence = (rng.choice("hv"), (rng.randrange(9), rng.randrange(9)))
+            if store.place_fence(game_id, player, *fence) is True:
+                replayed[game_id].place_fence(player, *fence)
+        elif game.legal_moves(player):
+            move = rng.choice(game.legal_moves(player))
+            if store.move_pawn(game_id, player, move) is True:
+                replayed[game_id].move_pawn(player, move)
+
+
+class GameStoreTest(unittest.TestCase):
+    """GameStore recovered after a crash against the moves replayed"""
+    def setUp(self):
+        self._directory = tempfile.mkdtemp(prefix="quoridor-wal-test-")
+
+
+    def tearDown(self):
+        shutil.rmtree(self._directory)
+
+
+    def crash_and_recover(self, directory, game_class, seed, torn=b""):
+        """writes random moves, syncs, leaves the store open and appends
+        torn to the newest log, then checks the recovered store"""
+        crashed = GameStore(directory, game_class, sync_every=SYNC_EVERY, checkpoint_every=CHECKPOINT_EVERY)
+        replayed = {crashed.new_game(): QuoridorGame() for game in range(GAMES)}
+        random_calls(crashed, replayed, random.Random(seed))
+        crashed.sync()
+        logs = [file_number(name, "log", ".qwal") for name in os.listdir(directory)]
+        with open(os.path.join(directory, "log-%d.qwal" % max(log for log in logs if log is not None)), "ab") as log:
+            log.write(torn)
+        recovered = GameStore(directory, game_class)
+        try:
+            self.assertEqual(recovered.get_game_count(), len(replayed))
+            for game_id, game in replayed.items():
+                self.assertEqual(recovered.get_game(game_id).get_state(), game.get_state())
+                self.assertEqual(recovered.get_game(game_id).get_game_state(), game.get_game_state())
+            self.assertNotIn(recovered.new_game(), replayed)
+        finally:
+            recovered.close()
+            crashed.close()                            # nothing pending, writes nothing
+        return replayed
+
+
+    def test_recovery_after_checkpoints(self):
+        """the snapshot of the last checkpoint and the log after it give
+        back every game"""
+        for game_class in (QuoridorGame, CompactGame):
+            directory = os.path.join(self._directory, game_class.__name__)
+            self.crash_and_recover(directory, game_class, 162)
+            snapshots = [name for name in os.listdir(directory) if file_number(name, "snapshot", ".qsnp") is not None]
+            self.assertEqual(len(snapshots), 1)
+
+
+    def test_torn_last_batch_is_dropped(self):
+        """a batch cut short is ignored and cut off, moves made after the
+        recovery are kept by the next one"""
+        torn = BATCH.pack(3, 0) + b"\x00\x00\x00\x01"
+        replayed = self.crash_and_recover(self._directory, QuoridorGame, 163, torn)
+        store = GameStore(self._directory)
+        game_id = min(game_id for game_id, game in replayed.items() if game.get_game_state() == "unfinished")
+        player = store.get_game(game_id).get_turn()
+        move = store.get_game(game_id).legal_moves(player)[0]
+        self.assertIs(store.move_pawn(game_id, player, move), True)
+        store.close()
+        replayed[game_id].move_pawn(player, move)
+        with GameStore(self._directory) as store:
+            self.assertEqual(store.get_game(game_id).get_state(), replayed[game_id].get_state())
+
+
+if __name__ == "__main__":
+    unittest.main()